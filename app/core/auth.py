@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from starlette.datastructures import Headers
+
+
+def bearer_token(headers: Headers) -> str | None:
+    auth_header = headers.get("authorization")
+    if auth_header and auth_header.lower().startswith("bearer "):
+        return auth_header.split(" ", 1)[1].strip()
+    return None
+
+
+def presents_key(headers: Headers, expected: str) -> bool:
+    """Whether the request carries `expected` as `X-API-Key` or a bearer token."""
+
+    return headers.get("x-api-key") == expected or bearer_token(headers) == expected
@@ -34,33 +34,102 @@ class Settings(BaseSettings):
     DATA_DIR: str = Field("data")
     CACHE_PERSIST_PATH: str | None = None
     LEDGER_DB_PATH: str | None = None
+    JOBS_DB_PATH: str | None = None
+    CARBON_INTENSITY_PATH: str | None = None
 
     CACHE_COLLECTION_NAME: str = Field("llm_cache")
     CACHE_SIMILARITY_THRESHOLD: float = Field(0.95, ge=0.0, le=1.0)
     CACHE_TOP_K: int = Field(3, ge=1)
     CACHE_MAX_RESULTS: int = Field(8, ge=1)
+    CACHE_BATCH_WINDOW_MS: float = Field(2.0, ge=0)
+    CACHE_BATCH_MAX_SIZE: int = Field(32, ge=1)
+    CACHE_EXECUTOR_WORKERS: int = Field(4, ge=1)
+    CACHE_LOOKUP_BUDGET_MS: float = Field(150.0, ge=0, description="0 disables the budget")
+    CACHE_SAVE_QUEUE_SIZE: int = Field(256, ge=1)
+    CACHE_EXACT_MAX_ENTRIES: int = Field(10_000, ge=1)
 
     HTTP_TIMEOUT_SECONDS: float = Field(60.0, gt=0)
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = Field(5.0, gt=0)
+    HTTP_POOL_TIMEOUT_SECONDS: float = Field(5.0, gt=0)
+    HTTP_MAX_CONNECTIONS: int = Field(100, ge=1)
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = Field(20, ge=0)
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = Field(30.0, ge=0)
+    HTTP_POOL_OVERRIDES: str = Field(
+        "",
+        description="Comma-delimited provider=max_connections pairs (e.g., openai=200,cohere=20)",
+    )
+    HTTP2_ENABLED: bool = Field(False)
+    HTTP_PREWARM_ENABLED: bool = Field(True)
+    HTTP_PREWARM_TIMEOUT_SECONDS: float = Field(3.0, gt=0)
     RETRY_ATTEMPTS: int = Field(3, ge=0)
     RETRY_BACKOFF_SECONDS: float = Field(0.5, gt=0)
+    DISCONNECT_POLL_INTERVAL_MS: int = Field(100, ge=10)
 
     RATE_LIMIT_PER_MINUTE: int = Field(120, ge=1)
+    RATE_LIMIT_TOKENS_PER_MINUTE: int = Field(0, ge=0)
+    RATE_LIMIT_JOULES_PER_MINUTE: float = Field(0.0, ge=0)
+    RATE_LIMIT_MAX_BUCKETS: int = Field(100_000, ge=1)
+    RATE_LIMIT_BACKEND: str = Field("memory", description="memory, shared or redis")
+    RATE_LIMIT_SHARED_PATH: str | None = None
+    RATE_LIMIT_SHARED_SLOTS: int = Field(65_536, ge=1)
+    RATE_LIMIT_REDIS_URL: str = Field("redis://localhost:6379/0")
+    RATE_LIMIT_REDIS_TIMEOUT_MS: int = Field(50, ge=1)
+    ADMISSION_ENABLED: bool = Field(True)
+    ADMISSION_MAX_CONCURRENCY: int = Field(256, ge=1)
+    ADMISSION_MAX_QUEUE: int = Field(512, ge=0)
+    ADMISSION_QUEUE_TIMEOUT_MS: int = Field(2000, ge=0)
+    ADMISSION_KEY_PRIORITIES: str = Field(
+        "",
+        description="Comma-delimited api_key=priority pairs (low, normal, high, critical)",
+    )
     ENERGY_TRACKING_ENABLED: bool = True
     PROMETHEUS_METRICS_ENABLED: bool = Field(True)
+    SERVER_TIMING_ENABLED: bool = Field(True)
+    LOOP_MONITOR_ENABLED: bool = Field(True)
+    LOOP_MONITOR_INTERVAL_MS: int = Field(100, ge=1)
+    LOOP_BLOCK_THRESHOLD_MS: int = Field(
+        250, ge=1, description="Log the loop's stack when a callback blocks this long"
+    )
+    PROFILE_MAX_SECONDS: float = Field(60.0, gt=0)
+    PROFILE_SAMPLE_INTERVAL_MS: int = Field(10, ge=1)
     OTEL_ENABLED: bool = Field(False)
     OTEL_EXPORTER_OTLP_ENDPOINT: str = Field("http://localhost:4318/v1/traces")
     OTEL_EXPORTER_OTLP_HEADERS: str = Field("", description="Comma-separated key=value entries")
+    OTEL_SAMPLE_RATIO: float = Field(
+        0.1, ge=0.0, le=1.0, description="Share of fast, successful traces exported"
+    )
+    OTEL_TAIL_LATENCY_MS: int = Field(1000, ge=0, description="Slower traces are always kept")
+    OTEL_TAIL_MAX_TRACES: int = Field(10_000, ge=1)
 
     LOG_LEVEL: str = Field("INFO")
     MODEL_ROUTER_WEIGHTS: str = Field("cost=0.35,latency=0.2,reliability=0.3,energy=0.15")
     LLM_PROVIDER_SEQUENCE: str = Field("openai,anthropic,cohere,azure-openai")
     STREAMING_MAX_BUFFER_KB: int = Field(256, ge=64)
+    STREAMING_FLUSH_BYTES: int = Field(4096, ge=1)
+    STREAMING_FLUSH_INTERVAL_MS: int = Field(10, ge=0)
+    JOBS_ENABLED: bool = Field(True)
+    JOBS_WORKERS: int = Field(2, ge=1)
+    JOBS_POLL_INTERVAL_SECONDS: float = Field(1.0, gt=0)
+    JOBS_LEASE_SECONDS: float = Field(30.0, gt=0)
+    CARBON_INTENSITY_THRESHOLD: float = Field(200.0, ge=0, description="gCO2/kWh")
+    BATCH_MAX_REQUESTS: int = Field(1000, ge=1)
+    BATCH_CONCURRENCY: int = Field(8, ge=1)
+    OPENAI_PASSTHROUGH_ENABLED: bool = Field(True)
+    STREAM_INCLUDE_USAGE: bool = Field(True)
+    JSON_CODEC: str = Field("auto", description="auto, orjson, msgspec or json")
+    TOKENIZER_PRELOAD_ENABLED: bool = Field(True)
+    CACHE_WARMUP_ENABLED: bool = Field(True)
+    TOKEN_COUNT_OFFLOAD_CHARS: int = Field(8192, ge=0)
+    TOKEN_COUNT_MEMO_SIZE: int = Field(4096, ge=0)
+    TOKEN_COUNT_WORKERS: int = Field(2, ge=1)
 
     # Optional gateway authentication (recommended for production)
     # If set, clients must send either:
     # - Authorization: Bearer <key>
     # - X-API-Key: <key>
     GATEWAY_API_KEY: str | None = None
+    # Enables the /admin endpoints (profiling) for callers presenting this key.
+    ADMIN_API_KEY: str | None = None
 
     @field_validator("LOG_LEVEL", mode="before")
     @classmethod
@@ -77,6 +146,17 @@ class Settings(BaseSettings):
         path.parent.mkdir(parents=True, exist_ok=True)
         return path
 
+    def jobs_path(self) -> Path:
+        path = Path(self.JOBS_DB_PATH or Path(self.DATA_DIR) / "jobs.db")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def rate_limit_shared_path(self) -> Path:
+        return Path(self.RATE_LIMIT_SHARED_PATH or Path(self.DATA_DIR) / "ratelimit.bin")
+
+    def carbon_intensity_path(self) -> Path:
+        return Path(self.CARBON_INTENSITY_PATH or Path(self.DATA_DIR) / "carbon_intensity.csv")
+
     def router_weights(self) -> dict[str, float]:
         defaults = {"cost": 0.35, "latency": 0.2, "reliability": 0.3, "energy": 0.15}
         try:
@@ -104,6 +184,30 @@ class Settings(BaseSettings):
                 continue
         return mapping
 
+    def http_pool_overrides(self) -> dict[str, int]:
+        overrides: dict[str, int] = {}
+        entries = [item.strip() for item in self.HTTP_POOL_OVERRIDES.split(",") if item.strip()]
+        for entry in entries:
+            try:
+                name, value = entry.split("=")
+                overrides[name.strip()] = max(int(value.strip()), 1)
+            except ValueError:
+                continue
+        return overrides
+
+    def admission_key_priorities(self) -> dict[str, str]:
+        mapping: dict[str, str] = {}
+        entries = [
+            item.strip() for item in self.ADMISSION_KEY_PRIORITIES.split(",") if item.strip()
+        ]
+        for entry in entries:
+            try:
+                key, value = entry.split("=")
+                mapping[key.strip()] = value.strip()
+            except ValueError:
+                continue
+        return mapping
+
     def otel_headers(self) -> dict[str, str]:
         headers: dict[str, str] = {}
         entries = [
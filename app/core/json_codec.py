@@ -0,0 +1,75 @@
+"""JSON encoding shared by the cache, the providers and HTTP responses.
+
+The fastest installed backend wins (`orjson`, then `msgspec`, then the stdlib) unless
+`JSON_CODEC` pins one explicitly. Every backend's `loads` raises a `ValueError` subclass
+on malformed input.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+
+Encoder = Callable[[Any], bytes]
+Decoder = Callable[[bytes | str], Any]
+
+
+def _stdlib() -> tuple[Encoder, Decoder]:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    return dumps, json.loads
+
+
+def _orjson() -> tuple[Encoder, Decoder]:
+    import orjson
+
+    return orjson.dumps, orjson.loads
+
+
+def _msgspec() -> tuple[Encoder, Decoder]:
+    import msgspec
+
+    return msgspec.json.Encoder().encode, msgspec.json.Decoder().decode
+
+
+_BACKENDS: dict[str, Callable[[], tuple[Encoder, Decoder]]] = {
+    "orjson": _orjson,
+    "msgspec": _msgspec,
+    "json": _stdlib,
+}
+
+
+def load_backend(preference: str) -> tuple[str, Encoder, Decoder]:
+    """Return `(name, dumps, loads)` for `preference`, falling back to the stdlib."""
+
+    candidates = ("orjson", "msgspec", "json") if preference == "auto" else (preference, "json")
+    for name in candidates:
+        factory = _BACKENDS.get(name)
+        if factory is None:
+            continue
+        try:
+            encoder, decoder = factory()
+        except ImportError:
+            continue
+        return name, encoder, decoder
+    return "json", *_stdlib()
+
+
+BACKEND, dumps, loads = load_backend(settings.JSON_CODEC.lower())
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+class CodecJSONResponse(JSONResponse):
+    """`JSONResponse` rendered with the configured codec."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -2,11 +2,16 @@ from __future__ import annotations
 
 from fastapi import HTTPException, Request, status
 
+from app.core.auth import presents_key
 from app.core.config import settings
+from app.services import rate_limiter as rate_limiting
 from app.services.cache_service import CacheService, cache_service
+from app.services.job_queue import JobService, job_service
 from app.services.metrics_service import EnergyLedger, energy_ledger
+from app.services.profiler import Profiler, profiler
 from app.services.proxy_service import ProxyService, proxy_service
-from app.services.rate_limiter import RateLimiter, rate_limiter
+from app.services.rate_limiter import RateLimiter
+from app.services.timing import stage
 
 
 def get_cache_service() -> CacheService:
@@ -21,32 +26,54 @@ def get_energy_ledger() -> EnergyLedger:
     return energy_ledger
 
 
+def get_job_service() -> JobService:
+    return job_service
+
+
+def get_profiler() -> Profiler:
+    return profiler
+
+
 def get_rate_limiter() -> RateLimiter:
-    if rate_limiter is None:
+    # Read through the module: the lifespan configures the limiter after this import.
+    limiter = rate_limiting.rate_limiter
+    if limiter is None:
         raise RuntimeError("Rate limiter has not been configured")
-    return rate_limiter
+    return limiter
 
 
-def require_gateway_auth(request: Request) -> None:
+async def require_gateway_auth(request: Request) -> None:
     """Optionally enforce an API key for the gateway.
 
-    If `settings.GATEWAY_API_KEY` is not set, this is a no-op.
+    If `settings.GATEWAY_API_KEY` is not set, this is a no-op. Declared `async` so the
+    check runs on the event loop instead of hopping to the threadpool.
     """
 
     expected = settings.GATEWAY_API_KEY
     if not expected:
         return
 
-    header_api_key = request.headers.get("x-api-key")
-    auth_header = request.headers.get("authorization")
-    bearer_token = None
-    if auth_header and auth_header.lower().startswith("bearer "):
-        bearer_token = auth_header.split(" ", 1)[1].strip()
+    with stage("auth"):
+        authorized = presents_key(request.headers, expected)
 
-    if header_api_key == expected or bearer_token == expected:
+    if authorized:
         return
 
-    raise HTTPException(
+    raise _unauthorized()
+
+
+async def require_admin_auth(request: Request) -> None:
+    """Require `settings.ADMIN_API_KEY`; the admin endpoints do not exist without it."""
+
+    expected = settings.ADMIN_API_KEY
+    if not expected:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not presents_key(request.headers, expected):
+        raise _unauthorized()
+
+
+def _unauthorized() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Unauthorized",
         headers={"WWW-Authenticate": "Bearer"},
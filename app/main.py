@@ -1,16 +1,27 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from uuid import uuid4
 
 from fastapi import FastAPI, Request, Response
-from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from app.core.config import settings
-from app.routers import chat
+from app.core.json_codec import CodecJSONResponse
+from app.routers import admin, batch, cache, chat, jobs
+from app.services.admission import AdmissionMiddleware
+from app.services.cache_service import cache_service
+from app.services.job_queue import job_service
+from app.services.loop_monitor import loop_monitor
+from app.services.metrics_export import compact_dead_workers, mark_worker_dead, render_latest
 from app.services.metrics_service import energy_ledger
 from app.services.proxy_service import proxy_service
+from app.services.rate_limit_backends import create_backend
 from app.services.rate_limiter import configure_rate_limiter
+from app.services.timing import ServerTimingMiddleware
+from app.services.token_counter import token_counter
 from app.services.tracing import configure_tracing, shutdown_tracing
+from app.services.warmup import warmup
 
 logging.basicConfig(
     level=settings.LOG_LEVEL,
@@ -21,10 +32,28 @@ logger = logging.getLogger("greengate")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    configure_rate_limiter(settings.RATE_LIMIT_PER_MINUTE)
+    limiter = configure_rate_limiter(
+        settings.RATE_LIMIT_PER_MINUTE,
+        tokens_per_minute=settings.RATE_LIMIT_TOKENS_PER_MINUTE,
+        joules_per_minute=settings.RATE_LIMIT_JOULES_PER_MINUTE,
+        backend=create_backend(),
+    )
     configure_tracing(app)
+    if settings.LOOP_MONITOR_ENABLED:
+        await loop_monitor.start()
+    await asyncio.to_thread(compact_dead_workers)
     await energy_ledger.initialize()
     await proxy_service.initialize()
+    # Warm-up runs in the background; /healthz answers 503 until it has finished.
+    if settings.TOKENIZER_PRELOAD_ENABLED:
+        models = {model for cfg in settings.provider_configs() for model in cfg.supported_models}
+        warmup.start("tokenizer", lambda: asyncio.to_thread(token_counter.preload, sorted(models)))
+    if settings.HTTP_PREWARM_ENABLED:
+        warmup.start("http", proxy_service.prewarm)
+    if settings.CACHE_WARMUP_ENABLED:
+        warmup.start("cache", cache_service.warm_up)
+    if settings.JOBS_ENABLED:
+        await job_service.start(limiter=limiter)
     logger.info(
         "Starting %s in %s mode (rate limit: %s req/min)",
         settings.PROJECT_NAME,
@@ -32,8 +61,16 @@ async def lifespan(app: FastAPI):
         settings.RATE_LIMIT_PER_MINUTE,
     )
     yield
+    await warmup.stop()
+    await job_service.stop()
+    await loop_monitor.stop()
     await proxy_service.close()
+    await limiter.close()
+    await cache_service.flush()
+    cache_service.close()
+    token_counter.close()
     shutdown_tracing()
+    mark_worker_dead()
     logger.info("Shutdown complete")
 
 
@@ -42,9 +79,18 @@ app = FastAPI(
     description="An energy-aware AI Gateway/Proxy.",
     version="0.3.0",
     lifespan=lifespan,
+    default_response_class=CodecJSONResponse,
 )
 
+app.add_middleware(AdmissionMiddleware)
+# Added after admission so it wraps the queue wait; the request-id middleware below is
+# registered later still and so sits outside it.
+app.add_middleware(ServerTimingMiddleware)
 app.include_router(chat.router)
+app.include_router(batch.router)
+app.include_router(jobs.router)
+app.include_router(cache.router)
+app.include_router(admin.router)
 
 
 @app.middleware("http")
@@ -69,14 +115,20 @@ async def root():
 
 @app.get("/healthz")
 async def healthcheck():
-    return {"status": "ok"}
+    if not warmup.ready:
+        return CodecJSONResponse(
+            {"status": "warming", "warmup": warmup.components}, status_code=503
+        )
+    return {"status": "ok", "warmup": warmup.components}
 
 
 @app.get("/metrics")
 async def metrics():
     if not settings.PROMETHEUS_METRICS_ENABLED:
         return Response(status_code=204)
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    # Off the event loop: in multiprocess mode this reads every worker's metric files.
+    content = await asyncio.to_thread(render_latest)
+    return Response(content, media_type=CONTENT_TYPE_LATEST)
 
 
 if __name__ == "__main__":
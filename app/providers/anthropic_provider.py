@@ -1,11 +1,23 @@
 from __future__ import annotations
 
-from collections.abc import AsyncIterator
-
 import httpx
 
+from app.core import json_codec
 from app.core.provider_settings import ProviderSettings
-from app.providers.base import LLMProvider, ProviderResult
+from app.providers.base import LLMProvider, ProviderResult, open_stream, requested_stream_usage
+from app.providers.transcoding import AnthropicStreamTranscoder, anthropic_to_openai, transcode
+
+
+def _tool_use(call: dict) -> dict:
+    """An OpenAI `tool_calls` entry as an Anthropic `tool_use` block."""
+
+    function = call.get("function") or {}
+    return {
+        "type": "tool_use",
+        "id": call.get("id"),
+        "name": function.get("name"),
+        "input": json_codec.loads(function.get("arguments") or "{}"),
+    }
 
 
 class AnthropicProvider(LLMProvider):
@@ -22,15 +34,18 @@ class AnthropicProvider(LLMProvider):
     async def invoke(self, payload: dict, *, stream: bool = False) -> ProviderResult:
         transformed = self._transform_payload(payload, stream=stream)
         if stream:
-            return await self._stream_response(transformed)
-        response = await self.client.post(self.endpoint, json=transformed, headers=self.headers)
+            return await self._stream_response(
+                transformed, include_usage=requested_stream_usage(payload)
+            )
+        response = await self.client.post(
+            self.endpoint, content=json_codec.dumps(transformed), headers=self.headers
+        )
         response.raise_for_status()
-        data = response.json()
-        usage = data.get("usage", {})
+        data = anthropic_to_openai(json_codec.loads(response.content), payload.get("model") or "")
         return ProviderResult(
             provider_name=self.name,
             response=data,
-            usage=usage,
+            usage=data["usage"],
             energy_modifier=self.energy_modifier,
         )
 
@@ -43,11 +58,22 @@ class AnthropicProvider(LLMProvider):
             if role == "system":
                 system_prompt = content
                 continue
+            if role == "tool":
+                block = {"type": "tool_result", "tool_use_id": message.get("tool_call_id")}
+                if content:
+                    block["content"] = content
+                # Results for one assistant turn travel together in a single user turn.
+                previous = anthropic_messages[-1] if anthropic_messages else None
+                if previous and previous["content"][-1]["type"] == "tool_result":
+                    previous["content"].append(block)
+                else:
+                    anthropic_messages.append({"role": "user", "content": [block]})
+                continue
+            blocks = [{"type": "text", "text": content}] if content else []
+            if role == "assistant":
+                blocks.extend(_tool_use(call) for call in message.get("tool_calls") or [])
             anthropic_messages.append(
-                {
-                    "role": "assistant" if role == "assistant" else "user",
-                    "content": [{"type": "text", "text": content}],
-                }
+                {"role": "assistant" if role == "assistant" else "user", "content": blocks}
             )
 
         return {
@@ -60,19 +86,20 @@ class AnthropicProvider(LLMProvider):
             "stream": stream,
         }
 
-    async def _stream_response(self, payload: dict) -> ProviderResult:
-        stream = await self.client.stream("POST", self.endpoint, json=payload, headers=self.headers)
-
-        async def generator() -> AsyncIterator[bytes]:
-            async with stream as response:
-                response.raise_for_status()
-                async for chunk in response.aiter_bytes():
-                    yield chunk
-
+    async def _stream_response(self, payload: dict, *, include_usage: bool) -> ProviderResult:
+        stream = await open_stream(
+            self.client, self.endpoint, content=json_codec.dumps(payload), headers=self.headers
+        )
+        # Filled in with the vendor's counts once the stream ends.
+        usage: dict = {}
         return ProviderResult(
             provider_name=self.name,
             response=None,
-            usage={},
+            usage=usage,
             energy_modifier=self.energy_modifier,
-            stream=generator(),
+            stream=transcode(
+                stream,
+                AnthropicStreamTranscoder(payload.get("model") or "", include_usage=include_usage),
+                usage,
+            ),
         )
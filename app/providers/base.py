@@ -4,9 +4,15 @@ from abc import ABC, abstractmethod
 from collections.abc import AsyncIterator
 from dataclasses import dataclass
 
+import httpx
+
 from app.core.provider_settings import ProviderSettings
 
 
+class ProviderError(Exception):
+    """A provider was asked for something it cannot do."""
+
+
 @dataclass(slots=True)
 class ProviderResult:
     provider_name: str
@@ -14,9 +20,65 @@ class ProviderResult:
     usage: dict
     energy_modifier: float
     stream: AsyncIterator[bytes] | None = None
+    raw_body: bytes | None = None
+
+
+def requested_stream_usage(payload: dict) -> bool:
+    """Whether the client itself asked for a usage chunk via `stream_options`."""
+
+    options = payload.get("stream_options")
+    return isinstance(options, dict) and bool(options.get("include_usage"))
+
+
+def with_stream_usage(body: bytes) -> bytes:
+    """Ask an OpenAI-format upstream to end its stream with a usage chunk.
+
+    Patches the encoded request in place of re-serialising it; a client that already
+    sent `stream_options` is left alone.
+    """
+
+    if b'"stream_options"' in body:
+        return body
+    start = body.find(b"{") + 1
+    if start == 0 or body[start:].lstrip().startswith(b"}"):
+        return body
+    return body[:start] + b'"stream_options":{"include_usage":true},' + body[start:]
+
+
+async def open_stream(
+    client: httpx.AsyncClient,
+    url: str,
+    *,
+    headers: dict[str, str],
+    content: bytes,
+) -> AsyncIterator[bytes]:
+    """Send a streaming POST and return its body iterator once the status is known.
+
+    Errors surface here rather than mid-stream so the proxy can retry them, and closing
+    the returned generator closes the upstream connection.
+    """
+
+    request = client.build_request("POST", url, content=content, headers=headers)
+    response = await client.send(request, stream=True)
+    if response.is_error:
+        await response.aread()
+        await response.aclose()
+        response.raise_for_status()
+
+    async def generator() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    return generator()
 
 
 class LLMProvider(ABC):
+    # Providers that speak the OpenAI wire format can forward client bytes untouched.
+    supports_passthrough = False
+
     def __init__(self, settings: ProviderSettings) -> None:
         self.settings = settings
         self.name = settings.name
@@ -31,3 +93,11 @@ class LLMProvider(ABC):
     @abstractmethod
     async def invoke(self, payload: dict, *, stream: bool = False) -> ProviderResult:
         ...
+
+    async def invoke_raw(self, body: bytes, *, model: str, stream: bool = False) -> ProviderResult:
+        """Forward an already-encoded OpenAI request body and return the upstream bytes.
+
+        Only providers with `supports_passthrough` implement this; callers check the flag.
+        """
+
+        raise ProviderError(f"{self.name} does not support raw passthrough")
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-from collections.abc import AsyncIterator
-
 import httpx
 
+from app.core import json_codec
 from app.core.provider_settings import ProviderSettings
-from app.providers.base import LLMProvider, ProviderResult
+from app.providers.base import LLMProvider, ProviderResult, open_stream, requested_stream_usage
+from app.providers.transcoding import CohereStreamTranscoder, cohere_to_openai, transcode
 
 
 class CohereProvider(LLMProvider):
@@ -22,33 +22,37 @@ class CohereProvider(LLMProvider):
     async def invoke(self, payload: dict, *, stream: bool = False) -> ProviderResult:
         request_payload = self._translate_payload(payload, stream=stream)
         if stream:
-            return await self._stream_response(request_payload)
-        response = await self.client.post(self.endpoint, json=request_payload, headers=self.headers)
+            return await self._stream_response(
+                request_payload, include_usage=requested_stream_usage(payload)
+            )
+        response = await self.client.post(
+            self.endpoint, content=json_codec.dumps(request_payload), headers=self.headers
+        )
         response.raise_for_status()
-        data = response.json()
-        usage: dict = data.get("usage", {})
+        data = cohere_to_openai(json_codec.loads(response.content), payload.get("model") or "")
         return ProviderResult(
             provider_name=self.name,
             response=data,
-            usage=usage,
+            usage=data["usage"],
             energy_modifier=self.energy_modifier,
         )
 
-    async def _stream_response(self, payload: dict) -> ProviderResult:
-        stream = await self.client.stream("POST", self.endpoint, json=payload, headers=self.headers)
-
-        async def generator() -> AsyncIterator[bytes]:
-            async with stream as response:
-                response.raise_for_status()
-                async for chunk in response.aiter_bytes():
-                    yield chunk
-
+    async def _stream_response(self, payload: dict, *, include_usage: bool) -> ProviderResult:
+        stream = await open_stream(
+            self.client, self.endpoint, content=json_codec.dumps(payload), headers=self.headers
+        )
+        # Filled in with the vendor's counts once the stream ends.
+        usage: dict = {}
         return ProviderResult(
             provider_name=self.name,
             response=None,
-            usage={},
+            usage=usage,
             energy_modifier=self.energy_modifier,
-            stream=generator(),
+            stream=transcode(
+                stream,
+                CohereStreamTranscoder(payload.get("model") or "", include_usage=include_usage),
+                usage,
+            ),
         )
 
     def _translate_payload(self, payload: dict, *, stream: bool) -> dict:
@@ -66,8 +70,16 @@ class CohereProvider(LLMProvider):
                         text_parts.append(str(part))
                 text = " ".join(filter(None, text_parts))
             else:
-                text = str(content)
-            converted.append({"role": role, "content": text})
+                text = str(content or "")
+            entry = {"role": role, "content": text}
+            if message.get("tool_calls"):
+                # Cohere takes OpenAI-shaped tool calls; an empty text part is rejected.
+                entry["tool_calls"] = message["tool_calls"]
+                if not text:
+                    del entry["content"]
+            if message.get("tool_call_id"):
+                entry["tool_call_id"] = message["tool_call_id"]
+            converted.append(entry)
 
         cohere_payload = {
             "model": payload.get("model"),
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-from collections.abc import AsyncIterator
-
 import httpx
 
+from app.core import json_codec
+from app.core.config import settings as app_settings
 from app.core.provider_settings import ProviderSettings
-from app.providers.base import LLMProvider, ProviderResult
+from app.providers.base import LLMProvider, ProviderResult, open_stream, with_stream_usage
 
 
 class OpenAIProvider(LLMProvider):
+    supports_passthrough = True
+
     def __init__(self, settings: ProviderSettings, client: httpx.AsyncClient) -> None:
         super().__init__(settings)
         self.client = client
@@ -21,11 +23,15 @@ class OpenAIProvider(LLMProvider):
     async def invoke(self, payload: dict, *, stream: bool = False) -> ProviderResult:
         request_payload = dict(payload)
         request_payload["stream"] = stream
+        if stream and app_settings.STREAM_INCLUDE_USAGE:
+            request_payload.setdefault("stream_options", {"include_usage": True})
         if stream:
-            return await self._stream_response(request_payload)
-        response = await self.client.post(self.endpoint, json=request_payload, headers=self.headers)
+            return await self._stream_response(json_codec.dumps(request_payload))
+        response = await self.client.post(
+            self.endpoint, content=json_codec.dumps(request_payload), headers=self.headers
+        )
         response.raise_for_status()
-        data = response.json()
+        data = json_codec.loads(response.content)
         usage: dict = data.get("usage", {})
         return ProviderResult(
             provider_name=self.name,
@@ -34,19 +40,30 @@ class OpenAIProvider(LLMProvider):
             energy_modifier=self.energy_modifier,
         )
 
-    async def _stream_response(self, payload: dict) -> ProviderResult:
-        stream = await self.client.stream("POST", self.endpoint, json=payload, headers=self.headers)
-
-        async def generator() -> AsyncIterator[bytes]:
-            async with stream as response:
-                response.raise_for_status()
-                async for chunk in response.aiter_bytes():
-                    yield chunk
+    async def invoke_raw(self, body: bytes, *, model: str, stream: bool = False) -> ProviderResult:
+        if stream:
+            if app_settings.STREAM_INCLUDE_USAGE:
+                body = with_stream_usage(body)
+            return await self._stream_response(body)
+        response = await self.client.post(self.endpoint, content=body, headers=self.headers)
+        response.raise_for_status()
+        data = json_codec.loads(response.content)
+        return ProviderResult(
+            provider_name=self.name,
+            response=data,
+            usage=data.get("usage", {}),
+            energy_modifier=self.energy_modifier,
+            raw_body=response.content,
+        )
 
+    async def _stream_response(self, content: bytes) -> ProviderResult:
+        stream = await open_stream(
+            self.client, self.endpoint, content=content, headers=self.headers
+        )
         return ProviderResult(
             provider_name=self.name,
             response=None,
             usage={},
             energy_modifier=self.energy_modifier,
-            stream=generator(),
+            stream=stream,
         )
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+
+class SSEDecoder:
+    """Incrementally extracts event payloads from a server-sent event byte stream.
+
+    Chunks may split lines (and events) anywhere; only the trailing partial line is held
+    back between calls. `data:` lines are returned with the prefix stripped, and bare JSON
+    lines are returned as-is for vendors that stream newline-delimited JSON.
+    """
+
+    __slots__ = ("_pending",)
+
+    def __init__(self) -> None:
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        if self._pending:
+            chunk = self._pending + chunk
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            self._pending = chunk
+            return []
+        self._pending = chunk[end + 1 :]
+        return self._payloads(chunk[:end].split(b"\n"))
+
+    def finish(self) -> list[bytes]:
+        pending, self._pending = self._pending, b""
+        return self._payloads([pending]) if pending else []
+
+    @staticmethod
+    def _payloads(lines: list[bytes]) -> list[bytes]:
+        payloads: list[bytes] = []
+        for line in lines:
+            if line.startswith(b"data:"):
+                payloads.append(line[5:].strip())
+            elif line.startswith(b"{"):
+                payloads.append(line.rstrip(b"\r"))
+        return payloads
@@ -0,0 +1,302 @@
+"""Rewrites vendor responses into the OpenAI chat-completion schema.
+
+Complete responses are mapped with `anthropic_to_openai` / `cohere_to_openai`. Stream
+transcoders are fed raw upstream chunks and return `chat.completion.chunk` server-sent
+events ready to be relayed; the JSON envelope around every delta is encoded once per
+stream, so a content event costs one encode of its text plus a join.
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+
+from app.core import json_codec
+from app.providers.sse import SSEDecoder
+
+DONE = b"data: [DONE]\n\n"
+_ROLE_DELTA = b'{"index":0,"delta":{"role":"assistant","content":""},"finish_reason":null}]}\n\n'
+_CONTENT_OPEN = b'{"index":0,"delta":{"content":'
+_CONTENT_CLOSE = b'},"finish_reason":null}]}\n\n'
+
+ANTHROPIC_FINISH_REASONS = {
+    "end_turn": "stop",
+    "stop_sequence": "stop",
+    "max_tokens": "length",
+    "tool_use": "tool_calls",
+}
+
+COHERE_FINISH_REASONS = {
+    "COMPLETE": "stop",
+    "STOP_SEQUENCE": "stop",
+    "MAX_TOKENS": "length",
+    "TOOL_CALL": "tool_calls",
+    "ERROR": "stop",
+    "ERROR_TOXIC": "content_filter",
+}
+
+
+def _usage(prompt_tokens: object, completion_tokens: object) -> dict[str, int]:
+    prompt = int(prompt_tokens or 0)
+    completion = int(completion_tokens or 0)
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+    }
+
+
+def _completion(
+    response_id: object, model: str, text: str, finish_reason: str, usage: dict[str, int]
+) -> dict:
+    return {
+        "id": str(response_id or f"chatcmpl-{uuid.uuid4().hex}"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": finish_reason,
+            }
+        ],
+        "usage": usage,
+    }
+
+
+def _text_blocks(blocks: object) -> str:
+    if not isinstance(blocks, list):
+        return ""
+    return "".join(
+        block.get("text") or ""
+        for block in blocks
+        if isinstance(block, dict) and block.get("type", "text") == "text"
+    )
+
+
+def anthropic_to_openai(data: dict, model: str) -> dict:
+    """Map an Anthropic Messages response onto an OpenAI `chat.completion`."""
+
+    usage = data.get("usage") or {}
+    return _completion(
+        data.get("id"),
+        model,
+        _text_blocks(data.get("content")),
+        ANTHROPIC_FINISH_REASONS.get(data.get("stop_reason") or "", "stop"),
+        _usage(usage.get("input_tokens"), usage.get("output_tokens")),
+    )
+
+
+def cohere_to_openai(data: dict, model: str) -> dict:
+    """Map a Cohere chat response (v2 `message`/`usage` or v1 `text`/`meta`)."""
+
+    if "message" in data:
+        text = _text_blocks((data.get("message") or {}).get("content"))
+        usage = data.get("usage") or {}
+    else:
+        text = str(data.get("text") or "")
+        usage = data.get("meta") or {}
+    counts = usage.get("tokens") or usage.get("billed_units") or {}
+    return _completion(
+        data.get("id") or data.get("generation_id"),
+        model,
+        text,
+        COHERE_FINISH_REASONS.get(data.get("finish_reason") or "", "stop"),
+        _usage(counts.get("input_tokens"), counts.get("output_tokens")),
+    )
+
+
+class StreamTranscoder(ABC):
+    """Base class holding the per-stream envelope and the OpenAI chunk encoders."""
+
+    __slots__ = (
+        "_decoder",
+        "_prefix",
+        "_include_usage",
+        "_done",
+        "prompt_tokens",
+        "completion_tokens",
+    )
+
+    def __init__(self, model: str, *, include_usage: bool = True) -> None:
+        self._decoder = SSEDecoder()
+        self._include_usage = include_usage
+        self._done = False
+        self._set_envelope(f"chatcmpl-{uuid.uuid4().hex}", model)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _set_envelope(self, response_id: str, model: str) -> None:
+        head = json_codec.dumps(
+            {
+                "id": response_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+            }
+        )
+        self._prefix = b"data: " + head[:-1] + b',"choices":['
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self._done:
+            return b""
+        return self._translate(self._decoder.feed(chunk))
+
+    def finish(self) -> bytes:
+        """Flush buffered input and close the stream if the vendor never did."""
+
+        if self._done:
+            return b""
+        out = self._translate(self._decoder.finish())
+        if self._done:
+            return out
+        return out + self._close(None)
+
+    def _translate(self, payloads: list[bytes]) -> bytes:
+        out: list[bytes] = []
+        for payload in payloads:
+            if self._done:
+                break
+            try:
+                event = json_codec.loads(payload)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                self._handle(event, out)
+        return b"".join(out)
+
+    @abstractmethod
+    def _handle(self, event: dict, out: list[bytes]) -> None:
+        """Translate one vendor event, appending OpenAI chunks to `out`."""
+
+    def _role(self) -> bytes:
+        return self._prefix + _ROLE_DELTA
+
+    def _content(self, text: str) -> bytes:
+        return b"".join((self._prefix, _CONTENT_OPEN, json_codec.dumps(text), _CONTENT_CLOSE))
+
+    def _close(self, finish_reason: str | None) -> bytes:
+        """Emit the final choice, the usage chunk and the `[DONE]` sentinel once."""
+
+        if self._done:
+            return b""
+        self._done = True
+        parts = [
+            self._prefix
+            + b'{"index":0,"delta":{},"finish_reason":'
+            + json_codec.dumps(finish_reason or "stop")
+            + b"}]}\n\n"
+        ]
+        if self._include_usage:
+            usage = json_codec.dumps(
+                {
+                    "prompt_tokens": self.prompt_tokens,
+                    "completion_tokens": self.completion_tokens,
+                    "total_tokens": self.prompt_tokens + self.completion_tokens,
+                }
+            )
+            parts.append(self._prefix + b'],"usage":' + usage + b"}\n\n")
+        parts.append(DONE)
+        return b"".join(parts)
+
+    def _error(self, error: object) -> bytes:
+        self._done = True
+        message = error if isinstance(error, str) else json_codec.dumps_str(error)
+        return (
+            b"data: "
+            + json_codec.dumps({"error": {"message": message, "type": "upstream_error"}})
+            + b"\n\n"
+            + DONE
+        )
+
+
+class AnthropicStreamTranscoder(StreamTranscoder):
+    """Anthropic Messages events (`message_start`, `content_block_delta`, ...)."""
+
+    __slots__ = ("_stop_reason",)
+
+    def __init__(self, model: str, *, include_usage: bool = True) -> None:
+        super().__init__(model, include_usage=include_usage)
+        self._stop_reason: str | None = None
+
+    def _handle(self, event: dict, out: list[bytes]) -> None:
+        kind = event.get("type")
+        if kind == "content_block_delta":
+            text = (event.get("delta") or {}).get("text")
+            if text:
+                out.append(self._content(text))
+        elif kind == "message_start":
+            message = event.get("message") or {}
+            usage = message.get("usage") or {}
+            self.prompt_tokens = int(usage.get("input_tokens") or 0)
+            self.completion_tokens = int(usage.get("output_tokens") or 0)
+            out.append(self._role())
+        elif kind == "message_delta":
+            stop_reason = (event.get("delta") or {}).get("stop_reason")
+            if stop_reason:
+                self._stop_reason = ANTHROPIC_FINISH_REASONS.get(stop_reason, "stop")
+            usage = event.get("usage") or {}
+            if "output_tokens" in usage:
+                self.completion_tokens = int(usage["output_tokens"] or 0)
+        elif kind == "message_stop":
+            out.append(self._close(self._stop_reason))
+        elif kind == "error":
+            out.append(self._error((event.get("error") or {}).get("message") or event))
+
+
+class CohereStreamTranscoder(StreamTranscoder):
+    """Cohere chat events, both v2 (`type`) and v1 (`event_type`) shapes."""
+
+    __slots__ = ()
+
+    def _handle(self, event: dict, out: list[bytes]) -> None:
+        kind = event.get("type") or event.get("event_type")
+        if kind == "content-delta":
+            content = ((event.get("delta") or {}).get("message") or {}).get("content") or {}
+            text = content.get("text")
+            if text:
+                out.append(self._content(text))
+        elif kind == "text-generation":
+            text = event.get("text")
+            if text:
+                out.append(self._content(text))
+        elif kind in {"message-start", "stream-start"}:
+            out.append(self._role())
+        elif kind == "message-end":
+            delta = event.get("delta") or {}
+            self._take_usage(delta.get("usage") or {})
+            out.append(self._close(COHERE_FINISH_REASONS.get(delta.get("finish_reason"))))
+        elif kind == "stream-end":
+            self._take_usage((event.get("response") or {}).get("meta") or {})
+            out.append(self._close(COHERE_FINISH_REASONS.get(event.get("finish_reason"))))
+
+    def _take_usage(self, usage: dict) -> None:
+        counts = usage.get("tokens") or usage.get("billed_units") or {}
+        self.prompt_tokens = int(counts.get("input_tokens") or 0)
+        self.completion_tokens = int(counts.get("output_tokens") or 0)
+
+
+async def transcode(
+    source: AsyncIterator[bytes], transcoder: StreamTranscoder, usage: dict | None = None
+) -> AsyncIterator[bytes]:
+    """Relay `source` through `transcoder`; closing the result closes the upstream.
+
+    Once the stream has ended, the vendor's token counts are written into `usage`, so they
+    reach the ledger even when no usage chunk is emitted.
+    """
+
+    async with aclosing(source) as upstream:
+        async for chunk in upstream:
+            out = transcoder.feed(chunk)
+            if out:
+                yield out
+    tail = transcoder.finish()
+    if usage is not None and (transcoder.prompt_tokens or transcoder.completion_tokens):
+        usage["prompt_tokens"] = transcoder.prompt_tokens
+        usage["completion_tokens"] = transcoder.completion_tokens
+    if tail:
+        yield tail
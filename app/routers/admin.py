@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import os
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+
+from app.core.config import settings
+from app.dependencies import get_profiler, require_admin_auth
+from app.services.profiler import Profiler, ProfilerBusyError
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_auth)])
+
+
+def _check_duration(seconds: float) -> None:
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must be at most {settings.PROFILE_MAX_SECONDS:g}",
+        )
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A profile is already running in this worker",
+    )
+
+
+@router.post("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    mode: Literal["cpu", "wall", "alloc"] = "cpu",
+    profiler: Profiler = Depends(get_profiler),
+):
+    """Profile the worker that answers for `seconds` and return the artifact.
+
+    `cpu` returns a pstats file; `wall` and `alloc` return collapsed stacks for flame
+    graph tools. Each worker profiles only itself; `X-GreenGate-Worker` names it.
+    """
+
+    _check_duration(seconds)
+    try:
+        result = await profiler.profile(mode, seconds)
+    except ProfilerBusyError:
+        raise _busy() from None
+    return Response(
+        result.content,
+        media_type=result.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{result.filename}"',
+            "X-GreenGate-Worker": str(os.getpid()),
+        },
+    )
+
+
+@router.get("/profile/allocations")
+async def allocations(
+    limit: int = Query(25, ge=1, le=500),
+    seconds: float = Query(10.0, gt=0),
+    profiler: Profiler = Depends(get_profiler),
+):
+    """Top allocation sites by traced bytes (see `Profiler.top_allocations`)."""
+
+    _check_duration(seconds)
+    try:
+        return await profiler.top_allocations(limit=limit, seconds=seconds)
+    except ProfilerBusyError:
+        raise _busy() from None
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.core import json_codec
+from app.core.config import settings
+from app.core.energy import EnergyMeter
+from app.dependencies import (
+    get_cache_service,
+    get_energy_ledger,
+    get_proxy_service,
+    get_rate_limiter,
+    require_gateway_auth,
+)
+from app.providers.base import ProviderResult
+from app.schemas.chat import BatchChatCompletionRequest, ChatCompletionRequest
+from app.services.accounting import caller, reserve, response_usage, safe_int
+from app.services.cache_service import CacheService, cache_prompt, cache_scope
+from app.services.cancellation import request_deadline
+from app.services.metrics_service import EnergyLedger
+from app.services.observability import record_request
+from app.services.proxy_service import ProxyService
+from app.services.rate_limiter import RateLimiter, Reservation
+
+router = APIRouter()
+
+
+def _line(index: int, **fields: object) -> bytes:
+    return json_codec.dumps({"index": index, **fields}) + b"\n"
+
+
+def _error_line(index: int, status_code: int, message: object) -> bytes:
+    return _line(index, status=status_code, error={"message": message})
+
+
+async def _reserve_misses(
+    limiter: RateLimiter, request: Request, misses: list[ChatCompletionRequest]
+) -> dict[str, Reservation]:
+    """Charge one request per item going upstream, to each item's own caller.
+
+    All or nothing: when any caller is short, what was already charged is refunded and
+    the 429 propagates.
+    """
+
+    per_caller: dict[str, list[ChatCompletionRequest]] = {}
+    for item in misses:
+        per_caller.setdefault(caller(item, request), []).append(item)
+    reservations: dict[str, Reservation] = {}
+    try:
+        for identifier, items in per_caller.items():
+            reservations[identifier] = await reserve(limiter, identifier, items)
+    except HTTPException:
+        for reservation in reservations.values():
+            await limiter.refund(reservation)
+        raise
+    return reservations
+
+
+@router.post("/v1/batch/chat/completions")
+async def batch_chat_completions(
+    batch: BatchChatCompletionRequest,
+    request: Request,
+    _: None = Depends(require_gateway_auth),
+    cache_service: CacheService = Depends(get_cache_service),
+    proxy: ProxyService = Depends(get_proxy_service),
+    ledger: EnergyLedger = Depends(get_energy_ledger),
+    limiter: RateLimiter = Depends(get_rate_limiter),
+):
+    """Run many non-streaming completions and stream one NDJSON line per request.
+
+    Lines arrive as items finish and carry the item's `index` in the batch. Identical
+    requests are answered by a single upstream call (`"cache": "dedup"` on the copies),
+    cache lookups for the whole batch go out as one bulk query, and misses are sent
+    upstream at most `BATCH_CONCURRENCY` at a time.
+
+    Each miss is charged to the rate limiter as one request of its caller (the item's
+    `user`, else the client address), as chat completions are; the whole batch is
+    rejected with a 429 before any work starts when that cannot be covered.
+    """
+
+    if len(batch.requests) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"A batch may contain at most {settings.BATCH_MAX_REQUESTS} requests",
+        )
+    deadline = request_deadline(request)
+
+    rejected: list[int] = []
+    groups: dict[bytes, list[int]] = {}
+    for index, item in enumerate(batch.requests):
+        if item.stream:
+            rejected.append(index)
+            continue
+        key = json_codec.dumps(item.model_dump(exclude={"user"}, exclude_none=True))
+        groups.setdefault(key, []).append(index)
+    unique = [(indices, batch.requests[indices[0]]) for indices in groups.values()]
+    prompts = [cache_prompt(item.messages) for _, item in unique]
+    scopes = [cache_scope(item) for _, item in unique]
+    hits = await cache_service.get_cached_responses(prompts, scopes=scopes)
+    # Copies of a request share its upstream call, so a group is charged once, to the
+    # caller of its first item.
+    reservations = await _reserve_misses(
+        limiter, request, [item for (_, item), hit in zip(unique, hits, strict=True) if hit is None]
+    )
+    used = {identifier: [0.0, 0.0] for identifier in reservations}
+
+    async def results() -> AsyncIterator[bytes]:
+        entries: list[dict] = []
+        semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+        tasks: dict[asyncio.Task[ProviderResult], tuple[list[int], str, ChatCompletionRequest]] = {}
+
+        async def forward(item: ChatCompletionRequest) -> ProviderResult:
+            async with semaphore:
+                return await proxy.forward_request(item, stream=False, deadline=deadline)
+
+        async def finish(task: asyncio.Task[ProviderResult]) -> list[bytes]:
+            indices, prompt, item = tasks[task]
+            try:
+                result = task.result()
+            except HTTPException as exc:
+                return [_error_line(index, exc.status_code, exc.detail) for index in indices]
+            except Exception as exc:
+                return [_error_line(index, 502, str(exc)) for index in indices]
+            if result.response is None:
+                message = "Provider returned empty response"
+                return [_error_line(index, 502, message) for index in indices]
+
+            prompt_tokens, completion_tokens = await response_usage(item, result)
+            energy_joules = EnergyMeter.calculate_energy(
+                item.model,
+                prompt_tokens,
+                completion_tokens,
+                efficiency_modifier=result.energy_modifier,
+            )
+            usage = used[caller(item, request)]
+            usage[0] += prompt_tokens + completion_tokens
+            usage[1] += energy_joules
+            await cache_service.save_response(
+                prompt,
+                result.response,
+                scope=cache_scope(item),
+                model=item.model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                energy_joules=energy_joules,
+                provider=result.provider_name,
+            )
+            lines = []
+            for position, index in enumerate(indices):
+                # Copies of a request reuse the first call, which is energy saved.
+                spent, saved = (energy_joules, 0.0) if position == 0 else (0.0, energy_joules)
+                cache_status = "miss" if position == 0 else "dedup"
+                entries.append(
+                    {
+                        "spent": spent,
+                        "saved": saved,
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                    }
+                )
+                record_request(
+                    provider=result.provider_name,
+                    cache_status=cache_status,
+                    status="200",
+                    spent=spent,
+                    saved=saved,
+                )
+                lines.append(
+                    _line(
+                        index,
+                        status=200,
+                        cache=cache_status,
+                        provider=result.provider_name,
+                        energy_joules=spent,
+                        response=result.response,
+                    )
+                )
+            return lines
+
+        try:
+            for index in rejected:
+                yield _error_line(index, 400, "Streaming requests cannot be batched")
+
+            for (indices, item), prompt, hit in zip(unique, prompts, hits, strict=True):
+                if hit is None:
+                    tasks[asyncio.create_task(forward(item))] = (indices, prompt, item)
+                    continue
+                provider = hit.metadata.get("provider", "cache")
+                for index in indices:
+                    entries.append(
+                        {
+                            "spent": 0.0,
+                            "saved": hit.estimated_energy,
+                            "prompt_tokens": safe_int(hit.metadata.get("prompt_tokens")),
+                            "completion_tokens": safe_int(hit.metadata.get("completion_tokens")),
+                        }
+                    )
+                    record_request(
+                        provider=provider,
+                        cache_status="hit",
+                        status="200",
+                        spent=0.0,
+                        saved=hit.estimated_energy,
+                    )
+                    yield _line(
+                        index,
+                        status=200,
+                        cache="hit",
+                        provider=provider,
+                        energy_joules=0.0,
+                        response=hit.response,
+                    )
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for line in await finish(task):
+                        yield line
+        finally:
+            for task in tasks:
+                task.cancel()
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await ledger.record_many(entries)
+                for identifier, reservation in reservations.items():
+                    tokens, joules = used[identifier]
+                    await limiter.settle(reservation, tokens=tokens, joules=joules)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
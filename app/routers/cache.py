@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends
+
+from app.dependencies import get_cache_service, require_gateway_auth
+from app.services.cache_service import CacheService
+
+router = APIRouter()
+
+
+@router.get("/v1/cache/stats")
+async def cache_stats(
+    _: None = Depends(require_gateway_auth),
+    cache: CacheService = Depends(get_cache_service),
+):
+    """Semantic cache size, prompts stored more than once and bytes on disk.
+
+    Walks the whole collection, so it is meant for tuning sessions, not frequent polling.
+    """
+
+    return await cache.stats()
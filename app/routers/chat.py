@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+import time
+from contextlib import aclosing
 
-import tiktoken
+import anyio
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 
+from app.core.config import settings
 from app.core.energy import EnergyMeter
+from app.core.json_codec import CodecJSONResponse
 from app.dependencies import (
     get_cache_service,
     get_energy_ledger,
@@ -14,12 +17,31 @@ from app.dependencies import (
     get_rate_limiter,
     require_gateway_auth,
 )
-from app.schemas.chat import ChatCompletionRequest, ChatMessage
-from app.services.cache_service import CacheHit, CacheService
+from app.providers.base import requested_stream_usage
+from app.schemas.chat import ChatCompletionRequest
+from app.services.accounting import (
+    caller,
+    count_completion_tokens,
+    count_prompt_tokens,
+    record_cache_hit,
+    record_upstream_usage,
+    reserve,
+    response_usage,
+)
+from app.services.cache_service import CacheHit, CacheService, cache_prompt, cache_scope
+from app.services.cancellation import (
+    ClientDisconnectedError,
+    cancel_on_disconnect,
+    request_deadline,
+)
 from app.services.metrics_service import EnergyLedger
 from app.services.observability import record_request
 from app.services.proxy_service import ProxyService
-from app.services.rate_limiter import RateLimiter
+from app.services.rate_limiter import RateLimiter, Reservation
+from app.services.stream_metrics import StreamTimer
+from app.services.stream_pipeline import coalesce_stream
+from app.services.stream_usage import StreamUsageTracker, drop_usage_chunks
+from app.services.timing import stage
 
 router = APIRouter()
 
@@ -28,8 +50,6 @@ router = APIRouter()
 async def list_models(_: None = Depends(require_gateway_auth)):
     """List models available through currently configured providers."""
 
-    from app.core.config import settings
-
     model_providers: dict[str, set[str]] = {}
     for provider in settings.provider_configs():
         # If a provider doesn't specify supported_models, treat as "supports all" and
@@ -49,170 +69,243 @@ async def list_models(_: None = Depends(require_gateway_auth)):
     return {"object": "list", "data": data}
 
 
-def _serialize_messages(messages: Iterable[ChatMessage]) -> str:
-    return "\n".join(f"{message.role}:{message.content.strip()}" for message in messages)
-
-
-def _count_tokens(text: str, model: str) -> int:
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(text))
-
-
-def _estimate_usage(messages, completion_text: str, model: str) -> tuple[int, int]:
-    prompt_text = "\n".join(message.content for message in messages)
-    return _count_tokens(prompt_text, model), _count_tokens(completion_text, model)
-
-
-def _safe_int(value: str | None) -> int:
-    try:
-        return int(value) if value is not None else 0
-    except (TypeError, ValueError):
-        return 0
-
-
 @router.post("/v1/chat/completions")
 async def chat_completions(
     payload: ChatCompletionRequest,
     request: Request,
-    response: Response,
     _: None = Depends(require_gateway_auth),
     cache_service: CacheService = Depends(get_cache_service),
     proxy: ProxyService = Depends(get_proxy_service),
     ledger: EnergyLedger = Depends(get_energy_ledger),
     limiter: RateLimiter = Depends(get_rate_limiter),
 ):
-    identifier = payload.user or (request.client.host if request.client else "anonymous")
-    await limiter.check(identifier)
+    with stage("rate_limit"):
+        reservation = await reserve(limiter, caller(payload, request), (payload,))
+    deadline = request_deadline(request)
+    # Starlette has already buffered the body for validation, so this does not copy it.
+    raw_body = await request.body() if settings.OPENAI_PASSTHROUGH_ENABLED else None
 
     if payload.stream:
-        return await _handle_streaming(payload, proxy, ledger)
-
-    prompt_for_cache = _serialize_messages(payload.messages)
-
-    cache_hit: CacheHit | None = await cache_service.get_cached_response(prompt_for_cache)
-    if cache_hit:
-        response.headers["X-GreenGate-Status"] = "CACHE_HIT"
-        response.headers["X-GreenGate-Energy-Joules"] = "0.0"
-        response.headers["X-GreenGate-Cache-Similarity"] = f"{cache_hit.similarity:.3f}"
-        response.headers["X-GreenGate-Provider"] = cache_hit.metadata.get("provider", "cache")
-        await ledger.record(
-            spent=0.0,
-            saved=cache_hit.estimated_energy,
-            prompt_tokens=_safe_int(cache_hit.metadata.get("prompt_tokens")),
-            completion_tokens=_safe_int(cache_hit.metadata.get("completion_tokens")),
-        )
-        record_request(
-            provider=cache_hit.metadata.get("provider", "cache"),
-            cache_status="hit",
-            status="200",
-            spent=0.0,
-            saved=cache_hit.estimated_energy,
+        return await _handle_streaming(
+            payload, request, proxy, ledger, limiter, reservation, deadline, raw_body
         )
-        return cache_hit.response
 
-    provider_result = await proxy.forward_request(
-        payload.model_dump(exclude_none=True),
-        stream=False,
-    )
+    # Settled exactly once on the way out: with what was used, or nothing if the request
+    # failed or was answered from the cache.
+    used: tuple[int, float] = (0, 0.0)
+    try:
+        prompt_for_cache = cache_prompt(payload.messages)
+        scope = cache_scope(payload)
 
-    llm_response = provider_result.response
-    if llm_response is None:
-        raise HTTPException(status_code=502, detail="Provider returned empty response")
+        with stage("cache_lookup"):
+            cache_hit: CacheHit | None = await cache_service.get_cached_response(
+                prompt_for_cache, scope=scope
+            )
+        if cache_hit:
+            await record_cache_hit(ledger, cache_hit)
+            headers = {
+                "X-GreenGate-Status": "CACHE_HIT",
+                "X-GreenGate-Energy-Joules": "0.0",
+                "X-GreenGate-Cache-Similarity": f"{cache_hit.similarity:.3f}",
+                "X-GreenGate-Provider": cache_hit.metadata.get("provider", "cache"),
+            }
+            with stage("serialize"):
+                return CodecJSONResponse(cache_hit.response, headers=headers)
 
-    usage = provider_result.usage or llm_response.get("usage", {})
-    prompt_tokens = usage.get("prompt_tokens", 0)
-    completion_tokens = usage.get("completion_tokens", 0)
+        try:
+            with stage("upstream"):
+                provider_result = await cancel_on_disconnect(
+                    request,
+                    proxy.forward_request(
+                        payload, stream=False, deadline=deadline, raw_body=raw_body
+                    ),
+                )
+        except ClientDisconnectedError:
+            prompt_tokens = await count_prompt_tokens(payload.messages, payload.model)
+            energy_joules = await record_upstream_usage(
+                ledger,
+                provider="unknown",
+                model=payload.model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=0,
+                energy_modifier=1.0,
+                status="499",
+            )
+            used = (prompt_tokens, energy_joules)
+            return Response(status_code=499)
 
-    if prompt_tokens == 0 and completion_tokens == 0:
-        completion_text = llm_response.get("choices", [{}])[0].get("message", {}).get("content", "")
-        prompt_tokens, completion_tokens = _estimate_usage(
-            payload.messages,
-            completion_text,
-            payload.model,
-        )
+        llm_response = provider_result.response
+        if llm_response is None:
+            raise HTTPException(status_code=502, detail="Provider returned empty response")
 
-    energy_joules = EnergyMeter.calculate_energy(
-        payload.model,
-        prompt_tokens,
-        completion_tokens,
-        efficiency_modifier=provider_result.energy_modifier,
-    )
+        prompt_tokens, completion_tokens = await response_usage(payload, provider_result)
 
-    await cache_service.save_response(
-        prompt_for_cache,
-        llm_response,
-        model=payload.model,
-        prompt_tokens=prompt_tokens,
-        completion_tokens=completion_tokens,
-        energy_joules=energy_joules,
-        provider=provider_result.provider_name,
-    )
+        energy_joules = EnergyMeter.calculate_energy(
+            payload.model,
+            prompt_tokens,
+            completion_tokens,
+            efficiency_modifier=provider_result.energy_modifier,
+        )
 
-    await ledger.record(
-        spent=energy_joules,
-        saved=0.0,
-        prompt_tokens=prompt_tokens,
-        completion_tokens=completion_tokens,
-    )
+        with stage("cache_store"):
+            await cache_service.save_response(
+                prompt_for_cache,
+                llm_response,
+                scope=scope,
+                model=payload.model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                energy_joules=energy_joules,
+                provider=provider_result.provider_name,
+                serialized=(
+                    provider_result.raw_body.decode("utf-8")
+                    if provider_result.raw_body is not None
+                    else None
+                ),
+            )
 
-    record_request(
-        provider=provider_result.provider_name,
-        cache_status="miss",
-        status="200",
-        spent=energy_joules,
-        saved=0.0,
-    )
+        with stage("ledger"):
+            await ledger.record(
+                spent=energy_joules,
+                saved=0.0,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+            )
+        used = (prompt_tokens + completion_tokens, energy_joules)
 
-    response.headers["X-GreenGate-Status"] = "CACHE_MISS"
-    response.headers["X-GreenGate-Energy-Joules"] = str(energy_joules)
-    response.headers["X-GreenGate-Cache-Similarity"] = "0.000"
-    response.headers["X-GreenGate-Provider"] = provider_result.provider_name
+        record_request(
+            provider=provider_result.provider_name,
+            cache_status="miss",
+            status="200",
+            spent=energy_joules,
+            saved=0.0,
+        )
 
-    return llm_response
+        headers = {
+            "X-GreenGate-Status": "CACHE_MISS",
+            "X-GreenGate-Energy-Joules": str(energy_joules),
+            "X-GreenGate-Cache-Similarity": "0.000",
+            "X-GreenGate-Provider": provider_result.provider_name,
+        }
+        if provider_result.raw_body is not None:
+            # Hand the upstream bytes back verbatim instead of re-encoding the parsed body.
+            return Response(
+                content=provider_result.raw_body,
+                media_type="application/json",
+                headers=headers,
+            )
+        with stage("serialize"):
+            return CodecJSONResponse(llm_response, headers=headers)
+    finally:
+        with anyio.CancelScope(shield=True):
+            await limiter.settle(reservation, tokens=used[0], joules=used[1])
 
 
 async def _handle_streaming(
     payload: ChatCompletionRequest,
+    request: Request,
     proxy: ProxyService,
     ledger: EnergyLedger,
+    limiter: RateLimiter,
+    reservation: Reservation,
+    deadline: float | None,
+    raw_body: bytes | None,
 ):
-    provider_result = await proxy.forward_request(
-        payload.model_dump(exclude_none=True),
-        stream=True,
-    )
-    if provider_result.stream is None:
-        raise HTTPException(status_code=502, detail="Provider does not support streaming")
+    try:
+        prompt_tokens = await count_prompt_tokens(payload.messages, payload.model)
+        started = time.perf_counter()
+        with stage("upstream"):
+            provider_result = await cancel_on_disconnect(
+                request,
+                proxy.forward_request(payload, stream=True, deadline=deadline, raw_body=raw_body),
+            )
+        if provider_result.stream is None:
+            raise HTTPException(status_code=502, detail="Provider does not support streaming")
+    except ClientDisconnectedError:
+        # Starlette cancels the task once the client is gone; finish the accounting anyway.
+        with anyio.CancelScope(shield=True):
+            energy_joules = await record_upstream_usage(
+                ledger,
+                provider="unknown",
+                model=payload.model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=0,
+                energy_modifier=1.0,
+                status="499",
+            )
+            await limiter.settle(reservation, tokens=prompt_tokens, joules=energy_joules)
+        return Response(status_code=499)
+    except BaseException:
+        # No stream will settle the reservation, so give back all but the request.
+        with anyio.CancelScope(shield=True):
+            await limiter.settle(reservation, tokens=0, joules=0.0)
+        raise
 
-    prompt_text = "\n".join(message.content for message in payload.messages)
-    prompt_tokens = _count_tokens(prompt_text, payload.model)
     estimated_energy = EnergyMeter.calculate_energy(
         payload.model,
         prompt_tokens,
         completion_tokens=0,
         efficiency_modifier=provider_result.energy_modifier,
     )
+    # Usage may have been requested upstream for the ledger; only relay it when the
+    # client asked for it too.
+    relay_usage = requested_stream_usage(payload.model_extra or {})
 
     async def generator():
+        # Starlette cancels (or abandons) this generator when the client disconnects;
+        # closing the provider stream in that case tears down the upstream request.
+        status = "499"
+        tracker = StreamUsageTracker()
+        timer = StreamTimer(
+            provider=provider_result.provider_name, model=payload.model, started=started
+        )
         try:
-            async for chunk in provider_result.stream:
-                yield chunk
-        finally:
-            await ledger.record(
-                spent=estimated_energy,
-                saved=0.0,
-                prompt_tokens=prompt_tokens,
-                completion_tokens=0,
-            )
-            record_request(
-                provider=provider_result.provider_name,
-                cache_status="miss",
-                status="200",
-                spent=estimated_energy,
-                saved=0.0,
+            upstream = coalesce_stream(
+                provider_result.stream, provider=provider_result.provider_name
             )
+            async with aclosing(upstream):
+                async for chunk in upstream:
+                    sent = time.perf_counter()
+                    relayed = chunk if relay_usage else drop_usage_chunks(chunk)
+                    if relayed:
+                        yield relayed
+                    # Parsed once the chunk is on its way, so accounting never delays it.
+                    tracker.feed(chunk)
+                    timer.chunk(sent, has_content=tracker.has_content)
+            status = "200"
+        except Exception:
+            status = "502"
+            raise
+        finally:
+            ended = time.perf_counter()
+            with anyio.CancelScope(shield=True):
+                tracker.finish()
+                if tracker.completion_tokens is None and provider_result.usage:
+                    # Transcoded streams report the vendor's counts on the result instead.
+                    tracker.take_usage(provider_result.usage)
+                completion_tokens = tracker.completion_tokens
+                if completion_tokens is None:
+                    completion_tokens = await count_completion_tokens(
+                        tracker.completion_text, payload.model
+                    )
+                timer.finish(completion_tokens, ended)
+                used_prompt_tokens = (
+                    tracker.prompt_tokens if tracker.prompt_tokens is not None else prompt_tokens
+                )
+                energy_joules = await record_upstream_usage(
+                    ledger,
+                    provider=provider_result.provider_name,
+                    model=payload.model,
+                    prompt_tokens=used_prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    energy_modifier=provider_result.energy_modifier,
+                    status=status,
+                )
+                await limiter.settle(
+                    reservation,
+                    tokens=used_prompt_tokens + completion_tokens,
+                    joules=energy_joules,
+                )
 
     headers = {
         "X-GreenGate-Status": "STREAMING",
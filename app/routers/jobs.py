@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from app.dependencies import get_job_service, get_rate_limiter, require_gateway_auth
+from app.schemas.chat import JobSubmission
+from app.services.accounting import caller, reserve
+from app.services.job_queue import Job, JobService
+from app.services.rate_limiter import RateLimiter
+from app.services.timing import stage
+
+router = APIRouter()
+
+
+def _job_body(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "object": "job",
+        "status": job.status,
+        "priority": job.priority,
+        "deadline": job.deadline,
+        "not_before": job.not_before,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "attempts": job.attempts,
+        "result": job.result,
+        "error": job.error,
+    }
+
+
+@router.post("/v1/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    submission: JobSubmission,
+    request: Request,
+    _: None = Depends(require_gateway_auth),
+    jobs: JobService = Depends(get_job_service),
+    limiter: RateLimiter = Depends(get_rate_limiter),
+):
+    """Queue a chat completion to run later; poll `GET /v1/jobs/{id}` for the result.
+
+    The caller's rate limit is charged now, like a chat request, and settled with what
+    the job actually used once it has run.
+    """
+
+    if submission.request.stream:
+        raise HTTPException(status_code=400, detail="Streaming requests cannot be queued")
+    with stage("rate_limit"):
+        reservation = await reserve(
+            limiter, caller(submission.request, request), (submission.request,)
+        )
+    job = await jobs.submit(
+        submission.request,
+        priority=submission.priority,
+        deadline=submission.deadline.timestamp() if submission.deadline else None,
+        low_carbon=submission.schedule == "low_carbon",
+        reservation=reservation,
+    )
+    return _job_body(job)
+
+
+@router.get("/v1/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    _: None = Depends(require_gateway_auth),
+    jobs: JobService = Depends(get_job_service),
+):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_body(job)
@@ -1,16 +1,31 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Literal
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 class ChatMessage(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
     role: Literal["system", "user", "assistant", "tool"]
-    content: str = Field(..., min_length=1)
+    # Null only on assistant messages that carry `tool_calls` instead of text.
+    content: str | None = Field(None, min_length=1)
+
+    @model_validator(mode="after")
+    def ensure_content(self) -> ChatMessage:
+        if self.content is None and not (
+            self.role == "assistant" and (self.model_extra or {}).get("tool_calls")
+        ):
+            raise ValueError("content is required unless an assistant message has tool_calls")
+        return self
 
 
 class ChatCompletionRequest(BaseModel):
+    # Unknown OpenAI fields (tools, response_format, ...) are kept and forwarded upstream.
+    model_config = ConfigDict(extra="allow")
+
     model: str = Field(..., min_length=1)
     messages: list[ChatMessage] = Field(..., min_length=1)
     temperature: float = Field(1.0, ge=0.0, le=2.0)
@@ -25,3 +40,14 @@ class ChatCompletionRequest(BaseModel):
         if not any(message.role == "user" for message in messages):
             raise ValueError("At least one user message is required")
         return messages
+
+
+class BatchChatCompletionRequest(BaseModel):
+    requests: list[ChatCompletionRequest] = Field(..., min_length=1)
+
+
+class JobSubmission(BaseModel):
+    request: ChatCompletionRequest
+    priority: int = Field(0, ge=-100, le=100, description="Higher runs first")
+    deadline: datetime | None = None
+    schedule: Literal["asap", "low_carbon"] = "asap"
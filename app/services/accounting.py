@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+
+import anyio
+from starlette.requests import Request
+
+from app.core.energy import EnergyMeter
+from app.providers.base import ProviderResult
+from app.schemas.chat import ChatCompletionRequest, ChatMessage
+from app.services.cache_service import CacheHit
+from app.services.metrics_service import EnergyLedger
+from app.services.observability import record_request
+from app.services.rate_limiter import RateLimiter, Reservation
+from app.services.timing import stage
+from app.services.token_counter import token_counter
+
+
+async def count_prompt_tokens(messages: Iterable[ChatMessage], model: str) -> int:
+    with stage("token_count"):
+        return await token_counter.count_messages(
+            (message.content or "" for message in messages), model
+        )
+
+
+async def count_completion_tokens(text: str, model: str) -> int:
+    with stage("token_count"):
+        return await token_counter.count(text, model, memoize=False)
+
+
+async def response_usage(
+    payload: ChatCompletionRequest, provider_result: ProviderResult
+) -> tuple[int, int]:
+    """Prompt/completion tokens as reported upstream, counted locally only if missing."""
+
+    llm_response = provider_result.response or {}
+    usage = provider_result.usage or llm_response.get("usage", {})
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+
+    if prompt_tokens == 0 and completion_tokens == 0:
+        completion_text = llm_response.get("choices", [{}])[0].get("message", {}).get("content", "")
+        prompt_tokens = await count_prompt_tokens(payload.messages, payload.model)
+        completion_tokens = await count_completion_tokens(completion_text or "", payload.model)
+    return prompt_tokens, completion_tokens
+
+
+def caller(payload: ChatCompletionRequest, request: Request) -> str:
+    """The rate-limit key: the payload's `user`, else the client address."""
+
+    return payload.user or (request.client.host if request.client else "anonymous")
+
+
+async def reserve(
+    limiter: RateLimiter, identifier: str, payloads: Sequence[ChatCompletionRequest]
+) -> Reservation:
+    """Admit a caller for one request per payload.
+
+    Token/energy budgets are charged with each prompt plus its `max_tokens`.
+    """
+
+    if not limiter.meters_usage:
+        return await limiter.check(identifier, requests=len(payloads))
+    tokens = joules = 0.0
+    for payload in payloads:
+        estimate = await count_prompt_tokens(payload.messages, payload.model) + (
+            payload.max_tokens or 0
+        )
+        tokens += estimate
+        joules += EnergyMeter.calculate_energy(payload.model, estimate, 0)
+    return await limiter.check(identifier, requests=len(payloads), tokens=tokens, joules=joules)
+
+
+def safe_int(value: str | None) -> int:
+    try:
+        return int(value) if value is not None else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+async def record_cache_hit(ledger: EnergyLedger, hit: CacheHit) -> None:
+    """Account for a request answered from the cache."""
+
+    with stage("ledger"):
+        await ledger.record(
+            spent=0.0,
+            saved=hit.estimated_energy,
+            prompt_tokens=safe_int(hit.metadata.get("prompt_tokens")),
+            completion_tokens=safe_int(hit.metadata.get("completion_tokens")),
+        )
+    record_request(
+        provider=hit.metadata.get("provider", "cache"),
+        cache_status="hit",
+        status="200",
+        spent=0.0,
+        saved=hit.estimated_energy,
+    )
+
+
+async def record_upstream_usage(
+    ledger: EnergyLedger,
+    *,
+    provider: str,
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    energy_modifier: float,
+    status: str,
+) -> float:
+    """Account for upstream work outside the cache path; returns the joules recorded.
+
+    Anything but a `200` is written as `partial` (client disconnects, broken streams).
+    """
+
+    energy_joules = EnergyMeter.calculate_energy(
+        model,
+        prompt_tokens,
+        completion_tokens,
+        efficiency_modifier=energy_modifier,
+    )
+    # The client may already be gone, so shield the write from the surrounding cancellation.
+    with anyio.CancelScope(shield=True), stage("ledger"):
+        await ledger.record(
+            spent=energy_joules,
+            saved=0.0,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            status="complete" if status == "200" else "partial",
+        )
+    record_request(
+        provider=provider,
+        cache_status="miss",
+        status=status,
+        spent=energy_joules,
+        saved=0.0,
+    )
+    return energy_joules
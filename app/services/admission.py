@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.auth import bearer_token, presents_key
+from app.core.config import settings
+from app.core.json_codec import CodecJSONResponse
+from app.services.cancellation import remaining_seconds, request_deadline
+from app.services.observability import record_admission_shed, record_admission_state
+from app.services.timing import stage
+
+PRIORITY_CLASSES = {"low": 0, "normal": 1, "high": 2, "critical": 3}
+DEFAULT_PRIORITY = PRIORITY_CLASSES["normal"]
+PRIORITY_NAMES = {value: name for name, value in PRIORITY_CLASSES.items()}
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(order=True, slots=True)
+class _Waiter:
+    sort_key: tuple[int, int]
+    priority: int = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+
+
+class AdmissionController:
+    """Global concurrency limit with a bounded, priority-ordered wait queue.
+
+    Up to `max_concurrency` requests run at once; the next `max_queue` wait, highest
+    priority first. When the queue is full, a newcomer displaces the lowest-priority
+    waiter if it outranks it and is refused otherwise. Waiters give up after
+    `queue_timeout` seconds (or their own deadline, if sooner).
+    """
+
+    def __init__(self, *, max_concurrency: int, max_queue: int, queue_timeout: float) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._heap: list[_Waiter] = []
+        self._sequence = itertools.count()
+        # Moving average of how long an admitted request holds its slot.
+        self._service_seconds = 1.0
+
+    def retry_after(self) -> int:
+        backlog = (self.queued + 1) / max(self.max_concurrency, 1)
+        return max(1, math.ceil(backlog * self._service_seconds))
+
+    async def acquire(self, priority: int, max_wait: float | None = None) -> None:
+        if self.in_flight < self.max_concurrency and self.queued == 0:
+            self.in_flight += 1
+            self._export()
+            return
+        if self.queued >= self.max_queue:
+            self._evict_below(priority)
+
+        waiter = _Waiter(
+            (-priority, next(self._sequence)),
+            priority,
+            asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._heap, waiter)
+        self.queued += 1
+        self._export()
+        wait = self.queue_timeout if max_wait is None else min(max_wait, self.queue_timeout)
+        try:
+            async with asyncio.timeout(max(wait, 0.0)):
+                await waiter.future
+        except TimeoutError:
+            if self._granted(waiter):
+                return
+            self._abandon(waiter)
+            raise self._shed("timeout", priority) from None
+        except asyncio.CancelledError:
+            if self._granted(waiter):
+                self.release()
+            else:
+                self._abandon(waiter)
+            raise
+
+    def release(self, held_seconds: float | None = None) -> None:
+        if held_seconds is not None:
+            self._service_seconds += 0.1 * (held_seconds - self._service_seconds)
+        while self._heap:
+            waiter = heapq.heappop(self._heap)
+            if waiter.future.done():
+                continue
+            # Hand the slot straight to the next waiter; in_flight is unchanged.
+            self.queued -= 1
+            waiter.future.set_result(None)
+            self._export()
+            return
+        self.in_flight -= 1
+        self._export()
+
+    def _evict_below(self, priority: int) -> None:
+        victim: _Waiter | None = None
+        for waiter in self._heap:
+            if waiter.future.done():
+                continue
+            # Lowest priority first; among equals, the most recent arrival goes.
+            if victim is None or waiter.sort_key > victim.sort_key:
+                victim = waiter
+        if victim is None or victim.priority >= priority:
+            raise self._shed("queue_full", priority)
+        self.queued -= 1
+        victim.future.set_exception(self._shed("evicted", victim.priority))
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if not waiter.future.done():
+            waiter.future.cancel()
+        self.queued -= 1
+        self._export()
+
+    @staticmethod
+    def _granted(waiter: _Waiter) -> bool:
+        future = waiter.future
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    def _shed(self, reason: str, priority: int) -> OverloadedError:
+        record_admission_shed(priority=PRIORITY_NAMES.get(priority, str(priority)), reason=reason)
+        return OverloadedError(reason, self.retry_after())
+
+    def _export(self) -> None:
+        record_admission_state(in_flight=self.in_flight, queued=self.queued)
+
+
+def _parse_priority(value: str | None) -> int | None:
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value in PRIORITY_CLASSES:
+        return PRIORITY_CLASSES[value]
+    try:
+        return min(max(int(value), 0), max(PRIORITY_CLASSES.values()))
+    except ValueError:
+        return None
+
+
+def request_priority(headers: Headers) -> int:
+    """Resolve a request's priority class.
+
+    A mapped API key (`ADMISSION_KEY_PRIORITIES`) wins, then the `X-GreenGate-Priority`
+    header (a class name or 0-3), then `normal`.
+    """
+
+    api_key = headers.get("x-api-key") or bearer_token(headers)
+    if api_key:
+        mapped = _parse_priority(settings.admission_key_priorities().get(api_key))
+        if mapped is not None:
+            return mapped
+    header = _parse_priority(headers.get("x-greengate-priority"))
+    if header is None:
+        return DEFAULT_PRIORITY
+    # Anyone can send the header, so `critical` is reserved for mapped API keys.
+    return min(header, PRIORITY_CLASSES["high"])
+
+
+class AdmissionMiddleware:
+    """Holds an admission slot for the whole request, including a streamed body.
+
+    Requests without the gateway key are refused before they can take a queue slot.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController | None = None,
+        paths: tuple[str, ...] = ("/v1/chat/completions", "/v1/batch/chat/completions"),
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["path"] not in self.paths
+            or not settings.ADMISSION_ENABLED
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller or admission_controller
+        request = Request(scope)
+        expected = settings.GATEWAY_API_KEY
+        if expected and not presents_key(request.headers, expected):
+            response = CodecJSONResponse(
+                {"detail": "Unauthorized"},
+                status_code=401,
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+            await response(scope, receive, send)
+            return
+        max_wait = remaining_seconds(request_deadline(request))
+        try:
+            with stage("admission"):
+                await controller.acquire(request_priority(request.headers), max_wait)
+        except OverloadedError as exc:
+            response = CodecJSONResponse(
+                {"detail": "Gateway overloaded, retry later", "reason": exc.reason},
+                status_code=503,
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(time.monotonic() - started)
+
+
+admission_controller = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+)
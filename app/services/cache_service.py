@@ -3,13 +3,64 @@ from __future__ import annotations
 import asyncio
 import hashlib
 import json
+import logging
+import os
+import threading
+import time
 import uuid
+from collections import Counter
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, TypeVar
 
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-
+from app.core import json_codec
 from app.core.config import settings
+from app.schemas.chat import ChatCompletionRequest, ChatMessage
+from app.services.batching import MicroBatcher
+from app.services.observability import (
+    record_cache_entries,
+    record_cache_error,
+    record_cache_l1,
+    record_cache_lookup,
+    record_cache_operation,
+    record_cache_over_budget,
+    record_cache_save_dropped,
+    record_cache_similarity,
+)
+from app.services.tracing import span
+
+if TYPE_CHECKING:
+    import chromadb
+
+logger = logging.getLogger("greengate.cache")
+
+T = TypeVar("T")
+Embedder = Callable[[list[str]], list]
+
+# Cache stats page through the collection this many entries at a time.
+_STATS_PAGE_SIZE = 1000
+
+
+def cache_prompt(messages: Iterable[ChatMessage]) -> str:
+    """The text a conversation is cached and looked up under."""
+
+    return "\n".join(f"{message.role}:{(message.content or '').strip()}" for message in messages)
+
+
+def cache_scope(payload: ChatCompletionRequest) -> str:
+    """Digest of everything besides the conversation text that shapes the answer.
+
+    Model, sampling parameters, forwarded extras (`tools`, `response_format`, ...) and
+    per-message extras (`tool_calls`, `tool_call_id`, ...) all count; `stream` and `user`
+    do not. Only entries saved under the same scope are ever served.
+    """
+
+    fields = payload.model_dump(exclude={"messages", "stream", "user"}, exclude_none=True)
+    fields["messages"] = [message.model_extra or {} for message in payload.messages]
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
 
 @dataclass(slots=True)
@@ -28,20 +79,82 @@ class CacheHit:
 
 
 class CacheService:
-    def __init__(self) -> None:
+    """Exact-match and semantic response cache.
+
+    Entries are keyed by the prompt text and a `scope` (see `cache_scope`): the exact
+    tier hashes both, and semantic lookups only search entries saved with the same scope.
+
+    Without a `collection`, the persistent Chroma collection is opened on first use (on
+    the cache pool, or by `warm_up`): importing and starting Chroma takes about a second,
+    which module imports and worker boot should not pay.
+    """
+
+    def __init__(
+        self,
+        collection: chromadb.Collection | None = None,
+        *,
+        embedding_function: Embedder | None = None,
+    ) -> None:
+        self.path: Path | None = settings.cache_path() if collection is None else None
+        self._collection = collection
+        self._opening = threading.Lock()
+        # Texts are embedded here rather than inside Chroma so embedding time is measured
+        # on its own; without an embedder the collection embeds `query_texts` itself.
+        self._embed = embedding_function
+        # Insertion-ordered, so the oldest entry is evicted first past the size cap.
+        self._exact_cache: dict[str, CacheHit] = {}
+        self._exact_bytes = 0
+        # Saves persist in the background; the request never waits on the cache pool.
+        self._saves: set[asyncio.Future[None]] = set()
+        self._entries: int | None = None
+        # Lookups and saves update the tiers from several cache pool threads.
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        # Concurrent semantic lookups share one embedding call and one HNSW query.
+        self._lookups: MicroBatcher[tuple[str, str, str], CacheHit | None] = MicroBatcher(
+            self._lookup_batch,
+            window=settings.CACHE_BATCH_WINDOW_MS / 1000,
+            max_size=settings.CACHE_BATCH_MAX_SIZE,
+        )
+
+    @property
+    def collection(self) -> chromadb.Collection:
+        if self._collection is None:
+            with self._opening:
+                if self._collection is None:
+                    self._collection = self._open_collection()
+        return self._collection
+
+    def _open_collection(self) -> chromadb.Collection:
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+        if self._embed is None:
+            self._embed = DefaultEmbeddingFunction()
         self.client = chromadb.PersistentClient(
-            path=str(settings.cache_path()),
+            path=str(self.path),
             settings=ChromaSettings(anonymized_telemetry=False),
         )
-        self.collection = self.client.get_or_create_collection(
+        return self.client.get_or_create_collection(
             name=settings.CACHE_COLLECTION_NAME,
             metadata={"hnsw:space": "cosine"},
+            embedding_function=self._embed,
         )
-        self._exact_cache: dict[str, CacheHit] = {}
+
+    async def warm_up(self) -> None:
+        """Open the collection and load the embedding model ahead of the first request."""
+
+        await self._run(self._warm_up)
+
+    def _warm_up(self) -> None:
+        self.collection.count()
+        if self._embed is not None:
+            self._embedded(["warm-up"])
 
     @staticmethod
-    def _hash_prompt(prompt: str) -> str:
-        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    def _hash_prompt(prompt: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\n{prompt}".encode()).hexdigest()
 
     @staticmethod
     def _distance_to_similarity(distance: float | None) -> float:
@@ -51,41 +164,189 @@ class CacheService:
             return 1.0
         return 1.0 / (1.0 + distance)
 
-    async def get_cached_response(self, prompt: str) -> CacheHit | None:
-        prompt_hash = self._hash_prompt(prompt)
-        cached = self._exact_cache.get(prompt_hash)
-        if cached:
-            return cached
+    @staticmethod
+    def _entry_size(prompt_hash: str, hit: CacheHit) -> int:
+        return len(prompt_hash) + len(hit.metadata.get("response") or "")
 
-        return await asyncio.to_thread(self._query_collection, prompt, prompt_hash)
+    def _remember(self, prompt_hash: str, hit: CacheHit) -> None:
+        """Put `hit` in the exact-match tier, evicting the oldest entries past the cap."""
 
-    def _query_collection(self, prompt: str, prompt_hash: str) -> CacheHit | None:
-        try:
-            results = self.collection.query(
-                query_texts=[prompt],
-                n_results=min(settings.CACHE_TOP_K, settings.CACHE_MAX_RESULTS),
-                include=["metadatas", "distances"],
+        with self._lock:
+            previous = self._exact_cache.pop(prompt_hash, None)
+            if previous is not None:
+                self._exact_bytes -= self._entry_size(prompt_hash, previous)
+            self._exact_cache[prompt_hash] = hit
+            self._exact_bytes += self._entry_size(prompt_hash, hit)
+            while len(self._exact_cache) > settings.CACHE_EXACT_MAX_ENTRIES:
+                oldest = next(iter(self._exact_cache))
+                self._exact_bytes -= self._entry_size(oldest, self._exact_cache.pop(oldest))
+            entries, size = len(self._exact_cache), self._exact_bytes
+        record_cache_l1(entries=entries, size=size)
+
+    def _embedded(self, texts: list[str]) -> list:
+        assert self._embed is not None
+        started = time.perf_counter()
+        embeddings = self._embed(texts)
+        record_cache_operation(operation="embed", seconds=time.perf_counter() - started)
+        return embeddings
+
+    def _submit(self, func: Callable[..., T], *args: object) -> asyncio.Future[T]:
+        # Chroma work gets its own pool so a slow query cannot starve the default executor.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.CACHE_EXECUTOR_WORKERS, thread_name_prefix="greengate-cache"
+            )
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _run(self, func: Callable[..., T], *args: object) -> T:
+        return await self._submit(func, *args)
+
+    async def flush(self) -> None:
+        """Wait for the saves still being persisted."""
+
+        await asyncio.gather(*self._saves)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def get_cached_response(self, prompt: str, *, scope: str) -> CacheHit | None:
+        """Return a cached answer, or `None` on a miss or when the lookup overruns its budget.
+
+        An abandoned lookup keeps running in the cache pool; a late hit still lands in the
+        exact-match tier for the next request.
+        """
+
+        with span("greengate.cache.lookup") as current:
+            prompt_hash = self._hash_prompt(prompt, scope)
+            cached = self._exact_cache.get(prompt_hash)
+            record_cache_lookup(tier="exact", hit=cached is not None)
+            if cached:
+                current.set_attributes(
+                    {"greengate.cache.tier": "exact", "greengate.cache.hit": True}
+                )
+                return cached
+
+            lookup = self._lookups.submit((prompt, prompt_hash, scope))
+            budget_ms = settings.CACHE_LOOKUP_BUDGET_MS
+            if not budget_ms:
+                hit = await lookup
+            else:
+                try:
+                    async with asyncio.timeout(budget_ms / 1000):
+                        hit = await lookup
+                except TimeoutError:
+                    record_cache_over_budget()
+                    current.set_attribute("greengate.cache.over_budget", True)
+                    hit = None
+            record_cache_lookup(tier="semantic", hit=hit is not None)
+            current.set_attributes(
+                {"greengate.cache.tier": "semantic", "greengate.cache.hit": hit is not None}
             )
+            if hit is not None:
+                current.set_attribute("greengate.cache.similarity", hit.similarity)
+            return hit
+
+    async def get_cached_responses(
+        self, prompts: list[str], *, scopes: list[str]
+    ) -> list[CacheHit | None]:
+        """Bulk lookup: exact-match tier first, then one collection query per scope."""
+
+        keys = list(zip(prompts, scopes, strict=True))
+        hashes = [self._hash_prompt(prompt, scope) for prompt, scope in keys]
+        hits: list[CacheHit | None] = [self._exact_cache.get(h) for h in hashes]
+        lookups = [
+            (prompt, prompt_hash, scope)
+            for (prompt, scope), prompt_hash, hit in zip(keys, hashes, hits, strict=True)
+            if hit is None
+        ]
+        record_cache_lookup(tier="exact", hit=True, count=len(hits) - len(lookups))
+        record_cache_lookup(tier="exact", hit=False, count=len(lookups))
+        if not lookups:
+            return hits
+        with span(
+            "greengate.cache.lookup_batch",
+            {
+                "greengate.cache.prompts": len(prompts),
+                "greengate.cache.semantic_lookups": len(lookups),
+            },
+        ) as current:
+            results = await self._lookup_batch(lookups)
+            found_count = sum(result is not None for result in results)
+            current.set_attribute("greengate.cache.semantic_hits", found_count)
+        record_cache_lookup(tier="semantic", hit=True, count=found_count)
+        record_cache_lookup(tier="semantic", hit=False, count=len(results) - found_count)
+        found = iter(results)
+        return [hit if hit is not None else next(found) for hit in hits]
+
+    async def _lookup_batch(self, lookups: list[tuple[str, str, str]]) -> list[CacheHit | None]:
+        return await self._run(self._query_collection, lookups)
+
+    def _query_collection(self, lookups: list[tuple[str, str, str]]) -> list[CacheHit | None]:
+        # Identical prompts in one batch are embedded and searched once. Chroma applies one
+        # `where` filter to a whole query, so each scope is queried separately.
+        prompts = {prompt_hash: (prompt, scope) for prompt, prompt_hash, scope in lookups}
+        by_scope: dict[str, list[str]] = {}
+        for prompt_hash, (_, scope) in prompts.items():
+            by_scope.setdefault(scope, []).append(prompt_hash)
+        started = time.perf_counter()
+        try:
+            collection = self.collection
+            if self._embed is not None:
+                texts = [prompt for prompt, _ in prompts.values()]
+                embeddings = dict(zip(prompts, self._embedded(texts), strict=True))
+            results = {}
+            for scope, hashes in by_scope.items():
+                query = (
+                    {"query_texts": [prompts[h][0] for h in hashes]}
+                    if self._embed is None
+                    else {"query_embeddings": [embeddings[h] for h in hashes]}
+                )
+                results[scope] = collection.query(
+                    **query,
+                    n_results=min(settings.CACHE_TOP_K, settings.CACHE_MAX_RESULTS),
+                    where={"scope": scope},
+                    include=["metadatas", "distances"],
+                )
+        except Exception:
+            logger.warning("Cache lookup failed", exc_info=True)
+            record_cache_error(operation="lookup")
+            return [None] * len(lookups)
+        record_cache_operation(operation="lookup", seconds=time.perf_counter() - started)
 
-            if not results.get("ids") or not results["ids"][0]:
+        hits = {
+            prompt_hash: self._best_hit(results[scope], index, prompt_hash)
+            for scope, hashes in by_scope.items()
+            for index, prompt_hash in enumerate(hashes)
+        }
+        return [hits[prompt_hash] for _, prompt_hash, _ in lookups]
+
+    def _best_hit(self, results: dict, index: int, prompt_hash: str) -> CacheHit | None:
+        try:
+            ids = results.get("ids") or []
+            if len(ids) <= index or not ids[index]:
                 return None
 
-            distance = results["distances"][0][0]
+            distance = results["distances"][index][0]
             similarity = self._distance_to_similarity(distance)
-            if similarity < settings.CACHE_SIMILARITY_THRESHOLD:
+            close_enough = similarity >= settings.CACHE_SIMILARITY_THRESHOLD
+            record_cache_similarity(similarity=similarity, hit=close_enough)
+            if not close_enough:
                 return None
 
-            metadata = results["metadatas"][0][0]
+            metadata = results["metadatas"][index][0]
             cached_json = metadata.get("response")
             if not cached_json:
                 return None
 
-            response = json.loads(cached_json)
+            response = json_codec.loads(cached_json)
             hit = CacheHit(response=response, metadata=metadata, similarity=similarity)
-            self._exact_cache[prompt_hash] = hit
+            self._remember(prompt_hash, hit)
             return hit
-        except Exception as exc:  # pragma: no cover - defensive logging branch
-            print(f"Cache lookup error: {exc}")
+        except Exception:
+            logger.warning("Cache entry could not be read", exc_info=True)
+            record_cache_error(operation="lookup")
             return None
 
     async def save_response(
@@ -93,16 +354,26 @@ class CacheService:
         prompt: str,
         response: dict,
         *,
+        scope: str,
         model: str,
         prompt_tokens: int,
         completion_tokens: int,
         energy_joules: float,
         provider: str,
+        serialized: str | None = None,
     ) -> None:
-        prompt_hash = self._hash_prompt(prompt)
+        """Cache `response`; pass `serialized` when its JSON text is already at hand.
+
+        The exact-match tier is updated at once; the collection write is queued on the
+        cache pool and not awaited. With `CACHE_SAVE_QUEUE_SIZE` writes already pending,
+        the write is dropped rather than queued behind them.
+        """
+
+        prompt_hash = self._hash_prompt(prompt, scope)
         metadata = {
-            "response": json.dumps(response),
+            "response": serialized if serialized is not None else json_codec.dumps_str(response),
             "prompt_hash": prompt_hash,
+            "scope": scope,
             "model": model,
             "prompt_tokens": str(prompt_tokens),
             "completion_tokens": str(completion_tokens),
@@ -111,19 +382,99 @@ class CacheService:
         }
 
         hit = CacheHit(response=response, metadata=metadata, similarity=1.0)
-        self._exact_cache[prompt_hash] = hit
+        self._remember(prompt_hash, hit)
 
-        await asyncio.to_thread(self._persist_entry, prompt, metadata)
+        with span(
+            "greengate.cache.save",
+            {
+                "greengate.model": model,
+                "greengate.provider": provider,
+                "greengate.cache.response_bytes": len(metadata["response"]),
+            },
+        ) as current:
+            if len(self._saves) >= settings.CACHE_SAVE_QUEUE_SIZE:
+                record_cache_save_dropped()
+                current.set_attribute("greengate.cache.dropped", True)
+                return
+            save = self._submit(self._persist_entry, prompt, metadata)
+            self._saves.add(save)
+            save.add_done_callback(self._saves.discard)
 
     def _persist_entry(self, prompt: str, metadata: dict[str, str]) -> None:
+        started = time.perf_counter()
         try:
-            self.collection.add(
+            collection = self.collection
+            embeddings = {} if self._embed is None else {"embeddings": self._embedded([prompt])}
+            collection.add(
                 documents=[prompt],
                 metadatas=[metadata],
                 ids=[f"{metadata['prompt_hash']}:{uuid.uuid4().hex}"],
+                **embeddings,
             )
-        except Exception as exc:  # pragma: no cover - defensive logging branch
-            print(f"Cache save error: {exc}")
+            with self._lock:
+                # Counted once, then tracked; other workers' saves show up on the next count.
+                self._entries = (
+                    self.collection.count() if self._entries is None else self._entries + 1
+                )
+                entries = self._entries
+        except Exception:
+            logger.warning("Cache save failed", exc_info=True)
+            record_cache_error(operation="persist")
+            return
+        record_cache_operation(operation="persist", seconds=time.perf_counter() - started)
+        record_cache_entries(entries)
+
+    async def stats(self, *, top: int = 10) -> dict:
+        """Index size, prompts stored more than once (the `top` most duplicated), disk use."""
+
+        return await self._run(self._collect_stats, top)
+
+    def _collect_stats(self, top: int) -> dict:
+        per_prompt: Counter[str] = Counter()
+        entries = 0
+        while True:
+            page = self.collection.get(
+                include=["metadatas"], limit=_STATS_PAGE_SIZE, offset=entries
+            )
+            metadatas = page.get("metadatas") or []
+            entries += len(metadatas)
+            per_prompt.update(
+                metadata["prompt_hash"]
+                for metadata in metadatas
+                if metadata and metadata.get("prompt_hash")
+            )
+            if len(metadatas) < _STATS_PAGE_SIZE:
+                break
+
+        with self._lock:
+            self._entries = entries
+            exact_entries, exact_bytes = len(self._exact_cache), self._exact_bytes
+        record_cache_entries(entries)
+        return {
+            "entries": entries,
+            "unique_prompts": len(per_prompt),
+            "duplicate_entries": sum(count - 1 for count in per_prompt.values()),
+            "top_duplicates": [
+                {"prompt_hash": prompt_hash, "entries": count}
+                for prompt_hash, count in per_prompt.most_common(top)
+                if count > 1
+            ],
+            "exact_tier": {"entries": exact_entries, "bytes": exact_bytes},
+            "disk_bytes": _directory_size(self.path) if self.path is not None else None,
+            "similarity_threshold": settings.CACHE_SIMILARITY_THRESHOLD,
+            "top_k": settings.CACHE_TOP_K,
+        }
+
+
+def _directory_size(path: Path) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
 
 
 cache_service = CacheService()
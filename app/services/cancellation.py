@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable
+from typing import TypeVar
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client goes away before the upstream call completes."""
+
+
+def _parse_budget(value: str | None, *, scale: float) -> float | None:
+    if value is None:
+        return None
+    try:
+        budget = float(value) * scale
+    except (TypeError, ValueError):
+        return None
+    return budget if budget > 0 else None
+
+
+def request_deadline(request: Request) -> float | None:
+    """Return an absolute `time.monotonic()` deadline derived from request headers.
+
+    `X-GreenGate-Deadline-Ms` carries a budget in milliseconds and takes precedence over
+    `X-Request-Timeout`, which carries a budget in seconds.
+    """
+
+    budget = _parse_budget(request.headers.get("x-greengate-deadline-ms"), scale=0.001)
+    if budget is None:
+        budget = _parse_budget(request.headers.get("x-request-timeout"), scale=1.0)
+    if budget is None:
+        return None
+    return time.monotonic() + budget
+
+
+def remaining_seconds(deadline: float | None) -> float | None:
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def deadline_exceeded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail="Request deadline exceeded",
+    )
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    interval = settings.DISCONNECT_POLL_INTERVAL_MS / 1000
+    while True:
+        if await request.is_disconnected():
+            return
+        await asyncio.sleep(interval)
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """Await `awaitable`, cancelling it if the client disconnects first."""
+
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        watcher.cancel()
+        raise
+    watcher.cancel()
+    if task in done:
+        return task.result()
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        # Only the cancellation requested above is expected here; if the caller was
+        # cancelled while the upstream task cleaned up, that must propagate.
+        if asyncio.current_task().cancelling():
+            raise
+    except Exception:
+        pass
+    raise ClientDisconnectedError
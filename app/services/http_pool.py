@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+
+import httpx
+
+from app.core.config import settings
+from app.core.provider_settings import ProviderSettings
+from app.services.observability import record_pool_usage, record_pool_wait
+
+logger = logging.getLogger("greengate.http")
+
+# httpcore trace events that mark the end of the wait for a pooled connection: either a
+# fresh TCP connect starts, or an idle/multiplexed connection begins sending headers.
+_CONNECTION_ACQUIRED_EVENTS = (".connect_tcp.started", ".send_request_headers.started")
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]) -> None:
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps a provider's transport to export pool saturation and connection wait time."""
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        *,
+        provider: str,
+        max_connections: int,
+    ) -> None:
+        self._transport = transport
+        self.provider = provider
+        self.max_connections = max_connections
+        self.in_flight = 0
+
+    def _update(self, delta: int) -> None:
+        self.in_flight += delta
+        record_pool_usage(
+            provider=self.provider,
+            in_flight=self.in_flight,
+            max_connections=self.max_connections,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+        parent_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict) -> None:
+            nonlocal acquired
+            if not acquired and event_name.endswith(_CONNECTION_ACQUIRED_EVENTS):
+                acquired = True
+                record_pool_wait(provider=self.provider, seconds=time.perf_counter() - started)
+            if parent_trace is not None:
+                result = parent_trace(event_name, info)
+                if result is not None:
+                    await result
+
+        request.extensions["trace"] = trace
+        self._update(1)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._update(-1)
+            raise
+        # The connection stays checked out until the body is consumed or closed.
+        response.stream = _TrackedStream(response.stream, lambda: self._update(-1))
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _http2_available() -> bool:
+    if not settings.HTTP2_ENABLED:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2_ENABLED is set but 'h2' is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def build_client(cfg: ProviderSettings) -> httpx.AsyncClient:
+    """Create a dedicated, pool-tuned client for one provider."""
+
+    max_connections = settings.http_pool_overrides().get(cfg.name, settings.HTTP_MAX_CONNECTIONS)
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(settings.HTTP_MAX_KEEPALIVE_CONNECTIONS, max_connections),
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    timeout = httpx.Timeout(
+        settings.HTTP_TIMEOUT_SECONDS,
+        connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+        pool=settings.HTTP_POOL_TIMEOUT_SECONDS,
+    )
+    transport = InstrumentedTransport(
+        httpx.AsyncHTTPTransport(limits=limits, http2=_http2_available()),
+        provider=cfg.name,
+        max_connections=max_connections,
+    )
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
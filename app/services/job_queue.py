@@ -0,0 +1,570 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import csv
+import logging
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+import aiosqlite
+from fastapi import HTTPException
+
+from app.core import json_codec
+from app.core.config import settings
+from app.providers.base import ProviderResult
+from app.schemas.chat import ChatCompletionRequest
+from app.services.accounting import record_cache_hit, record_upstream_usage, response_usage
+from app.services.admission import (
+    PRIORITY_CLASSES,
+    AdmissionController,
+    OverloadedError,
+    admission_controller,
+)
+from app.services.cache_service import CacheService, cache_prompt, cache_scope, cache_service
+from app.services.metrics_service import EnergyLedger, energy_ledger
+from app.services.proxy_service import ProxyService, proxy_service
+from app.services.rate_limiter import RateLimiter, Reservation
+
+logger = logging.getLogger("greengate.jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+@dataclass(slots=True)
+class Job:
+    id: str
+    status: str
+    priority: int
+    deadline: float | None
+    not_before: float
+    created_at: float
+    updated_at: float
+    attempts: int
+    request: dict
+    result: dict | None = None
+    error: str | None = None
+    reservation: Reservation | None = None
+    owner: str | None = None
+    lease_until: float | None = None
+
+
+def _parse_timestamp(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class CarbonSchedule:
+    """Grid carbon intensity forecast read from a local CSV of `timestamp,intensity` rows.
+
+    Each row starts a slot that lasts until the next row (the last slot is as long as the
+    one before it). Timestamps are ISO 8601 or Unix seconds; intensity is gCO2/kWh. The
+    file is re-read when it changes, so an external job can refresh the forecast.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._mtime: float | None = None
+        self._starts: list[float] = []
+        self._intensity: list[float] = []
+
+    def _load(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            self._mtime, self._starts, self._intensity = None, [], []
+            return
+        if mtime == self._mtime:
+            return
+        rows: list[tuple[float, float]] = []
+        with self.path.open(newline="") as handle:
+            for row in csv.reader(handle):
+                try:
+                    rows.append((_parse_timestamp(row[0].strip()), float(row[1])))
+                except (IndexError, ValueError):
+                    continue  # header or malformed line
+        rows.sort()
+        self._mtime = mtime
+        self._starts = [start for start, _ in rows]
+        self._intensity = [intensity for _, intensity in rows]
+
+    def _end(self, index: int) -> float:
+        if index + 1 < len(self._starts):
+            return self._starts[index + 1]
+        if index > 0:
+            return self._starts[index] + (self._starts[index] - self._starts[index - 1])
+        return float("inf")
+
+    def defer_until(self, now: float, deadline: float | None, threshold: float) -> float:
+        """Earliest time at or after `now` whose intensity is at most `threshold`.
+
+        Without such a slot before `deadline`, the cleanest slot before it is used; with
+        no forecast covering the period, the job runs now.
+        """
+
+        self._load()
+        if not self._starts:
+            return now
+        first = max(bisect.bisect_right(self._starts, now) - 1, 0)
+        best: tuple[float, float] | None = None
+        for index in range(first, len(self._starts)):
+            start = max(self._starts[index], now)
+            if self._end(index) <= now:
+                continue
+            if deadline is not None and start >= deadline:
+                break
+            intensity = self._intensity[index]
+            if intensity <= threshold:
+                return start
+            if best is None or intensity < best[0]:
+                best = (intensity, start)
+        return best[1] if best is not None else now
+
+
+class JobStore:
+    """SQLite-backed job table; claims are atomic across workers and processes.
+
+    A claim is a lease: the job belongs to this store's `owner` until `lease_until`,
+    which the runner renews while it works. Only a job whose lease has run out (its
+    worker died) is claimed again, so workers sharing the table never run a job twice.
+    """
+
+    # Columns added since the first release, for tables created before them.
+    _ADDED_COLUMNS = {"reservation": "TEXT", "owner": "TEXT", "lease_until": "REAL"}
+
+    def __init__(self, db_path: Path, *, lease_seconds: float | None = None) -> None:
+        self.db_path = db_path
+        self.lease_seconds = (
+            settings.JOBS_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        )
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = asyncio.Lock()
+        self._initialized = False
+
+    async def initialize(self) -> None:
+        if self._initialized:
+            return
+        async with self._lock:
+            if self._initialized:
+                return
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        priority INTEGER NOT NULL DEFAULT 0,
+                        deadline REAL,
+                        not_before REAL NOT NULL,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        request TEXT NOT NULL,
+                        result TEXT,
+                        error TEXT,
+                        reservation TEXT,
+                        owner TEXT,
+                        lease_until REAL
+                    )
+                    """
+                )
+                async with db.execute("PRAGMA table_info(jobs)") as cursor:
+                    columns = {row[1] for row in await cursor.fetchall()}
+                for column, kind in self._ADDED_COLUMNS.items():
+                    if column not in columns:
+                        await db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                await db.execute(
+                    "CREATE INDEX IF NOT EXISTS jobs_ready "
+                    "ON jobs (status, not_before, priority DESC)"
+                )
+                await db.commit()
+            self._initialized = True
+
+    async def add(self, job: Job) -> None:
+        await self.initialize()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                (
+                    "INSERT INTO jobs (id, status, priority, deadline, not_before, created_at, "
+                    "updated_at, attempts, request, reservation) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                ),
+                (
+                    job.id,
+                    job.status,
+                    job.priority,
+                    job.deadline,
+                    job.not_before,
+                    job.created_at,
+                    job.updated_at,
+                    job.attempts,
+                    json_codec.dumps_str(job.request),
+                    (
+                        json_codec.dumps_str(asdict(job.reservation))
+                        if job.reservation is not None
+                        else None
+                    ),
+                ),
+            )
+            await db.commit()
+
+    async def get(self, job_id: str) -> Job | None:
+        await self.initialize()
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)) as cursor:
+                row = await cursor.fetchone()
+        return self._to_job(row) if row else None
+
+    async def claim(self, now: float) -> Job | None:
+        """Lease the most urgent runnable job to this store's owner and return it.
+
+        Runnable means queued and due, or running under a lease that has expired.
+        """
+
+        await self.initialize()
+        lease_until = now + self.lease_seconds
+        async with aiosqlite.connect(self.db_path) as db:
+            while True:
+                async with db.execute(
+                    (
+                        "SELECT * FROM jobs WHERE (status = ? AND not_before <= ?) "
+                        "OR (status = ? AND (lease_until IS NULL OR lease_until < ?)) "
+                        "ORDER BY priority DESC, deadline IS NULL, deadline, created_at "
+                        "LIMIT 1"
+                    ),
+                    (QUEUED, now, RUNNING, now),
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row is None:
+                    return None
+                job = self._to_job(row)
+                if job.status == RUNNING:
+                    logger.info("Reclaiming job %s from %s, whose lease expired", job.id, job.owner)
+                # Only succeeds if nobody claimed or renewed the job since it was read.
+                cursor = await db.execute(
+                    (
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?, "
+                        "owner = ?, lease_until = ? "
+                        "WHERE id = ? AND status = ? AND lease_until IS ?"
+                    ),
+                    (RUNNING, now, self.owner, lease_until, job.id, job.status, job.lease_until),
+                )
+                await db.commit()
+                if cursor.rowcount == 1:
+                    job.status = RUNNING
+                    job.attempts += 1
+                    job.owner = self.owner
+                    job.lease_until = lease_until
+                    return job
+
+    async def renew(self, job_id: str) -> bool:
+        """Extend this owner's lease on a running job; False once the job is not ours."""
+
+        await self.initialize()
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND owner = ?",
+                (time.time() + self.lease_seconds, job_id, RUNNING, self.owner),
+            )
+            await db.commit()
+            return cursor.rowcount == 1
+
+    async def next_ready_at(self) -> float | None:
+        await self.initialize()
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT MIN(not_before) FROM jobs WHERE status = ?", (QUEUED,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def finish(
+        self, job_id: str, *, status: str, result: dict | None = None, error: str | None = None
+    ) -> None:
+        await self.initialize()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                (
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, "
+                    "lease_until = NULL WHERE id = ? AND owner = ?"
+                ),
+                (
+                    status,
+                    json_codec.dumps_str(result) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id,
+                    self.owner,
+                ),
+            )
+            await db.commit()
+
+    async def defer(self, job_id: str, not_before: float) -> None:
+        """Put a claimed job back in the queue until `not_before`."""
+
+        await self.initialize()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                (
+                    "UPDATE jobs SET status = ?, not_before = ?, updated_at = ?, "
+                    "lease_until = NULL WHERE id = ? AND owner = ?"
+                ),
+                (QUEUED, not_before, time.time(), job_id, self.owner),
+            )
+            await db.commit()
+
+    @staticmethod
+    def _to_job(row: tuple) -> Job:
+        (
+            job_id,
+            status,
+            priority,
+            deadline,
+            not_before,
+            created_at,
+            updated_at,
+            attempts,
+            request,
+            result,
+            error,
+            reservation,
+            owner,
+            lease_until,
+        ) = row
+        return Job(
+            id=job_id,
+            status=status,
+            priority=priority,
+            deadline=deadline,
+            not_before=not_before,
+            created_at=created_at,
+            updated_at=updated_at,
+            attempts=attempts,
+            request=json_codec.loads(request),
+            result=json_codec.loads(result) if result else None,
+            error=error,
+            reservation=Reservation(**json_codec.loads(reservation)) if reservation else None,
+            owner=owner,
+            lease_until=lease_until,
+        )
+
+
+class JobService:
+    """Runs queued completions on a small worker pool, most urgent first.
+
+    Each job settles the rate-limit reservation it was submitted with once it has run,
+    and its upstream call takes a `low` priority admission slot like any other request.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        schedule: CarbonSchedule,
+        *,
+        proxy: ProxyService,
+        cache: CacheService,
+        ledger: EnergyLedger,
+        limiter: RateLimiter | None = None,
+        admission: AdmissionController | None = None,
+    ) -> None:
+        self.store = store
+        self.schedule = schedule
+        self.proxy = proxy
+        self.cache = cache
+        self.ledger = ledger
+        self.limiter = limiter
+        self.admission = admission
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task[None]] = []
+
+    async def submit(
+        self,
+        request: ChatCompletionRequest,
+        *,
+        priority: int = 0,
+        deadline: float | None = None,
+        low_carbon: bool = False,
+        reservation: Reservation | None = None,
+    ) -> Job:
+        now = time.time()
+        not_before = now
+        if low_carbon:
+            not_before = self.schedule.defer_until(
+                now, deadline, settings.CARBON_INTENSITY_THRESHOLD
+            )
+        job = Job(
+            id=uuid.uuid4().hex,
+            status=QUEUED,
+            priority=priority,
+            deadline=deadline,
+            not_before=not_before,
+            created_at=now,
+            updated_at=now,
+            attempts=0,
+            request=request.model_dump(exclude_none=True),
+            reservation=reservation,
+        )
+        await self.store.add(job)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        return await self.store.get(job_id)
+
+    async def start(
+        self, workers: int | None = None, *, limiter: RateLimiter | None = None
+    ) -> None:
+        if limiter is not None:
+            self.limiter = limiter
+        if self._workers:
+            return
+        count = settings.JOBS_WORKERS if workers is None else workers
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(count)]
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def run_once(self) -> bool:
+        """Claim and run one ready job; returns False when nothing was ready."""
+
+        job = await self.store.claim(time.time())
+        if job is None:
+            return False
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self._execute(job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job straight back instead of waiting out the lease.
+            await asyncio.shield(self.store.defer(job.id, time.time()))
+            raise
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+        return True
+
+    async def _heartbeat(self, job: Job) -> None:
+        """Keep renewing the job's lease so no other worker takes it over."""
+
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            try:
+                renewed = await self.store.renew(job.id)
+            except Exception:  # pragma: no cover - a later renewal may still succeed
+                logger.exception("Renewing the lease on job %s failed", job.id)
+                continue
+            if not renewed:
+                logger.warning("Lost the lease on job %s", job.id)
+                return
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+                ready_at = await self.store.next_ready_at()
+            except Exception:  # pragma: no cover - keep the worker alive on storage errors
+                logger.exception("Job worker iteration failed")
+                ready_at = None
+            poll = settings.JOBS_POLL_INTERVAL_SECONDS
+            delay = poll if ready_at is None else min(max(ready_at - time.time(), 0.0), poll)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except TimeoutError:
+                pass
+
+    async def _execute(self, job: Job) -> None:
+        if job.deadline is not None and time.time() > job.deadline:
+            await self.store.finish(job.id, status=FAILED, error="Deadline exceeded before start")
+            await self._settle(job)
+            return
+        payload = ChatCompletionRequest.model_validate(job.request)
+        prompt = cache_prompt(payload.messages)
+        scope = cache_scope(payload)
+        tokens, joules = 0, 0.0
+        deferred = False
+        try:
+            hit = await self.cache.get_cached_response(prompt, scope=scope)
+            if hit is not None:
+                await record_cache_hit(self.ledger, hit)
+                await self.store.finish(job.id, status=SUCCEEDED, result=hit.response)
+                return
+
+            try:
+                result = await self._forward(job, payload)
+            except OverloadedError as exc:
+                # Interactive traffic has the gateway full; run once it has drained.
+                await self.store.defer(job.id, time.time() + exc.retry_after)
+                deferred = True
+                return
+            if result.response is None:
+                raise HTTPException(status_code=502, detail="Provider returned empty response")
+            prompt_tokens, completion_tokens = await response_usage(payload, result)
+            joules = await record_upstream_usage(
+                self.ledger,
+                provider=result.provider_name,
+                model=payload.model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                energy_modifier=result.energy_modifier,
+                status="200",
+            )
+            tokens = prompt_tokens + completion_tokens
+            await self.cache.save_response(
+                prompt,
+                result.response,
+                scope=scope,
+                model=payload.model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                energy_joules=joules,
+                provider=result.provider_name,
+            )
+            await self.store.finish(job.id, status=SUCCEEDED, result=result.response)
+        except HTTPException as exc:
+            await self.store.finish(job.id, status=FAILED, error=str(exc.detail))
+        except Exception as exc:
+            logger.exception("Job %s failed", job.id)
+            await self.store.finish(job.id, status=FAILED, error=str(exc))
+        finally:
+            if not deferred:
+                await self._settle(job, tokens=tokens, joules=joules)
+
+    async def _forward(self, job: Job, payload: ChatCompletionRequest) -> ProviderResult:
+        deadline = None
+        if job.deadline is not None:
+            deadline = time.monotonic() + (job.deadline - time.time())
+        if self.admission is None or not settings.ADMISSION_ENABLED:
+            return await self.proxy.forward_request(payload, deadline=deadline)
+        await self.admission.acquire(PRIORITY_CLASSES["low"])
+        started = time.monotonic()
+        try:
+            return await self.proxy.forward_request(payload, deadline=deadline)
+        finally:
+            self.admission.release(time.monotonic() - started)
+
+    async def _settle(self, job: Job, *, tokens: int = 0, joules: float = 0.0) -> None:
+        if self.limiter is not None and job.reservation is not None:
+            await self.limiter.settle(job.reservation, tokens=tokens, joules=joules)
+
+
+job_service = JobService(
+    JobStore(settings.jobs_path()),
+    CarbonSchedule(settings.carbon_intensity_path()),
+    proxy=proxy_service,
+    cache=cache_service,
+    ledger=energy_ledger,
+    admission=admission_controller,
+)
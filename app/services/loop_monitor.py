@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from app.core.config import settings
+from app.services.observability import record_loop_blocked, record_loop_lag
+
+logger = logging.getLogger("greengate.loop")
+
+
+class LoopMonitor:
+    """Measures event-loop lag and logs the stack of callbacks that block the loop.
+
+    A task on the loop sleeps `interval` seconds at a time; how late it wakes up is the
+    lag. A watchdog thread checks that the task keeps ticking: once it is `threshold`
+    seconds overdue, the loop is stuck in one callback, and the loop thread's current
+    stack (the blocking code) is logged once for that stall.
+    """
+
+    def __init__(self, *, interval: float | None = None, threshold: float | None = None) -> None:
+        self.interval = settings.LOOP_MONITOR_INTERVAL_MS / 1000 if interval is None else interval
+        self.threshold = settings.LOOP_BLOCK_THRESHOLD_MS / 1000 if threshold is None else threshold
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._loop_thread = 0
+        self._last_tick = 0.0
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="greengate-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stopped.set()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self._last_tick = now = time.monotonic()
+            record_loop_lag(now - expected)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(min(self.interval, self.threshold) / 2):
+            last_tick = self._last_tick
+            blocked = time.monotonic() - last_tick - self.interval
+            if blocked < self.threshold or last_tick == reported:
+                continue
+            reported = last_tick
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            record_loop_blocked()
+            logger.warning(
+                "Event loop blocked for at least %.0f ms; loop thread stack:\n%s",
+                blocked * 1000,
+                stack or "<unavailable>",
+            )
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.mmap_dict import MmapedDict
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead
+
+logger = logging.getLogger("greengate.metrics")
+
+# Files of exited workers are folded into `<type>_archive.db`, so a scrape reads one file
+# per live worker and metric type plus the archives, however often workers restart.
+_ARCHIVED_TYPES = ("counter", "histogram", "summary")
+_ARCHIVE = "archive"
+_LOCK_FILE = ".lock"
+
+
+def multiprocess_dir() -> Path | None:
+    """The directory shared by the workers' metric files, if multiprocess mode is on.
+
+    prometheus_client picks its storage when the first metric is created, so this is
+    read from the environment rather than `settings`: `PROMETHEUS_MULTIPROC_DIR` must
+    be set (and the directory exist) before the app is imported.
+    """
+
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    return Path(path) if path else None
+
+
+def render_latest(path: Path | None = None) -> bytes:
+    """The metrics exposition: this host's workers combined in multiprocess mode."""
+
+    path = path or multiprocess_dir()
+    if path is None:
+        return generate_latest()
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=str(path))
+    with _locked(path, fcntl.LOCK_SH):
+        return generate_latest(registry)
+
+
+def compact_dead_workers(path: Path | None = None) -> int:
+    """Fold the metric files of exited workers into the archives; return how many pids.
+
+    Counters, histograms and summaries are summed into `<type>_archive.db`, so totals
+    keep counting the requests those workers served; their live gauges are dropped.
+    """
+
+    path = path or multiprocess_dir()
+    if path is None:
+        return 0
+    with _locked(path, fcntl.LOCK_EX):
+        dead_files: dict[str, list[Path]] = defaultdict(list)
+        dead_pids: set[int] = set()
+        for file in path.glob("*.db"):
+            kind, _, pid = file.stem.rpartition("_")
+            if not pid.isdigit() or _is_alive(int(pid)):
+                continue
+            dead_pids.add(int(pid))
+            if kind in _ARCHIVED_TYPES:
+                dead_files[kind].append(file)
+        for pid in dead_pids:
+            mark_process_dead(pid, str(path))
+        for kind, files in dead_files.items():
+            _archive(path / f"{kind}_{_ARCHIVE}.db", files)
+    if dead_pids:
+        logger.info("Archived metrics of %d exited worker(s)", len(dead_pids))
+    return len(dead_pids)
+
+
+def mark_worker_dead(path: Path | None = None) -> None:
+    """Drop this worker's live gauges; called on shutdown."""
+
+    path = path or multiprocess_dir()
+    if path is not None:
+        mark_process_dead(os.getpid(), str(path))
+
+
+def _archive(archive: Path, files: list[Path]) -> None:
+    totals: dict[str, float] = defaultdict(float)
+    for file in [archive, *files] if archive.exists() else files:
+        for key, value, _timestamp, _pos in MmapedDict.read_all_values_from_file(str(file)):
+            totals[key] += value
+
+    staging = archive.with_suffix(".tmp")
+    staging.unlink(missing_ok=True)
+    merged = MmapedDict(str(staging))
+    try:
+        for key, value in totals.items():
+            merged.write_value(key, value, 0.0)
+    finally:
+        merged.close()
+    # Scrapes hold the shared lock, so none sees the archive and the old files together.
+    os.replace(staging, archive)
+    for file in files:
+        file.unlink(missing_ok=True)
+
+
+def _is_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def _locked(path: Path, operation: int) -> Iterator[None]:
+    fd = os.open(path / _LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
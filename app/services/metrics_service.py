@@ -6,6 +6,7 @@ from pathlib import Path
 import aiosqlite
 
 from app.core.config import settings
+from app.services.tracing import span
 
 
 class EnergyLedger:
@@ -29,10 +30,18 @@ class EnergyLedger:
                         saved REAL NOT NULL,
                         prompt_tokens INTEGER NOT NULL,
                         completion_tokens INTEGER NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'complete',
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                     """
                 )
+                async with db.execute("PRAGMA table_info(energy_metrics)") as cursor:
+                    columns = {row[1] for row in await cursor.fetchall()}
+                if "status" not in columns:
+                    await db.execute(
+                        "ALTER TABLE energy_metrics "
+                        "ADD COLUMN status TEXT NOT NULL DEFAULT 'complete'"
+                    )
                 await db.commit()
             self._initialized = True
 
@@ -43,17 +52,61 @@ class EnergyLedger:
         saved: float,
         prompt_tokens: int,
         completion_tokens: int,
+        status: str = "complete",
     ) -> None:
-        await self.initialize()
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                (
-                    "INSERT INTO energy_metrics (spent, saved, prompt_tokens, completion_tokens) "
-                    "VALUES (?, ?, ?, ?)"
-                ),
-                (max(spent, 0.0), max(saved, 0.0), prompt_tokens, completion_tokens),
-            )
-            await db.commit()
+        """Persist one request; `status` is `partial` when the client went away early."""
+
+        attributes = {
+            "greengate.energy.spent_joules": spent,
+            "greengate.energy.saved_joules": saved,
+            "greengate.tokens.prompt": prompt_tokens,
+            "greengate.tokens.completion": completion_tokens,
+            "greengate.ledger.status": status,
+        }
+        with span("greengate.ledger.record", attributes):
+            await self.initialize()
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.execute(
+                    (
+                        "INSERT INTO energy_metrics "
+                        "(spent, saved, prompt_tokens, completion_tokens, status) "
+                        "VALUES (?, ?, ?, ?, ?)"
+                    ),
+                    (max(spent, 0.0), max(saved, 0.0), prompt_tokens, completion_tokens, status),
+                )
+                await db.commit()
+
+    async def record_many(self, entries: list[dict]) -> None:
+        """Persist several requests in one transaction; entries take `record`'s fields."""
+
+        if not entries:
+            return
+        attributes = {
+            "greengate.ledger.entries": len(entries),
+            "greengate.energy.spent_joules": sum(entry["spent"] for entry in entries),
+            "greengate.energy.saved_joules": sum(entry["saved"] for entry in entries),
+        }
+        with span("greengate.ledger.record_many", attributes):
+            await self.initialize()
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.executemany(
+                    (
+                        "INSERT INTO energy_metrics "
+                        "(spent, saved, prompt_tokens, completion_tokens, status) "
+                        "VALUES (?, ?, ?, ?, ?)"
+                    ),
+                    [
+                        (
+                            max(entry["spent"], 0.0),
+                            max(entry["saved"], 0.0),
+                            entry["prompt_tokens"],
+                            entry["completion_tokens"],
+                            entry.get("status", "complete"),
+                        )
+                        for entry in entries
+                    ],
+                )
+                await db.commit()
 
     async def snapshot(self) -> dict[str, float]:
         await self.initialize()
@@ -7,6 +7,7 @@ from fastapi import HTTPException, status
 
 from app.core.config import settings
 from app.providers.base import LLMProvider
+from app.services.tracing import span
 
 
 @dataclass(slots=True)
@@ -24,14 +25,23 @@ class ModelRouter:
         self.weights = settings.router_weights()
 
     def select(self, model: str) -> ProviderProfile:
-        eligible = [profile for profile in self.profiles if profile.provider.supports_model(model)]
-        if not eligible:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="No provider available for requested model",
+        with span("greengate.router.select", {"greengate.model": model}) as current:
+            eligible = [
+                profile for profile in self.profiles if profile.provider.supports_model(model)
+            ]
+            current.set_attribute("greengate.router.candidates", len(eligible))
+            if not eligible:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="No provider available for requested model",
+                )
+            score, chosen = max(
+                ((self._score(profile), profile) for profile in eligible), key=lambda pair: pair[0]
             )
-        scores = [(self._score(profile), profile) for profile in eligible]
-        return max(scores, key=lambda pair: pair[0])[1]
+            current.set_attributes(
+                {"greengate.provider": chosen.provider.name, "greengate.router.score": score}
+            )
+            return chosen
 
     def _score(self, profile: ProviderProfile) -> float:
         cost = max(profile.cost_per_1k_tokens, 0.01)
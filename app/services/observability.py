@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from prometheus_client import Counter, Histogram
+import functools
+
+from prometheus_client import Counter, Gauge, Histogram
 
 from app.core.config import settings
+from app.core.energy import EnergyMeter
 
 REQUEST_COUNTER = Counter(
     "greengate_requests_total",
@@ -27,6 +30,142 @@ PROVIDER_LATENCY_SECONDS = Histogram(
     buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
 )
 
+HTTP_POOL_IN_FLIGHT = Gauge(
+    "greengate_http_pool_requests_in_flight",
+    "Upstream requests holding a pooled connection",
+    labelnames=["provider"],
+    multiprocess_mode="livesum",
+)
+HTTP_POOL_SATURATION = Gauge(
+    "greengate_http_pool_saturation_ratio",
+    "In-flight upstream requests divided by the pool's max_connections",
+    labelnames=["provider"],
+    multiprocess_mode="livemax",
+)
+HTTP_POOL_WAIT_SECONDS = Histogram(
+    "greengate_http_pool_wait_seconds",
+    "Time spent waiting for a pooled connection before sending a request",
+    labelnames=["provider"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+STREAM_CHUNK_BYTES = Histogram(
+    "greengate_stream_chunk_bytes",
+    "Size of each streamed write to the client after coalescing",
+    labelnames=["provider"],
+    buckets=(64, 256, 1024, 4096, 16384, 65536, 262144),
+)
+STREAM_STALL_SECONDS = Histogram(
+    "greengate_stream_stall_seconds",
+    "Time upstream reads were paused because the client lagged behind a full buffer",
+    labelnames=["provider"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+CACHE_LOOKUP_OVER_BUDGET = Counter(
+    "greengate_cache_lookup_over_budget_total",
+    "Semantic cache lookups abandoned for exceeding CACHE_LOOKUP_BUDGET_MS",
+)
+CACHE_SAVES_DROPPED = Counter(
+    "greengate_cache_saves_dropped_total",
+    "Cache saves dropped because CACHE_SAVE_QUEUE_SIZE saves were already pending",
+)
+CACHE_LOOKUPS = Counter(
+    "greengate_cache_lookups_total",
+    "Cache lookups by tier (exact, semantic) and result (hit, miss)",
+    labelnames=["tier", "result"],
+)
+CACHE_SIMILARITY = Histogram(
+    "greengate_cache_similarity",
+    "Similarity of the closest semantic cache entry, for hits and near misses",
+    labelnames=["outcome"],
+    buckets=(0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.925, 0.95, 0.97, 0.98, 0.99, 1.0),
+)
+CACHE_OPERATION_SECONDS = Histogram(
+    "greengate_cache_operation_seconds",
+    "Time spent in semantic cache operations (lookup, persist, embed)",
+    labelnames=["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+CACHE_ERRORS = Counter(
+    "greengate_cache_errors_total",
+    "Semantic cache operations that failed",
+    labelnames=["operation"],
+)
+CACHE_ENTRIES = Gauge(
+    "greengate_cache_entries",
+    "Entries in the semantic cache collection",
+    multiprocess_mode="livemax",
+)
+CACHE_L1_ENTRIES = Gauge(
+    "greengate_cache_l1_entries",
+    "Entries in the in-process exact-match cache tier",
+    multiprocess_mode="livesum",
+)
+CACHE_L1_BYTES = Gauge(
+    "greengate_cache_l1_bytes",
+    "Approximate size of the exact-match tier's cached responses",
+    multiprocess_mode="livesum",
+)
+STREAM_TTFB_SECONDS = Histogram(
+    "greengate_stream_ttfb_seconds",
+    "Time from dispatching a streamed request upstream to its first byte reaching the client",
+    labelnames=["provider", "model"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20, 30),
+)
+STREAM_TTFT_SECONDS = Histogram(
+    "greengate_stream_ttft_seconds",
+    "Time from dispatching a streamed request upstream to its first content token",
+    labelnames=["provider", "model"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20, 30),
+)
+STREAM_INTER_CHUNK_SECONDS = Histogram(
+    "greengate_stream_inter_chunk_seconds",
+    "Gap between consecutive streamed writes to the client",
+    labelnames=["provider", "model"],
+    buckets=(0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5),
+)
+STREAM_DURATION_SECONDS = Histogram(
+    "greengate_stream_duration_seconds",
+    "Time from dispatching a streamed request upstream to the end of its stream",
+    labelnames=["provider", "model"],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+STREAM_TOKENS_PER_SECOND = Histogram(
+    "greengate_stream_tokens_per_second",
+    "Completion tokens per second after the first token of a stream",
+    labelnames=["provider", "model"],
+    buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500),
+)
+STAGE_SECONDS = Histogram(
+    "greengate_request_stage_seconds",
+    "Time spent in each stage of a gateway request",
+    labelnames=["stage"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "greengate_event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled by the lag monitor",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "greengate_event_loop_blocked_total",
+    "Times a callback blocked the event loop beyond LOOP_BLOCK_THRESHOLD_MS",
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "greengate_admission_in_flight",
+    "Requests currently holding an admission slot",
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "greengate_admission_queue_depth",
+    "Requests waiting for an admission slot",
+    multiprocess_mode="livesum",
+)
+ADMISSION_SHED = Counter(
+    "greengate_admission_shed_total",
+    "Requests rejected with 503 by admission control",
+    labelnames=["priority", "reason"],
+)
+
 
 def record_request(
     *,
@@ -52,3 +191,151 @@ def record_provider_latency(*, provider: str, seconds: float, stream: bool) -> N
         provider=provider,
         stream="true" if stream else "false",
     ).observe(max(seconds, 0.0))
+
+
+def record_pool_usage(*, provider: str, in_flight: int, max_connections: int) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    HTTP_POOL_IN_FLIGHT.labels(provider=provider).set(in_flight)
+    HTTP_POOL_SATURATION.labels(provider=provider).set(in_flight / max(max_connections, 1))
+
+
+def record_pool_wait(*, provider: str, seconds: float) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    HTTP_POOL_WAIT_SECONDS.labels(provider=provider).observe(max(seconds, 0.0))
+
+
+def record_stream_chunk(*, provider: str, size: int) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    STREAM_CHUNK_BYTES.labels(provider=provider).observe(size)
+
+
+def record_stream_stall(*, provider: str, seconds: float) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    STREAM_STALL_SECONDS.labels(provider=provider).observe(max(seconds, 0.0))
+
+
+def record_cache_over_budget() -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    CACHE_LOOKUP_OVER_BUDGET.inc()
+
+
+def record_cache_save_dropped() -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    CACHE_SAVES_DROPPED.inc()
+
+
+def record_cache_lookup(*, tier: str, hit: bool, count: int = 1) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED or count <= 0:
+        return
+    CACHE_LOOKUPS.labels(tier=tier, result="hit" if hit else "miss").inc(count)
+
+
+def record_cache_similarity(*, similarity: float, hit: bool) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    CACHE_SIMILARITY.labels(outcome="hit" if hit else "near_miss").observe(similarity)
+
+
+def record_cache_operation(*, operation: str, seconds: float) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    CACHE_OPERATION_SECONDS.labels(operation=operation).observe(max(seconds, 0.0))
+
+
+def record_cache_error(*, operation: str) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    CACHE_ERRORS.labels(operation=operation).inc()
+
+
+def record_cache_entries(entries: int) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    CACHE_ENTRIES.set(entries)
+
+
+def record_cache_l1(*, entries: int, size: int) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    CACHE_L1_ENTRIES.set(entries)
+    CACHE_L1_BYTES.set(size)
+
+
+def record_loop_lag(seconds: float) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    EVENT_LOOP_LAG_SECONDS.observe(max(seconds, 0.0))
+
+
+def record_loop_blocked() -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    EVENT_LOOP_BLOCKED.inc()
+
+
+def record_admission_state(*, in_flight: int, queued: int) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    ADMISSION_IN_FLIGHT.set(in_flight)
+    ADMISSION_QUEUE_DEPTH.set(queued)
+
+
+def record_admission_shed(*, priority: str, reason: str) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    ADMISSION_SHED.labels(priority=priority, reason=reason).inc()
+
+
+def record_stage_durations(stages: dict[str, float]) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    for stage, seconds in stages.items():
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def model_label(model: str) -> str:
+    """`model` if it is a known model, else `other`, so clients cannot inflate cardinality."""
+
+    return model if model in _known_models() else "other"
+
+
+@functools.cache
+def _known_models() -> frozenset[str]:
+    models = set(EnergyMeter.MODEL_JOULES_PER_TOKEN)
+    for provider in settings.provider_configs():
+        models.update(provider.supported_models)
+    return frozenset(models)
+
+
+def record_stream_first_byte(*, provider: str, model: str, seconds: float) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    STREAM_TTFB_SECONDS.labels(provider=provider, model=model).observe(max(seconds, 0.0))
+
+
+def record_stream_first_token(*, provider: str, model: str, seconds: float) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    STREAM_TTFT_SECONDS.labels(provider=provider, model=model).observe(max(seconds, 0.0))
+
+
+def record_stream_gap(*, provider: str, model: str, seconds: float) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    STREAM_INTER_CHUNK_SECONDS.labels(provider=provider, model=model).observe(max(seconds, 0.0))
+
+
+def record_stream_complete(
+    *, provider: str, model: str, seconds: float, tokens_per_second: float | None
+) -> None:
+    if not settings.PROMETHEUS_METRICS_ENABLED:
+        return
+    STREAM_DURATION_SECONDS.labels(provider=provider, model=model).observe(max(seconds, 0.0))
+    if tokens_per_second is not None:
+        STREAM_TOKENS_PER_SECOND.labels(provider=provider, model=model).observe(tokens_per_second)
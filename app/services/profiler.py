@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import marshal
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import FrameType
+
+from app.core.config import settings
+
+# Media type and file suffix of each mode's artifact.
+_FORMATS = {
+    "cpu": ("application/octet-stream", "pstats"),
+    "wall": ("text/plain", "folded"),
+    "alloc": ("text/plain", "folded"),
+}
+# Frames kept per allocation by tracemalloc when a profile turns it on.
+_ALLOC_FRAMES = 16
+
+
+class ProfilerBusyError(RuntimeError):
+    """Another profile is already running in this worker."""
+
+
+@dataclass(slots=True)
+class ProfileResult:
+    content: bytes
+    media_type: str
+    filename: str
+
+
+class Profiler:
+    """Profiles this worker on demand, one profile at a time.
+
+    - `cpu`: cProfile on the event-loop thread; a pstats file (snakeviz, flameprof).
+    - `wall`: samples every thread's stack each `PROFILE_SAMPLE_INTERVAL_MS`, including
+      time spent waiting; collapsed stacks (flamegraph.pl, speedscope).
+    - `alloc`: tracemalloc; collapsed stacks weighted by the bytes allocated during the
+      window and still alive at its end.
+    """
+
+    def __init__(self) -> None:
+        self._busy = False
+
+    async def profile(self, mode: str, seconds: float) -> ProfileResult:
+        if mode not in _FORMATS:
+            raise ValueError(f"Unknown profile mode {mode!r}")
+        run = {"cpu": self._cpu, "wall": self._wall, "alloc": self._alloc}[mode]
+        with self._exclusive():
+            content = await run(seconds)
+        media_type, suffix = _FORMATS[mode]
+        return ProfileResult(content, media_type, f"greengate-{os.getpid()}-{mode}.{suffix}")
+
+    async def top_allocations(self, *, limit: int, seconds: float) -> dict:
+        """The `limit` source lines holding the most traced memory.
+
+        Reads the current heap when tracemalloc is already on (e.g. `PYTHONTRACEMALLOC`);
+        otherwise traces for `seconds` and reports what was allocated and kept meanwhile.
+        """
+
+        if tracemalloc.is_tracing():
+            snapshot = await asyncio.to_thread(_snapshot)
+            current, peak = tracemalloc.get_traced_memory()
+            window = None
+        else:
+            with self._exclusive(), _tracing():
+                await asyncio.sleep(seconds)
+                snapshot = await asyncio.to_thread(_snapshot)
+                current, peak = tracemalloc.get_traced_memory()
+            window = seconds
+        statistics = await asyncio.to_thread(snapshot.statistics, "lineno")
+        return {
+            "pid": os.getpid(),
+            "window_seconds": window,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "sites": [
+                {
+                    "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "bytes": stat.size,
+                    "count": stat.count,
+                }
+                for stat in statistics[:limit]
+            ],
+        }
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        # Checked and set without awaiting in between, so the event loop makes this atomic.
+        if self._busy:
+            raise ProfilerBusyError("A profile is already running in this worker")
+        self._busy = True
+        try:
+            yield
+        finally:
+            self._busy = False
+
+    async def _cpu(self, seconds: float) -> bytes:
+        # Coroutines and callbacks all run on this thread, so enabling the profiler here
+        # covers every request the loop serves until it is disabled.
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+        profile.create_stats()
+        return marshal.dumps(profile.stats)
+
+    async def _wall(self, seconds: float) -> bytes:
+        stop = threading.Event()
+        sampling = asyncio.ensure_future(
+            asyncio.to_thread(_sample_stacks, stop, settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        )
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+        return _folded(await sampling)
+
+    async def _alloc(self, seconds: float) -> bytes:
+        with _tracing():
+            before = await asyncio.to_thread(_snapshot)
+            await asyncio.sleep(seconds)
+            after = await asyncio.to_thread(_snapshot)
+        differences = await asyncio.to_thread(after.compare_to, before, "traceback")
+        samples: Counter[str] = Counter()
+        for stat in differences:
+            if stat.size_diff > 0:
+                # tracemalloc orders frames from the oldest to the most recent call.
+                stack = ";".join(f"{frame.filename}:{frame.lineno}" for frame in stat.traceback)
+                samples[stack] += stat.size_diff
+        return _folded(samples)
+
+
+@contextmanager
+def _tracing() -> Iterator[None]:
+    """Trace allocations for the duration, unless tracemalloc was already on."""
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(_ALLOC_FRAMES)
+    try:
+        yield
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),)
+    )
+
+
+def _sample_stacks(stop: threading.Event, interval: float) -> Counter[str]:
+    sampler = threading.get_ident()
+    samples: Counter[str] = Counter()
+    while not stop.wait(interval):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident != sampler:
+                samples[_collapse(names.get(ident, str(ident)), frame)] += 1
+    return samples
+
+
+def _collapse(thread: str, frame: FrameType | None) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_qualname} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    stack.append(thread)
+    return ";".join(reversed(stack))
+
+
+def _folded(samples: Counter[str]) -> bytes:
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common()).encode()
+
+
+profiler = Profiler()
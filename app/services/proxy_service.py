@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 import time
 
 import httpx
@@ -10,25 +11,30 @@ from app.core.config import settings
 from app.core.provider_settings import ProviderSettings
 from app.providers.anthropic_provider import AnthropicProvider
 from app.providers.azure_openai_provider import AzureOpenAIProvider
-from app.providers.base import LLMProvider, ProviderResult
+from app.providers.base import LLMProvider, ProviderError, ProviderResult
 from app.providers.cohere_provider import CohereProvider
 from app.providers.openai_provider import OpenAIProvider
-from app.services.model_router import ProviderProfile, configure_router, model_router
+from app.schemas.chat import ChatCompletionRequest
+from app.services.cancellation import deadline_exceeded, remaining_seconds
+from app.services.http_pool import build_client
+from app.services.model_router import ModelRouter, ProviderProfile, configure_router
 from app.services.observability import record_provider_latency
 
+logger = logging.getLogger("greengate.proxy")
+
 
 class ProxyService:
     def __init__(self) -> None:
-        self._client: httpx.AsyncClient | None = None
-        self._lock = asyncio.Lock()
+        self._clients: dict[str, httpx.AsyncClient] = {}
         self._router_lock = asyncio.Lock()
         self._profiles: list[ProviderProfile] = []
+        self._router: ModelRouter | None = None
 
     async def initialize(self) -> None:
-        if model_router is not None:
+        if self._router is not None:
             return
         async with self._router_lock:
-            if model_router is not None:
+            if self._router is not None:
                 return
             configs = settings.provider_configs()
             if not configs:
@@ -40,9 +46,8 @@ class ProxyService:
                 name.strip() for name in settings.LLM_PROVIDER_SEQUENCE.split(",") if name.strip()
             ]
             configs.sort(key=lambda cfg: order.index(cfg.name) if cfg.name in order else len(order))
-            client = await self._ensure_client()
-            self._profiles = [self._create_profile(cfg, client) for cfg in configs]
-            configure_router(self._profiles)
+            self._profiles = [self._create_profile(cfg, self._client_for(cfg)) for cfg in configs]
+            self._router = configure_router(self._profiles)
 
     def _create_profile(self, cfg: ProviderSettings, client: httpx.AsyncClient) -> ProviderProfile:
         provider: LLMProvider
@@ -64,41 +69,91 @@ class ProxyService:
             energy_modifier=cfg.energy_modifier,
         )
 
-    async def _ensure_client(self) -> httpx.AsyncClient:
-        if self._client is None:
-            async with self._lock:
-                if self._client is None:
-                    self._client = httpx.AsyncClient(timeout=settings.HTTP_TIMEOUT_SECONDS)
-        return self._client
+    def _client_for(self, cfg: ProviderSettings) -> httpx.AsyncClient:
+        client = self._clients.get(cfg.name)
+        if client is None:
+            client = build_client(cfg)
+            self._clients[cfg.name] = client
+        return client
+
+    async def prewarm(self) -> None:
+        """Open a pooled connection to every provider so early requests skip TCP/TLS setup."""
+
+        await self.initialize()
+        await asyncio.gather(
+            *(self._prewarm_one(profile.provider) for profile in self._profiles)
+        )
+
+    async def _prewarm_one(self, provider: LLMProvider) -> None:
+        client = self._clients.get(provider.name)
+        if client is None:
+            return
+        try:
+            async with asyncio.timeout(settings.HTTP_PREWARM_TIMEOUT_SECONDS):
+                await client.head(provider.settings.base_url)
+        except Exception as exc:  # warm-up is best effort
+            logger.info("Connection pre-warm for %s failed: %s", provider.name, exc)
+
+    async def forward_request(
+        self,
+        payload: dict | ChatCompletionRequest,
+        *,
+        stream: bool = False,
+        deadline: float | None = None,
+        raw_body: bytes | None = None,
+    ) -> ProviderResult:
+        """Route `payload` to the best provider, retrying transient upstream failures.
+
+        When `raw_body` (the client's original JSON) is given and the chosen provider speaks
+        the OpenAI wire format, those bytes are forwarded untouched and `payload` is only
+        consulted for the model; otherwise the payload is dumped and translated.
+        """
 
-    async def forward_request(self, payload: dict, *, stream: bool = False) -> ProviderResult:
-        if model_router is None:
+        if self._router is None:
             await self.initialize()
-        if model_router is None:
+        if self._router is None:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Model router unavailable",
             )
 
-        model = payload.get("model")
+        if isinstance(payload, ChatCompletionRequest):
+            model = payload.model
+        else:
+            model = payload.get("model")
         if not model:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Model is required")
 
-        profile = model_router.select(model)
+        profile = self._router.select(model)
+        provider = profile.provider
+        passthrough = raw_body is not None and provider.supports_passthrough
+        if not passthrough and isinstance(payload, ChatCompletionRequest):
+            payload = payload.model_dump(exclude_none=True)
         attempt = 0
         backoff = settings.RETRY_BACKOFF_SECONDS
         while True:
+            timeout = remaining_seconds(deadline)
+            if timeout is not None and timeout <= 0:
+                raise deadline_exceeded()
             try:
                 started = time.perf_counter()
-                result = await profile.provider.invoke(payload, stream=stream)
+                async with asyncio.timeout(timeout):
+                    if passthrough:
+                        result = await provider.invoke_raw(raw_body, model=model, stream=stream)
+                    else:
+                        result = await provider.invoke(payload, stream=stream)
                 record_provider_latency(
                     provider=result.provider_name,
                     seconds=time.perf_counter() - started,
                     stream=stream,
                 )
                 return result
+            except TimeoutError as exc:
+                raise deadline_exceeded() from exc
             except httpx.HTTPStatusError as exc:
-                if exc.response.status_code >= 500 and attempt < settings.RETRY_ATTEMPTS:
+                if exc.response.status_code >= 500 and self._can_retry(
+                    attempt, backoff * (attempt + 1), deadline
+                ):
                     attempt += 1
                     await asyncio.sleep(backoff * attempt)
                     continue
@@ -107,20 +162,31 @@ class ProxyService:
                     detail=exc.response.text,
                 ) from exc
             except httpx.RequestError as exc:
-                if attempt >= settings.RETRY_ATTEMPTS:
+                if not self._can_retry(attempt, backoff * (attempt + 1), deadline):
                     raise HTTPException(
                         status_code=502,
                         detail=f"Proxy request failed: {exc}",
                     ) from exc
                 attempt += 1
                 await asyncio.sleep(backoff * attempt)
+            except ProviderError as exc:
+                raise HTTPException(status_code=502, detail=str(exc)) from exc
             except ValueError as exc:
                 raise HTTPException(status_code=400, detail=str(exc)) from exc
 
+    @staticmethod
+    def _can_retry(attempt: int, delay: float, deadline: float | None) -> bool:
+        if attempt >= settings.RETRY_ATTEMPTS:
+            return False
+        timeout = remaining_seconds(deadline)
+        # Sleeping past the caller's deadline only to fail afterwards wastes a slot.
+        return timeout is None or timeout > delay
+
     async def close(self) -> None:
-        if self._client:
-            await self._client.aclose()
-            self._client = None
+        clients, self._clients = self._clients, {}
+        self._router = None
+        self._profiles = []
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
 
 
 proxy_service = ProxyService()
@@ -0,0 +1,558 @@
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from app.core.config import settings
+
+logger = logging.getLogger("greengate.ratelimit")
+
+# Limits are given per minute; buckets refill at 1/60th of that per second.
+REFILL_SECONDS = 60.0
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "tokens", "refill_rate_per_second", "timestamp")
+
+    def __init__(self, rate_per_minute: float) -> None:
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.refill_rate_per_second = float(rate_per_minute) / REFILL_SECONDS
+        self.timestamp = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.timestamp
+        self.timestamp = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate_per_second)
+
+    def wait_seconds(self, tokens: float) -> float:
+        """Seconds until `tokens` can be taken; charges above capacity need a full bucket."""
+
+        return _shortfall(self.capacity, self.tokens, tokens) / self.refill_rate_per_second
+
+    def take(self, tokens: float) -> None:
+        self.tokens = _charge(self.capacity, self.tokens, tokens)
+
+    def consume(self, tokens: float = 1.0) -> bool:
+        self.refill(time.monotonic())
+        if self.wait_seconds(tokens) > 0:
+            return False
+        self.take(tokens)
+        return True
+
+
+def _shortfall(capacity: float, available: float, tokens: float) -> float:
+    return max(min(tokens, capacity) - available, 0.0)
+
+
+def _charge(capacity: float, available: float, tokens: float) -> float:
+    # An oversized charge runs the bucket into debt (at most one bucketful), which later
+    # requests repay; a negative charge is a refund.
+    return min(capacity, max(available - tokens, -capacity))
+
+
+class RateLimitBackend(ABC):
+    """Stores per-caller buckets for `RateLimiter`.
+
+    `limits` holds each bucket's size per minute and `amounts` what to charge each, in
+    the same order. `take` is all-or-nothing: it charges every bucket, or none and
+    returns the seconds until all of them could pay.
+    """
+
+    @abstractmethod
+    async def take(
+        self, identifier: str, limits: tuple[float, ...], amounts: tuple[float, ...]
+    ) -> float: ...
+
+    @abstractmethod
+    async def adjust(
+        self, identifier: str, limits: tuple[float, ...], amounts: tuple[float, ...]
+    ) -> None:
+        """Charge (or, when negative, refund) `amounts` without an admission check."""
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryBackend(RateLimitBackend):
+    """Buckets in this process, kept in least-recently-used order.
+
+    A caller whose buckets have refilled completely is indistinguishable from a fresh
+    one and is swept out, and beyond `max_buckets` callers the least recently seen are
+    dropped.
+    """
+
+    def __init__(self, *, max_buckets: int | None = None, sweep_interval: float = 1.0) -> None:
+        self.max_buckets = settings.RATE_LIMIT_MAX_BUCKETS if max_buckets is None else max_buckets
+        self.sweep_interval = sweep_interval
+        self._buckets: OrderedDict[str, tuple[TokenBucket, ...]] = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(
+        self, identifier: str, limits: tuple[float, ...], amounts: tuple[float, ...]
+    ) -> float:
+        buckets = self._caller(identifier, limits)
+        now = time.monotonic()
+        wait = 0.0
+        for bucket, amount in zip(buckets, amounts, strict=True):
+            bucket.refill(now)
+            wait = max(wait, bucket.wait_seconds(amount))
+        if now >= self._next_sweep:
+            self.sweep(now)
+        if wait == 0.0:
+            for bucket, amount in zip(buckets, amounts, strict=True):
+                bucket.take(amount)
+        return wait
+
+    async def adjust(
+        self, identifier: str, limits: tuple[float, ...], amounts: tuple[float, ...]
+    ) -> None:
+        buckets = self._caller(identifier, limits)
+        now = time.monotonic()
+        for bucket, amount in zip(buckets, amounts, strict=True):
+            bucket.refill(now)
+            bucket.take(amount)
+
+    def sweep(self, now: float | None = None) -> int:
+        """Drop callers whose buckets have all refilled; returns how many went."""
+
+        now = time.monotonic() if now is None else now
+        self._next_sweep = now + self.sweep_interval
+        cutoff = now - REFILL_SECONDS
+        buckets = self._buckets
+        evicted = 0
+        # Oldest first, so the scan stops at the first caller seen within the last minute.
+        while buckets:
+            identifier, caller = next(iter(buckets.items()))
+            if caller[0].timestamp > cutoff:
+                break
+            for bucket in caller:
+                bucket.refill(now)
+            if any(bucket.tokens < bucket.capacity for bucket in caller):
+                # Still repaying debt: the refill stamped it `now`, so it moves behind
+                # the idle callers and ends the scan when it comes round again.
+                buckets.move_to_end(identifier)
+                continue
+            del buckets[identifier]
+            evicted += 1
+        return evicted
+
+    def _caller(self, identifier: str, limits: tuple[float, ...]) -> tuple[TokenBucket, ...]:
+        buckets = self._buckets
+        caller = buckets.get(identifier)
+        if caller is not None:
+            buckets.move_to_end(identifier)
+            return caller
+        caller = tuple(TokenBucket(limit) for limit in limits)
+        buckets[identifier] = caller
+        if len(buckets) > self.max_buckets:
+            buckets.popitem(last=False)
+        return caller
+
+
+class SharedMemoryBackend(RateLimitBackend):
+    """Bucket table in a memory-mapped file shared by every worker on the host.
+
+    Callers hash to a slot and probe a short window of neighbours; each take locks just
+    that window's byte range with `fcntl`, so workers only contend on the same callers.
+    A slot whose buckets have refilled is free for reuse, and when a whole window is
+    busy the least recently used slot in it is taken over. Record locks belong to the
+    process, so the backend must only be used from the event loop thread.
+
+    The table's layout is part of its file name (`ratelimit.bin` becomes
+    `ratelimit.v1-65536.bin`), so workers configured differently never share, or
+    rebuild, a table another worker has mapped. A file of the right name but the wrong
+    shape is refused rather than repaired.
+    """
+
+    MAGIC = b"GGRL"
+    VERSION = 1
+    PROBE = 8
+    MAX_LIMITS = 3
+    _HEADER = struct.Struct("<4sII")
+    # Caller hash, last update (CLOCK_MONOTONIC, shared by the host), then one balance
+    # per limit.
+    _RECORD = struct.Struct(f"<Qd{MAX_LIMITS}d")
+
+    def __init__(self, path: Path | str, *, slots: int | None = None) -> None:
+        path = Path(path)
+        self.slots = settings.RATE_LIMIT_SHARED_SLOTS if slots is None else slots
+        self.path = path.with_name(f"{path.stem}.v{self.VERSION}-{self.slots}{path.suffix}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        size = self._HEADER.size + (self.slots + self.PROBE) * self._RECORD.size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            header = self._HEADER.pack(self.MAGIC, self.slots, self.MAX_LIMITS)
+            existing = os.fstat(self._fd).st_size
+            if existing == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, header, 0)
+            valid = existing in (0, size) and os.pread(self._fd, self._HEADER.size, 0) == header
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        if not valid:
+            # Other workers may have it mapped; truncating it under them would crash them.
+            os.close(self._fd)
+            raise RuntimeError(
+                f"{self.path} is not a rate limit table of {self.slots} slots; "
+                "remove it once no worker is running"
+            )
+        self._map = mmap.mmap(self._fd, size)
+        self._window = self.PROBE * self._RECORD.size
+
+    async def take(
+        self, identifier: str, limits: tuple[float, ...], amounts: tuple[float, ...]
+    ) -> float:
+        return self._update(identifier, limits, amounts, check=True)
+
+    async def adjust(
+        self, identifier: str, limits: tuple[float, ...], amounts: tuple[float, ...]
+    ) -> None:
+        self._update(identifier, limits, amounts, check=False)
+
+    async def close(self) -> None:
+        if not self._map.closed:
+            self._map.close()
+            os.close(self._fd)
+
+    def _update(
+        self,
+        identifier: str,
+        limits: tuple[float, ...],
+        amounts: tuple[float, ...],
+        *,
+        check: bool,
+    ) -> float:
+        key = _slot_key(identifier)
+        start = self._HEADER.size + (key % self.slots) * self._RECORD.size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self._window, start)
+        try:
+            now = time.monotonic()
+            offset, balances = self._slot(key, start, now, limits)
+            wait = 0.0
+            if check:
+                for limit, balance, amount in zip(limits, balances, amounts, strict=False):
+                    shortfall = (amount if amount < limit else limit) - balance
+                    if shortfall > 0:
+                        wait = max(wait, shortfall * REFILL_SECONDS / limit)
+            if wait == 0.0:
+                for index, amount in enumerate(amounts):
+                    balances[index] = _charge(limits[index], balances[index], amount)
+            self._RECORD.pack_into(self._map, offset, key, now, *balances)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self._window, start)
+        return wait
+
+    def _slot(
+        self, key: int, start: int, now: float, limits: tuple[float, ...]
+    ) -> tuple[int, list[float]]:
+        """Find the caller's record (or the one to replace) and refill its balances."""
+
+        unpack_from = self._RECORD.unpack_from
+        spare: int | None = None
+        oldest = (math.inf, start)
+        for offset in range(start, start + self._window, self._RECORD.size):
+            record = unpack_from(self._map, offset)
+            slot_key, updated = record[0], record[1]
+            if slot_key == key:
+                balances = list(record[2:])
+                # Skipped if the clock went backwards (the file outlived a reboot).
+                elapsed = now - updated
+                if elapsed > 0:
+                    for index, limit in enumerate(limits):
+                        balance = balances[index] + elapsed * limit / REFILL_SECONDS
+                        balances[index] = limit if balance > limit else balance
+                return offset, balances
+            if spare is None and (slot_key == 0 or now - updated >= 2 * REFILL_SECONDS):
+                # Idle for two minutes, even a bucket left in full debt has refilled.
+                spare = offset
+            if updated < oldest[0]:
+                oldest = (updated, offset)
+        if spare is None:
+            spare = oldest[1]
+        return spare, [*limits, *[0.0] * (self.MAX_LIMITS - len(limits))]
+
+
+@lru_cache(maxsize=65_536)
+def _slot_key(identifier: str) -> int:
+    """A caller's non-zero 64-bit key in the shared table (0 marks an empty slot)."""
+
+    digest = hashlib.blake2b(identifier.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class RespError(Exception):
+    """An error reply from a Redis-protocol server."""
+
+
+def _encode_command(*parts: str | bytes | float) -> bytes:
+    chunks = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        elif isinstance(part, float):
+            data = repr(part).encode()
+        else:
+            data = str(part).encode("utf-8")
+        chunks.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(chunks)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> object:
+    line = await reader.readuntil(b"\r\n")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        return RespError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        size = int(body)
+        if size < 0:
+            return None
+        return (await reader.readexactly(size + 2))[:-2]
+    if kind == b"*":
+        size = int(body)
+        if size < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(size)]
+    raise RespError(f"Unexpected reply type {kind!r}")
+
+
+class RespConnection:
+    """A single pipelined connection speaking the Redis protocol (RESP2).
+
+    Commands from concurrent callers are written as they arrive and replies are
+    matched to them in order by one reader task, so callers never wait on each other's
+    round trips.
+    """
+
+    def __init__(self, url: str) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task[None] | None = None
+        self._pending: deque[asyncio.Future[object]] = deque()
+        self._connect_lock = asyncio.Lock()
+
+    async def execute(self, *commands: tuple[str | bytes | float, ...]) -> list[object]:
+        """Send `commands` in one write and return their replies (errors as `RespError`)."""
+
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            writer = await self._connect()
+        return await self._send(writer, commands)
+
+    async def close(self) -> None:
+        writer, self._writer = self._writer, None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        self._fail_pending(ConnectionError("Connection closed"))
+
+    async def _send(
+        self, writer: asyncio.StreamWriter, commands: tuple[tuple[str | bytes | float, ...], ...]
+    ) -> list[object]:
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in commands]
+        self._pending.extend(futures)
+        writer.write(b"".join(_encode_command(*command) for command in commands))
+        return [await future for future in futures]
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            await self.close()
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self._reader, self._writer = reader, writer
+            self._reader_task = asyncio.create_task(self._read_replies(reader))
+            setup: list[tuple[str | bytes | float, ...]] = []
+            if self.password:
+                setup.append(("AUTH", self.password))
+            if self.db:
+                setup.append(("SELECT", self.db))
+            if setup:
+                for reply in await self._send(writer, tuple(setup)):
+                    if isinstance(reply, RespError):
+                        await self.close()
+                        raise reply
+            return writer
+
+    async def _read_replies(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                reply = await _read_reply(reader)
+                future = self._pending.popleft()
+                # A caller that timed out has cancelled its future; its reply is dropped.
+                if not future.done():
+                    future.set_result(reply)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, RespError) as exc:
+            self._fail_pending(ConnectionError(f"Redis connection lost: {exc}"))
+            if self._writer is not None:
+                self._writer.close()
+
+    def _fail_pending(self, exc: Exception) -> None:
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(exc)
+
+
+class RedisBackend(RateLimitBackend):
+    """Limits shared by every worker and host through a Redis-protocol server.
+
+    Each limit is a sliding window: the counter for the current minute plus the
+    previous minute's, weighted by how much of it still overlaps. Counters are only
+    incremented and expired, so no server-side scripting is needed. If the server is
+    unreachable or slower than `timeout`, requests are allowed rather than failed, and
+    the server is left alone for `backoff` seconds, doubling up to `MAX_BACKOFF_SECONDS`
+    while it stays down.
+    """
+
+    WINDOW_SECONDS = 60
+    MAX_BACKOFF_SECONDS = 30.0
+
+    def __init__(
+        self,
+        url: str | None = None,
+        *,
+        prefix: str = "greengate:rl:",
+        timeout: float | None = None,
+        backoff: float = 0.5,
+    ) -> None:
+        self.connection = RespConnection(url or settings.RATE_LIMIT_REDIS_URL)
+        self.prefix = prefix
+        self.timeout = settings.RATE_LIMIT_REDIS_TIMEOUT_MS / 1000 if timeout is None else timeout
+        self.backoff = backoff
+        self._available = True
+        self._next_backoff = backoff
+        self._retry_at = 0.0
+
+    async def take(
+        self, identifier: str, limits: tuple[float, ...], amounts: tuple[float, ...]
+    ) -> float:
+        now = time.time()
+        window, elapsed = divmod(now, self.WINDOW_SECONDS)
+        window = int(window)
+        commands: list[tuple[str | bytes | float, ...]] = []
+        for index, amount in enumerate(amounts):
+            current = self._key(index, window, identifier)
+            commands.append(("GET", self._key(index, window - 1, identifier)))
+            commands.append(("INCRBYFLOAT", current, float(amount)))
+            commands.append(("PEXPIRE", current, 2 * self.WINDOW_SECONDS * 1000))
+        replies = await self._execute(commands)
+        if replies is None:
+            return 0.0
+
+        overlap = 1.0 - elapsed / self.WINDOW_SECONDS
+        wait = 0.0
+        for index, (limit, amount) in enumerate(zip(limits, amounts, strict=True)):
+            previous = _float(replies[3 * index])
+            current = _float(replies[3 * index + 1])
+            used_before = previous * overlap + current - amount
+            excess = used_before + min(amount, limit) - limit
+            if excess <= 1e-9:
+                continue
+            # The previous minute drains until this one ends, then this minute drains.
+            carried = previous * overlap
+            if carried >= excess:
+                wait = max(wait, excess * self.WINDOW_SECONDS / previous)
+            else:
+                remaining = (current - amount) or limit
+                rest = (excess - carried) * self.WINDOW_SECONDS / remaining
+                wait = max(wait, overlap * self.WINDOW_SECONDS + rest)
+        if wait > 0:
+            await self._execute(
+                [
+                    ("INCRBYFLOAT", self._key(index, window, identifier), -float(amount))
+                    for index, amount in enumerate(amounts)
+                ]
+            )
+        return wait
+
+    async def adjust(
+        self, identifier: str, limits: tuple[float, ...], amounts: tuple[float, ...]
+    ) -> None:
+        window = int(time.time() // self.WINDOW_SECONDS)
+        commands: list[tuple[str | bytes | float, ...]] = []
+        for index, amount in enumerate(amounts):
+            if amount:
+                current = self._key(index, window, identifier)
+                commands.append(("INCRBYFLOAT", current, float(amount)))
+                commands.append(("PEXPIRE", current, 2 * self.WINDOW_SECONDS * 1000))
+        if commands:
+            await self._execute(commands)
+
+    async def close(self) -> None:
+        await self.connection.close()
+
+    def _key(self, index: int, window: int, identifier: str) -> str:
+        return f"{self.prefix}{index}:{window}:{identifier}"
+
+    async def _execute(self, commands: list[tuple[str | bytes | float, ...]]) -> list | None:
+        if not self._available and time.monotonic() < self._retry_at:
+            # Still backing off: fail open without paying for a connect or a timeout.
+            return None
+        try:
+            async with asyncio.timeout(self.timeout):
+                replies = await self.connection.execute(*commands)
+            for reply in replies:
+                if isinstance(reply, RespError):
+                    raise reply
+        except (OSError, TimeoutError, RespError) as exc:
+            if self._available:
+                logger.warning("Rate limit backend unavailable, allowing requests: %s", exc)
+                self._available = False
+            self._retry_at = time.monotonic() + self._next_backoff
+            self._next_backoff = min(self._next_backoff * 2, self.MAX_BACKOFF_SECONDS)
+            return None
+        if not self._available:
+            logger.info("Rate limit backend reachable again")
+            self._available = True
+            self._next_backoff = self.backoff
+        return replies
+
+
+def _float(reply: object) -> float:
+    return float(reply) if reply is not None else 0.0
+
+
+def create_backend(name: str | None = None) -> RateLimitBackend:
+    """Build the backend selected by `RATE_LIMIT_BACKEND` (memory, shared or redis)."""
+
+    name = (name or settings.RATE_LIMIT_BACKEND).lower()
+    if name == "memory":
+        return MemoryBackend()
+    if name == "shared":
+        return SharedMemoryBackend(settings.rate_limit_shared_path())
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown rate limit backend: {name}")
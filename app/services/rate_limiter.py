@@ -1,54 +1,131 @@
 from __future__ import annotations
 
-import asyncio
-import time
+import math
+from dataclasses import dataclass
 
 from fastapi import HTTPException, status
 
+from app.services.rate_limit_backends import MemoryBackend, RateLimitBackend
 
-class TokenBucket:
-    def __init__(self, rate_per_minute: int) -> None:
-        self.capacity = float(rate_per_minute)
-        self.tokens = float(rate_per_minute)
-        self.refill_rate_per_second = float(rate_per_minute) / 60.0
-        self.timestamp = time.monotonic()
 
-    def consume(self, tokens: float = 1.0) -> bool:
-        now = time.monotonic()
-        elapsed = now - self.timestamp
-        self.timestamp = now
-        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate_per_second)
-        if self.tokens >= tokens:
-            self.tokens -= tokens
-            return True
-        return False
+@dataclass(slots=True)
+class Reservation:
+    """What `RateLimiter.check` charged a caller, to be corrected by `settle`."""
+
+    identifier: str
+    tokens: float = 0.0
+    joules: float = 0.0
+    requests: float = 1.0
 
 
 class RateLimiter:
-    def __init__(self, rate_per_minute: int) -> None:
+    """Per-caller request, token and energy budgets.
+
+    Every caller gets `rate_per_minute` requests; `tokens_per_minute` and
+    `joules_per_minute` (0 disables them) add budgets charged with an estimate when the
+    request is admitted and corrected via `settle` once actual usage is known. Buckets
+    live in `backend`: this process's memory by default, or storage shared between
+    workers (see `app.services.rate_limit_backends`).
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: int,
+        *,
+        tokens_per_minute: int = 0,
+        joules_per_minute: float = 0.0,
+        backend: RateLimitBackend | None = None,
+    ) -> None:
         self.rate_per_minute = rate_per_minute
-        self._lock = asyncio.Lock()
-        self._buckets: dict[str, TokenBucket] = {}
+        self.tokens_per_minute = tokens_per_minute
+        self.joules_per_minute = joules_per_minute
+        self.backend = backend if backend is not None else MemoryBackend()
+        self._limits = tuple(
+            float(limit)
+            for limit in (rate_per_minute, tokens_per_minute, joules_per_minute)
+            if limit > 0
+        )
+
+    @property
+    def meters_usage(self) -> bool:
+        return self.tokens_per_minute > 0 or self.joules_per_minute > 0
+
+    async def check(
+        self, identifier: str, *, requests: float = 1.0, tokens: float = 0, joules: float = 0.0
+    ) -> Reservation:
+        """Charge `requests` plus the estimated `tokens`/`joules`, or raise a 429.
+
+        Nothing is charged when any budget is short; `Retry-After` is how long the
+        emptiest of them takes to refill enough. More `requests` than the per-minute
+        limit are refused outright, without `Retry-After`.
+        """
 
-    async def check(self, identifier: str) -> None:
         if not identifier:
             identifier = "anonymous"
-        async with self._lock:
-            bucket = self._buckets.get(identifier)
-            if bucket is None:
-                bucket = TokenBucket(self.rate_per_minute)
-                self._buckets[identifier] = bucket
-            if not bucket.consume():
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Rate limit exceeded. Please retry shortly.",
-                )
+        if requests > self.rate_per_minute:
+            # Token and energy estimates may run a bucket into debt, but the request count
+            # is always paid in full, so a batch can never outrun the per-minute limit.
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=(
+                    f"{requests:g} requests exceed the limit of {self.rate_per_minute} per "
+                    "minute. Split the batch."
+                ),
+            )
+        amounts = self._amounts(requests, tokens, joules)
+        wait = await self.backend.take(identifier, self._limits, amounts)
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Please retry shortly.",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+        return Reservation(identifier, tokens, joules, requests)
+
+    async def settle(self, reservation: Reservation, *, tokens: float, joules: float) -> None:
+        """Replace a reservation's estimate with what the call actually used."""
+
+        if not self.meters_usage:
+            return
+        amounts = self._amounts(0.0, tokens - reservation.tokens, joules - reservation.joules)
+        await self.backend.adjust(reservation.identifier, self._limits, amounts)
+        reservation.tokens = tokens
+        reservation.joules = joules
+
+    async def refund(self, reservation: Reservation) -> None:
+        """Give back everything `reservation` charged, requests included."""
+
+        amounts = self._amounts(-reservation.requests, -reservation.tokens, -reservation.joules)
+        await self.backend.adjust(reservation.identifier, self._limits, amounts)
+        reservation.requests = reservation.tokens = reservation.joules = 0.0
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    def _amounts(self, requests: float, tokens: float, joules: float) -> tuple[float, ...]:
+        amounts = [requests]
+        if self.tokens_per_minute > 0:
+            amounts.append(float(tokens))
+        if self.joules_per_minute > 0:
+            amounts.append(float(joules))
+        return tuple(amounts)
 
 
 rate_limiter: RateLimiter | None = None
 
 
-def configure_rate_limiter(rate_per_minute: int) -> RateLimiter:
+def configure_rate_limiter(
+    rate_per_minute: int,
+    *,
+    tokens_per_minute: int = 0,
+    joules_per_minute: float = 0.0,
+    backend: RateLimitBackend | None = None,
+) -> RateLimiter:
     global rate_limiter
-    rate_limiter = RateLimiter(rate_per_minute)
+    rate_limiter = RateLimiter(
+        rate_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        joules_per_minute=joules_per_minute,
+        backend=backend,
+    )
     return rate_limiter
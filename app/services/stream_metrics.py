@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import time
+
+from app.services.observability import (
+    model_label,
+    record_stream_complete,
+    record_stream_first_byte,
+    record_stream_first_token,
+    record_stream_gap,
+)
+
+
+class StreamTimer:
+    """Latency profile of one streamed response, as the client receives it.
+
+    All times are measured from `started`, when the request was dispatched upstream:
+    first byte, first content token, the gap between consecutive writes, total
+    duration and the generation rate after the first token.
+    """
+
+    __slots__ = ("provider", "model", "started", "first_byte_at", "first_token_at", "last_at")
+
+    def __init__(self, *, provider: str, model: str, started: float) -> None:
+        self.provider = provider
+        self.model = model_label(model)
+        self.started = started
+        self.first_byte_at: float | None = None
+        self.first_token_at: float | None = None
+        self.last_at: float | None = None
+
+    def chunk(self, now: float, *, has_content: bool) -> None:
+        """Account for a write sent at `now`; `has_content` once any text has streamed."""
+
+        if self.last_at is None:
+            self.first_byte_at = now
+            record_stream_first_byte(
+                provider=self.provider, model=self.model, seconds=now - self.started
+            )
+        else:
+            record_stream_gap(provider=self.provider, model=self.model, seconds=now - self.last_at)
+        if has_content and self.first_token_at is None:
+            self.first_token_at = now
+            record_stream_first_token(
+                provider=self.provider, model=self.model, seconds=now - self.started
+            )
+        self.last_at = now
+
+    def finish(self, completion_tokens: int, now: float | None = None) -> None:
+        now = time.perf_counter() if now is None else now
+        tokens_per_second = None
+        if self.first_token_at is not None and self.last_at is not None:
+            generating = self.last_at - self.first_token_at
+            if generating > 0 and completion_tokens > 1:
+                # The first token's arrival is TTFT; the rate covers the ones after it.
+                tokens_per_second = (completion_tokens - 1) / generating
+        record_stream_complete(
+            provider=self.provider,
+            model=self.model,
+            seconds=now - self.started,
+            tokens_per_second=tokens_per_second,
+        )
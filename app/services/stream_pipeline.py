@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator
+
+from app.core.config import settings
+from app.services.observability import record_stream_chunk, record_stream_stall
+
+_EVENT_END = b"\n\n"
+
+
+def _event_boundary(buffer: bytearray) -> int:
+    """Length of the prefix of `buffer` made of complete SSE events (0 if none)."""
+
+    end = buffer.rfind(_EVENT_END)
+    return end + len(_EVENT_END) if end >= 0 else 0
+
+
+async def coalesce_stream(
+    source: AsyncIterator[bytes],
+    *,
+    provider: str,
+    max_buffer_bytes: int | None = None,
+    flush_bytes: int | None = None,
+    flush_interval: float | None = None,
+) -> AsyncIterator[bytes]:
+    """Relay `source` in fewer, larger writes with a bounded read-ahead buffer.
+
+    A background task reads upstream into a buffer of at most `max_buffer_bytes` (plus one
+    chunk) and stops reading while it is full, so a lagging client pushes back on the
+    provider instead of growing memory. Writes are cut on SSE event boundaries once
+    `flush_bytes` are ready or `flush_interval` seconds have passed; the first event is
+    sent immediately. Closing the returned generator cancels the read and closes `source`.
+    """
+
+    if max_buffer_bytes is None:
+        max_buffer_bytes = settings.STREAMING_MAX_BUFFER_KB * 1024
+    if flush_bytes is None:
+        flush_bytes = settings.STREAMING_FLUSH_BYTES
+    if flush_interval is None:
+        flush_interval = settings.STREAMING_FLUSH_INTERVAL_MS / 1000
+    flush_bytes = min(flush_bytes, max_buffer_bytes)
+
+    buffer = bytearray()
+    changed = asyncio.Condition()
+    finished = False
+    error: BaseException | None = None
+
+    async def produce() -> None:
+        nonlocal finished, error
+        try:
+            async for chunk in source:
+                async with changed:
+                    if len(buffer) >= max_buffer_bytes:
+                        stalled = time.perf_counter()
+                        await changed.wait_for(lambda: len(buffer) < max_buffer_bytes)
+                        record_stream_stall(
+                            provider=provider, seconds=time.perf_counter() - stalled
+                        )
+                    buffer.extend(chunk)
+                    changed.notify_all()
+        except Exception as exc:
+            error = exc
+        finally:
+            async with changed:
+                finished = True
+                changed.notify_all()
+
+    def writable() -> bool:
+        return finished or len(buffer) >= max_buffer_bytes or _event_boundary(buffer) > 0
+
+    producer = asyncio.create_task(produce())
+    first = True
+    try:
+        while True:
+            async with changed:
+                await changed.wait_for(writable)
+                if not first and not finished and len(buffer) < flush_bytes and flush_interval:
+                    with contextlib.suppress(TimeoutError):
+                        async with asyncio.timeout(flush_interval):
+                            await changed.wait_for(lambda: finished or len(buffer) >= flush_bytes)
+                end = _event_boundary(buffer)
+                if finished or (end == 0 and len(buffer) >= max_buffer_bytes):
+                    # Flush everything at end of stream, or split an event that alone
+                    # exceeds the buffer rather than stall forever.
+                    end = len(buffer)
+                out = bytes(buffer[:end])
+                del buffer[:end]
+                changed.notify_all()
+                done = finished
+            if out:
+                first = False
+                record_stream_chunk(provider=provider, size=len(out))
+                yield out
+            if done:
+                break
+        if error is not None:
+            raise error
+    finally:
+        producer.cancel()
+        await asyncio.wait((producer,))
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
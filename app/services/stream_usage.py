@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from typing import Any
+
+from app.core import json_codec
+from app.providers.sse import SSEDecoder
+
+# A usage-only chunk is the one chunk with an empty `choices` list.
+_EMPTY_CHOICES = (b'"choices":[]', b'"choices": []')
+
+
+def _int(value: Any) -> int | None:
+    return int(value) if isinstance(value, int | float) and value >= 0 else None
+
+
+def drop_usage_chunks(data: bytes) -> bytes:
+    """Remove usage-only chunks from `data`, a run of whole SSE events.
+
+    For streams where the gateway asked upstream for usage on its own behalf; a byte
+    search keeps ordinary content chunks away from the JSON parser.
+    """
+
+    if not any(marker in data for marker in _EMPTY_CHOICES):
+        return data
+    return b"\n\n".join(event for event in data.split(b"\n\n") if not _usage_only(event))
+
+
+def _usage_only(event: bytes) -> bool:
+    decoder = SSEDecoder()
+    for payload in decoder.feed(event) + decoder.finish():
+        try:
+            chunk = json_codec.loads(payload)
+        except ValueError:
+            continue
+        if isinstance(chunk, dict) and chunk.get("choices") == [] and chunk.get("usage"):
+            return True
+    return False
+
+
+class StreamUsageTracker:
+    """Reads token usage off a streamed completion as it passes through the gateway.
+
+    Every provider stream reaches the client in OpenAI chunk format (vendor streams are
+    transcoded first), so the final usage chunk is preferred. Text deltas are kept so
+    completion tokens can still be counted once the stream ends when no usage arrives.
+    """
+
+    def __init__(self) -> None:
+        self._decoder = SSEDecoder()
+        self._text: list[str] = []
+        self.prompt_tokens: int | None = None
+        self.completion_tokens: int | None = None
+
+    def feed(self, chunk: bytes) -> None:
+        self._consume(self._decoder.feed(chunk))
+
+    def finish(self) -> None:
+        self._consume(self._decoder.finish())
+
+    @property
+    def has_content(self) -> bool:
+        return bool(self._text)
+
+    @property
+    def completion_text(self) -> str:
+        return "".join(self._text)
+
+    def _consume(self, payloads: list[bytes]) -> None:
+        for payload in payloads:
+            if payload == b"[DONE]":
+                continue
+            try:
+                event = json_codec.loads(payload)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                self._event(event)
+
+    def take_usage(self, usage: dict) -> None:
+        self.prompt_tokens = _int(usage.get("prompt_tokens"))
+        self.completion_tokens = _int(usage.get("completion_tokens"))
+
+    def _event(self, event: dict) -> None:
+        usage = event.get("usage")
+        if isinstance(usage, dict):
+            self.take_usage(usage)
+        for choice in event.get("choices") or ():
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                self._text.append(content)
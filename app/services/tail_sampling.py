@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.trace import StatusCode
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """Holds each trace's spans until its local root ends, then exports or drops them all.
+
+    Traces with an error status anywhere or a root slower than `latency_seconds` are
+    always kept; the rest are kept when their trace id falls under `ratio`, so services
+    sampling at the same ratio keep the same traces. At most `max_traces` unfinished
+    traces are buffered (the oldest is dropped beyond that), and spans ending after
+    their trace was decided follow that decision.
+    """
+
+    def __init__(
+        self,
+        processor: SpanProcessor,
+        *,
+        ratio: float,
+        latency_seconds: float,
+        max_traces: int,
+    ) -> None:
+        self.processor = processor
+        self.latency_ns = int(latency_seconds * 1e9)
+        self.max_traces = max_traces
+        self._bound = round(ratio * (1 << 64))
+        self._pending: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._decided: OrderedDict[int, bool] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Context | None = None) -> None:
+        self.processor.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        with self._lock:
+            keep = self._decided.get(trace_id)
+            if keep is not None:
+                spans = [span]
+            else:
+                spans = self._pending.setdefault(trace_id, [])
+                spans.append(span)
+                if span.parent is not None and not span.parent.is_remote:
+                    if len(self._pending) > self.max_traces:
+                        self._pending.popitem(last=False)
+                    return
+                del self._pending[trace_id]
+                keep = self._keep(trace_id, span, spans)
+                self._decided[trace_id] = keep
+                if len(self._decided) > self.max_traces:
+                    self._decided.popitem(last=False)
+        if keep:
+            for finished in spans:
+                self.processor.on_end(finished)
+
+    def _keep(self, trace_id: int, root: ReadableSpan, spans: list[ReadableSpan]) -> bool:
+        if any(finished.status.status_code is StatusCode.ERROR for finished in spans):
+            return True
+        if (root.end_time or 0) - (root.start_time or 0) >= self.latency_ns:
+            return True
+        return trace_id & 0xFFFFFFFFFFFFFFFF < self._bound
+
+    def shutdown(self) -> None:
+        self.processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.processor.force_flush(timeout_millis)
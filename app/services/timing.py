@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from contextvars import ContextVar
+from time import perf_counter
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.services.observability import record_stage_durations
+
+
+class RequestTimer:
+    """Seconds spent in each named stage of one request."""
+
+    __slots__ = ("started", "stages")
+
+    def __init__(self) -> None:
+        self.started = perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Render the stages (and the time so far as `total`) for a `Server-Timing` header."""
+
+        total = perf_counter() - self.started
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+_current_timer: ContextVar[RequestTimer | None] = ContextVar("request_timer", default=None)
+
+
+class stage:  # noqa: N801 - a lowercase context manager, like `contextlib.suppress`
+    """Add the time spent in a `with stage(...)` block to the current request's timer."""
+
+    __slots__ = ("name", "timer", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.timer = _current_timer.get()
+        self.started = perf_counter()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self.timer is not None:
+            # RequestTimer.add inlined: this runs for every stage of every request.
+            stages = self.timer.stages
+            stages[self.name] = stages.get(self.name, 0.0) + (perf_counter() - self.started)
+
+
+def current_timer() -> RequestTimer | None:
+    return _current_timer.get()
+
+
+class ServerTimingMiddleware:
+    """Times each HTTP request's stages, reports them in `Server-Timing` and Prometheus.
+
+    The header carries the stages finished before the response starts; stages that run
+    while a body is still streaming (e.g. the final ledger write) only reach the
+    histogram, which is updated once the response is complete.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+
+        async def send_with_timing(message: Message) -> None:
+            if (
+                message["type"] == "http.response.start"
+                and timer.stages
+                and settings.SERVER_TIMING_ENABLED
+            ):
+                MutableHeaders(scope=message).append("Server-Timing", timer.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timer.reset(token)
+            if timer.stages:
+                record_stage_durations(timer.stages)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import tiktoken
+
+from app.core.config import settings
+from app.services.tracing import span
+
+logger = logging.getLogger("greengate.tokens")
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=1024)
+def _encoding_name(model: str) -> str:
+    """tiktoken's encoding for `model`, or the default for models it does not know."""
+
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        return DEFAULT_ENCODING
+
+
+class TokenCounter:
+    """Counts tokens with cached encoders, a per-message memo and off-loop encoding.
+
+    Each message's count is memoized by content hash, so a multi-turn conversation only
+    encodes the turns it has not seen before. Uncached input of at least
+    `offload_chars` characters is encoded on a dedicated thread pool instead of the
+    event loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        offload_chars: int | None = None,
+        memo_size: int | None = None,
+        workers: int | None = None,
+    ) -> None:
+        self.offload_chars = (
+            settings.TOKEN_COUNT_OFFLOAD_CHARS if offload_chars is None else offload_chars
+        )
+        self.memo_size = settings.TOKEN_COUNT_MEMO_SIZE if memo_size is None else memo_size
+        self._workers = settings.TOKEN_COUNT_WORKERS if workers is None else workers
+        # Keyed by encoding name: clients choose the model string, not the encodings.
+        self._encoders: dict[str, tiktoken.Encoding] = {}
+        self._memo: OrderedDict[tuple[str, bytes], int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def encoding(self, model: str) -> tiktoken.Encoding:
+        name = _encoding_name(model)
+        encoder = self._encoders.get(name)
+        if encoder is None:
+            encoder = self._encoders[name] = tiktoken.get_encoding(name)
+        return encoder
+
+    def preload(self, models: Iterable[str]) -> None:
+        """Load encoders ahead of the first request (tiktoken reads/downloads BPE files)."""
+
+        for model in (DEFAULT_ENCODING, *models):
+            try:
+                self.encoding(model)
+            except Exception as exc:  # pragma: no cover - network/filesystem dependent
+                logger.warning("Could not preload tokenizer for %s: %s", model, exc)
+
+    async def count(self, text: str, model: str, *, memoize: bool = True) -> int:
+        return await self.count_messages((text,), model, memoize=memoize)
+
+    async def count_messages(
+        self, texts: Iterable[str], model: str, *, memoize: bool = True
+    ) -> int:
+        """Sum the token counts of `texts`, encoding only those not already memoized."""
+
+        with span("greengate.tokens.count", {"greengate.model": model}) as current:
+            total = await self._count_messages(texts, model, memoize)
+            current.set_attribute("greengate.tokens.count", total)
+            return total
+
+    async def _count_messages(self, texts: Iterable[str], model: str, memoize: bool) -> int:
+        encoder = self.encoding(model)
+        total = 0
+        pending: list[tuple[tuple[str, bytes] | None, str]] = []
+        pending_chars = 0
+        for text in texts:
+            if not text:
+                continue
+            key = self._key(encoder, text) if memoize else None
+            cached = self._lookup(key) if key is not None else None
+            if cached is None:
+                pending.append((key, text))
+                pending_chars += len(text)
+            else:
+                total += cached
+        if not pending:
+            return total
+        if pending_chars >= self.offload_chars:
+            loop = asyncio.get_running_loop()
+            total += await loop.run_in_executor(self._pool(), self._encode_all, encoder, pending)
+        else:
+            total += self._encode_all(encoder, pending)
+        return total
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix="greengate-tokens"
+            )
+        return self._executor
+
+    @staticmethod
+    def _key(encoder: tiktoken.Encoding, text: str) -> tuple[str, bytes]:
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        return encoder.name, digest
+
+    def _lookup(self, key: tuple[str, bytes]) -> int | None:
+        with self._lock:
+            count = self._memo.get(key)
+            if count is not None:
+                self._memo.move_to_end(key)
+            return count
+
+    def _encode_all(
+        self,
+        encoder: tiktoken.Encoding,
+        pending: list[tuple[tuple[str, bytes] | None, str]],
+    ) -> int:
+        total = 0
+        for key, text in pending:
+            count = len(encoder.encode_ordinary(text))
+            total += count
+            if key is not None and self.memo_size:
+                with self._lock:
+                    self._memo[key] = count
+                    if len(self._memo) > self.memo_size:
+                        self._memo.popitem(last=False)
+        return total
+
+
+token_counter = TokenCounter()
@@ -1,25 +1,51 @@
 from __future__ import annotations
 
+from contextlib import AbstractContextManager, nullcontext
+from typing import TYPE_CHECKING
+
 from fastapi import FastAPI
 from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.util.types import AttributeValue
 
 from app.core.config import settings
 
+if TYPE_CHECKING:
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+    from opentelemetry.sdk.trace import TracerProvider
+
+# The SDK, exporter and instrumentations are imported by `configure_tracing` only, so
+# importing the app does not pay for them while tracing is disabled.
 _tracer_provider: TracerProvider | None = None
+_tracer: trace.Tracer | None = None
 _httpx_instrumentor: HTTPXClientInstrumentor | None = None
+# Returned by `span` while tracing is off: entering it yields a span that ignores writes.
+_NO_SPAN = nullcontext(trace.INVALID_SPAN)
+
+
+def span(
+    name: str, attributes: dict[str, AttributeValue] | None = None
+) -> AbstractContextManager[trace.Span]:
+    """Start a child of the current span; a shared no-op while tracing is disabled."""
+
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.start_as_current_span(name, attributes=attributes)
 
 
 def configure_tracing(app: FastAPI) -> None:
-    global _tracer_provider, _httpx_instrumentor
+    global _tracer_provider, _tracer, _httpx_instrumentor
     if _tracer_provider is not None or not settings.OTEL_ENABLED:
         return
 
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    from app.services.tail_sampling import TailSamplingProcessor
+
     resource = Resource.create(
         {
             "service.name": settings.PROJECT_NAME,
@@ -33,19 +59,31 @@ def configure_tracing(app: FastAPI) -> None:
         headers=settings.otel_headers(),
     )
     provider = TracerProvider(resource=resource)
-    provider.add_span_processor(BatchSpanProcessor(exporter))
+    provider.add_span_processor(
+        TailSamplingProcessor(
+            BatchSpanProcessor(exporter),
+            ratio=settings.OTEL_SAMPLE_RATIO,
+            latency_seconds=settings.OTEL_TAIL_LATENCY_MS / 1000,
+            max_traces=settings.OTEL_TAIL_MAX_TRACES,
+        )
+    )
     trace.set_tracer_provider(provider)
 
-    FastAPIInstrumentor.instrument_app(app)
+    # Per-message ASGI send/receive spans would outnumber everything else on streams.
+    FastAPIInstrumentor.instrument_app(
+        app, excluded_urls="/healthz,/metrics", exclude_spans=["receive", "send"]
+    )
     _httpx_instrumentor = HTTPXClientInstrumentor()
     _httpx_instrumentor.instrument()
     _tracer_provider = provider
+    _tracer = provider.get_tracer("greengate")
 
 
 def shutdown_tracing() -> None:
-    global _tracer_provider, _httpx_instrumentor
+    global _tracer_provider, _tracer, _httpx_instrumentor
     if _tracer_provider is None:
         return
+    _tracer = None
     if _httpx_instrumentor is not None:
         _httpx_instrumentor.uninstrument()
         _httpx_instrumentor = None
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger("greengate.warmup")
+
+
+class WarmUp:
+    """Start-up work run in the background, so a worker accepts connections immediately.
+
+    Each component is `warming` until its task finishes, then `ready`, or `failed` when
+    it raised (the gateway still works, only the first request pays the cost instead).
+    `/healthz` reports not-ready until nothing is `warming`.
+    """
+
+    def __init__(self) -> None:
+        self.components: dict[str, str] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    @property
+    def ready(self) -> bool:
+        return "warming" not in self.components.values()
+
+    def start(self, name: str, warm: Callable[[], Awaitable[object]]) -> None:
+        self.components[name] = "warming"
+        self._tasks[name] = asyncio.create_task(self._run(name, warm))
+
+    async def stop(self) -> None:
+        tasks, self._tasks = list(self._tasks.values()), {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.components.clear()
+
+    async def _run(self, name: str, warm: Callable[[], Awaitable[object]]) -> None:
+        started = time.perf_counter()
+        try:
+            await warm()
+        except Exception:
+            logger.warning("Warm-up of %s failed", name, exc_info=True)
+            self.components[name] = "failed"
+        else:
+            logger.info("Warmed up %s in %.2fs", name, time.perf_counter() - started)
+            self.components[name] = "ready"
+
+
+warmup = WarmUp()
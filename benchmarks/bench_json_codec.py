@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Compare per-request JSON CPU cost across codec backends on typical completions.
+
+One simulated request does the JSON work a cache miss pays in the gateway: decode the
+provider body, encode the cache metadata, decode it again on a later hit and render the
+client response.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core import json_codec  # noqa: E402
+
+
+def build_completion(size_bytes: int) -> dict:
+    sentence = "Reducing idle compute is the cheapest way to cut an API's carbon footprint. "
+    content = (sentence * (size_bytes // len(sentence) + 1))[:size_bytes]
+    return {
+        "id": "chatcmpl-9f2c1d",
+        "object": "chat.completion",
+        "created": 1718000000,
+        "model": "gpt-4o-mini",
+        "system_fingerprint": "fp_44709d6fcb",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "logprobs": None,
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 412, "completion_tokens": size_bytes // 4, "total_tokens": 0},
+    }
+
+
+def run(backend: str, body: bytes, number: int) -> float:
+    _, dumps, loads = json_codec.load_backend(backend)
+
+    def request() -> None:
+        parsed = loads(body)
+        stored = dumps(parsed).decode("utf-8")
+        dumps(loads(stored))
+
+    seconds = timeit.timeit(request, number=number)
+    return seconds / number * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000, help="Iterations per measurement")
+    parser.add_argument(
+        "--sizes",
+        default="2048,4096,8192",
+        help="Comma-separated completion sizes in bytes (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    backends = [
+        name for name in ("json", "orjson", "msgspec") if json_codec.load_backend(name)[0] == name
+    ]
+    print(f"active backend: {json_codec.BACKEND}")
+    print(f"{'size':>8} " + " ".join(f"{name:>12}" for name in backends) + "   (us/request)")
+    for size in (int(value) for value in args.sizes.split(",")):
+        body = json_codec.load_backend("json")[1](build_completion(size))
+        timings = [run(name, body, args.number) for name in backends]
+        row = " ".join(f"{value:12.2f}" for value in timings)
+        speedup = timings[0] / min(timings)
+        print(f"{len(body):>8} {row}   x{speedup:.1f} vs stdlib")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
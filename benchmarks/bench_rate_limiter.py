@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Measure rate-limiter throughput, memory and per-check cost for each bucket backend.
+
+The first table sends each check from a different identifier, the worst case for the
+in-memory table: every call allocates a bucket and the LRU cap has to keep evicting.
+The second reports the hot-path cost of one check per backend for a steady set of
+callers; pass --redis-url to include a Redis-protocol server.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.rate_limit_backends import (  # noqa: E402
+    MemoryBackend,
+    RateLimitBackend,
+    RedisBackend,
+    SharedMemoryBackend,
+)
+from app.services.rate_limiter import RateLimiter  # noqa: E402
+
+
+async def fill(limiter: RateLimiter, identifiers: list[str]) -> float:
+    started = time.perf_counter()
+    for identifier in identifiers:
+        await limiter.check(identifier)
+    return time.perf_counter() - started
+
+
+def run_distinct(identifiers: list[str], max_buckets: int) -> tuple[float, int, int]:
+    backend = MemoryBackend(max_buckets=max_buckets)
+    elapsed = asyncio.run(fill(RateLimiter(rate_per_minute=120, backend=backend), identifiers))
+    # Memory is measured on a second pass; tracing allocations skews the timing.
+    backend = MemoryBackend(max_buckets=max_buckets)
+    tracemalloc.start()
+    asyncio.run(fill(RateLimiter(rate_per_minute=120, backend=backend), identifiers))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(identifiers) / elapsed, len(backend), peak
+
+
+def run_hot_path(backend: RateLimitBackend, callers: int, checks: int) -> float:
+    identifiers = [f"caller-{i}" for i in range(callers)]
+    # A high limit keeps every check on the admit path, which is what callers pay.
+    limiter = RateLimiter(rate_per_minute=10**9, tokens_per_minute=10**12, backend=backend)
+
+    async def measure() -> float:
+        await fill(limiter, identifiers)
+        started = time.perf_counter()
+        for index in range(checks):
+            await limiter.check(identifiers[index % callers], tokens=500)
+        elapsed = time.perf_counter() - started
+        await limiter.close()
+        return elapsed
+
+    return asyncio.run(measure()) / checks * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--callers", type=int, default=1_000_000, help="Distinct identifiers")
+    parser.add_argument(
+        "--max-buckets",
+        default="10000,100000,1000000",
+        help="Comma-separated bucket caps to compare (default: %(default)s)",
+    )
+    parser.add_argument("--checks", type=int, default=200_000, help="Hot-path checks per backend")
+    parser.add_argument("--redis-url", help="Also measure a Redis-protocol server at this URL")
+    args = parser.parse_args()
+
+    identifiers = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{i}" for i in range(args.callers)]
+    print(f"{'max_buckets':>12} {'checks/s':>12} {'resident':>10} {'peak MiB':>10}")
+    for cap in (int(value) for value in args.max_buckets.split(",")):
+        rate, resident, peak = run_distinct(identifiers, cap)
+        print(f"{cap:>12} {rate:>12,.0f} {resident:>10} {peak / 2**20:>10.1f}")
+
+    print(f"\n{'backend':>12} {'us/check':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        backends: dict[str, RateLimitBackend] = {
+            "memory": MemoryBackend(),
+            "shared": SharedMemoryBackend(Path(directory) / "ratelimit.bin"),
+        }
+        if args.redis_url:
+            backends["redis"] = RedisBackend(args.redis_url, timeout=1.0)
+        for name, backend in backends.items():
+            checks = args.checks if name != "redis" else min(args.checks, 20_000)
+            print(f"{name:>12} {run_hot_path(backend, 10_000, checks):>12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Measure the per-stage cost of request timing instrumentation.
+
+Reports the overhead of one `with stage(...)` block with a request timer active (the
+normal case) and without one (code called outside a request), against an empty block.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.timing import RequestTimer, _current_timer, stage  # noqa: E402
+
+
+def empty() -> None:
+    pass
+
+
+def timed() -> None:
+    with stage("cache_lookup"):
+        pass
+
+
+def per_call_ns(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200_000, help="Blocks per measurement")
+    args = parser.parse_args()
+
+    baseline = per_call_ns(empty, args.number)
+    without_timer = per_call_ns(timed, args.number) - baseline
+    token = _current_timer.set(RequestTimer())
+    try:
+        with_timer = per_call_ns(timed, args.number) - baseline
+    finally:
+        _current_timer.reset(token)
+    print(f"{'stage (timer active)':>24} {with_timer:8.0f} ns")
+    print(f"{'stage (no timer)':>24} {without_timer:8.0f} ns")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
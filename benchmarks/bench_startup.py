@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Measure gateway import time and time to the first served chat completion, with budgets.
+
+Every measurement uses a fresh interpreter. Import time is the cumulative time
+`python -X importtime` reports for `app.main`, with the heaviest packages listed.
+Startup runs uvicorn on a free port with an empty data directory and records when it
+first answers any request (listening), when `/healthz` first returns 200 (warm-up
+finished) and when the first `/v1/chat/completions` sent after that returns 200. The
+OpenAI provider points at a local stub that answers instantly, so that last step
+measures the gateway's own first-request path (cache, tokenizer, ledger, HTTP client),
+not a vendor. The process exits with status 1 when a median exceeds its budget, so CI
+can use it as a regression check.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODEL = "gpt-4o-mini"
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "model": MODEL,
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "Ready."},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 2, "total_tokens": 14},
+}
+
+
+class StubProvider(BaseHTTPRequestHandler):
+    """Answers every POST like OpenAI's chat completions endpoint, instantly."""
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        body = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@contextmanager
+def stub_provider() -> Iterator[str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubProvider)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def child_env(data_dir: str, provider_url: str) -> dict[str, str]:
+    env = dict(os.environ)
+    # Only the stubbed OpenAI provider is configured, and no gateway key is required.
+    for name in (
+        "ANTHROPIC_API_KEY",
+        "COHERE_API_KEY",
+        "AZURE_OPENAI_API_KEY",
+        "GATEWAY_API_KEY",
+    ):
+        env.pop(name, None)
+    env["OPENAI_API_KEY"] = "bench-key"
+    env["OPENAI_API_BASE"] = provider_url
+    # Keep the repository's data/ untouched.
+    env["DATA_DIR"] = data_dir
+    return env
+
+
+def measure_import(env: dict[str, str]) -> tuple[float, Counter[str]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    per_package: Counter[str] = Counter()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, self_us, cumulative_us, name = (
+            part.strip() for part in line.replace(":", "|", 1).split("|")
+        )
+        if not self_us.isdigit():
+            continue
+        per_package[name.split(".")[0]] += int(self_us)
+        if name == "app.main":
+            total = int(cumulative_us) / 1000
+    return total, per_package
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def first_completion(base_url: str) -> None:
+    request = urllib.request.Request(
+        f"{base_url}/v1/chat/completions",
+        data=json.dumps(
+            {"model": MODEL, "messages": [{"role": "user", "content": "Are you up?"}]}
+        ).encode(),
+        headers={"content-type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+    except urllib.error.HTTPError as exc:
+        raise RuntimeError(
+            f"first chat completion failed: {exc.code} {exc.read()[:200]!r}"
+        ) from None
+
+
+def measure_startup(env: dict[str, str], timeout: float) -> tuple[float, float, float]:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    url = f"{base_url}/healthz"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    listening = None
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    status = response.status
+            except urllib.error.HTTPError as exc:
+                status = exc.code
+            except OSError:
+                time.sleep(0.01)
+                continue
+            now = time.perf_counter() - started
+            listening = now if listening is None else listening
+            if status == 200:
+                first_completion(base_url)
+                return listening, now, time.perf_counter() - started
+            time.sleep(0.01)
+        raise TimeoutError(f"/healthz did not return 200 within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--import-budget-ms", type=float, default=1500.0)
+    parser.add_argument(
+        "--ready-budget-s",
+        type=float,
+        default=10.0,
+        help="Budget for the first chat completion after start (default: %(default)s)",
+    )
+    parser.add_argument("--timeout", type=float, default=120.0, help="Give up on one start")
+    args = parser.parse_args()
+
+    imports, packages, starts = [], Counter(), []
+    with stub_provider() as provider_url:
+        with tempfile.TemporaryDirectory() as data_dir:
+            env = child_env(data_dir, provider_url)
+            for _ in range(args.runs):
+                total, per_package = measure_import(env)
+                imports.append(total)
+                packages.update(per_package)
+        for _ in range(args.runs):
+            # A fresh data directory each time, so no start finds the last one's cache.
+            with tempfile.TemporaryDirectory() as data_dir:
+                starts.append(measure_startup(child_env(data_dir, provider_url), args.timeout))
+
+    import_ms = statistics.median(imports)
+    listening_s = statistics.median(start[0] for start in starts)
+    healthy_s = statistics.median(start[1] for start in starts)
+    ready_s = statistics.median(start[2] for start in starts)
+    first_ms = statistics.median((start[2] - start[1]) * 1000 for start in starts)
+    print(f"{'import app.main':<22} {import_ms:>9.0f} ms   (budget {args.import_budget_ms:.0f} ms)")
+    print(f"{'listening':<22} {listening_s:>9.2f} s")
+    print(f"{'first /healthz 200':<22} {healthy_s:>9.2f} s")
+    print(f"{'first completion 200':<22} {ready_s:>9.2f} s    (budget {args.ready_budget_s:.1f} s)")
+    print(f"{'  of which the request':<22} {first_ms:>9.0f} ms")
+    print("\nheaviest packages (self time, median run):")
+    for package, micros in packages.most_common(8):
+        print(f"  {package:<20} {micros / args.runs / 1000:>7.1f} ms")
+
+    over_budget = import_ms > args.import_budget_ms or ready_s > args.ready_budget_s
+    if over_budget:
+        print("\nOVER BUDGET", file=sys.stderr)
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Measure streaming transcoder throughput (upstream chunks per second) per vendor format.
+
+A synthetic vendor stream is cut into fixed-size TCP-like chunks that split events at
+arbitrary offsets, then fed through the transcoder the providers use.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core import json_codec  # noqa: E402
+from app.providers.transcoding import (  # noqa: E402
+    AnthropicStreamTranscoder,
+    CohereStreamTranscoder,
+    StreamTranscoder,
+)
+
+WORDS = "Cutting idle compute is the cheapest way to lower an API's carbon footprint ".split()
+
+
+def anthropic_stream(deltas: int) -> bytes:
+    events = [
+        b'event: message_start\ndata: {"type":"message_start","message":{"id":"msg_1",'
+        b'"usage":{"input_tokens":412,"output_tokens":1}}}\n\n'
+    ]
+    for index in range(deltas):
+        event = {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "text_delta", "text": WORDS[index % len(WORDS)] + " "},
+        }
+        events.append(b"event: content_block_delta\ndata: " + json_codec.dumps(event) + b"\n\n")
+    events.append(
+        b'event: message_delta\ndata: {"type":"message_delta","delta":{"stop_reason":'
+        b'"end_turn"},"usage":{"output_tokens":%d}}\n\n' % deltas
+    )
+    events.append(b'event: message_stop\ndata: {"type":"message_stop"}\n\n')
+    return b"".join(events)
+
+
+def cohere_stream(deltas: int) -> bytes:
+    events = [b'event: message-start\ndata: {"type":"message-start","id":"c1"}\n\n']
+    for index in range(deltas):
+        event = {
+            "type": "content-delta",
+            "index": 0,
+            "delta": {"message": {"content": {"text": WORDS[index % len(WORDS)] + " "}}},
+        }
+        events.append(b"event: content-delta\ndata: " + json_codec.dumps(event) + b"\n\n")
+    events.append(
+        b'event: message-end\ndata: {"type":"message-end","delta":{"finish_reason":"COMPLETE",'
+        b'"usage":{"tokens":{"input_tokens":412,"output_tokens":%d}}}}\n\n' % deltas
+    )
+    return b"".join(events)
+
+
+def run(factory: type[StreamTranscoder], body: bytes, chunk_size: int, rounds: int) -> float:
+    chunks = [body[start : start + chunk_size] for start in range(0, len(body), chunk_size)]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        transcoder = factory("bench-model")
+        for chunk in chunks:
+            transcoder.feed(chunk)
+        transcoder.finish()
+    return len(chunks) * rounds / (time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--deltas", type=int, default=500, help="Text deltas per stream")
+    parser.add_argument("--rounds", type=int, default=200, help="Streams per measurement")
+    parser.add_argument(
+        "--chunk-sizes",
+        default="64,256,1024,4096",
+        help="Comma-separated upstream chunk sizes in bytes (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    streams = {
+        "anthropic": (AnthropicStreamTranscoder, anthropic_stream(args.deltas)),
+        "cohere": (CohereStreamTranscoder, cohere_stream(args.deltas)),
+    }
+    print(f"json backend: {json_codec.BACKEND}")
+    print(f"{'chunk':>8} " + " ".join(f"{name:>12}" for name in streams) + "   (chunks/s)")
+    for size in (int(value) for value in args.chunk_sizes.split(",")):
+        rates = [run(factory, body, size, args.rounds) for factory, body in streams.values()]
+        print(f"{size:>8} " + " ".join(f"{rate:12,.0f}" for rate in rates))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,3 +7,8 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("HTTP_PREWARM_ENABLED", "false")
+os.environ.setdefault("TOKENIZER_PRELOAD_ENABLED", "false")
+os.environ.setdefault("CACHE_WARMUP_ENABLED", "false")
+os.environ.setdefault("JOBS_ENABLED", "false")
+os.environ.setdefault("LOOP_MONITOR_ENABLED", "false")
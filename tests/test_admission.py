@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.services.admission import (
+    PRIORITY_CLASSES,
+    AdmissionController,
+    AdmissionMiddleware,
+    OverloadedError,
+    request_priority,
+)
+
+LOW, NORMAL, HIGH = (PRIORITY_CLASSES[name] for name in ("low", "normal", "high"))
+
+
+def _controller(**kwargs) -> AdmissionController:
+    return AdmissionController(
+        **{"max_concurrency": 1, "max_queue": 2, "queue_timeout": 5, **kwargs}
+    )
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_admitted_by_priority():
+    controller = _controller(max_queue=5)
+    await controller.acquire(NORMAL)
+    order: list[str] = []
+
+    async def wait(name: str, priority: int) -> None:
+        await controller.acquire(priority)
+        order.append(name)
+
+    tasks = [
+        asyncio.create_task(wait("low", LOW)),
+        asyncio.create_task(wait("high", HIGH)),
+        asyncio.create_task(wait("normal", NORMAL)),
+    ]
+    await asyncio.sleep(0)
+    assert controller.queued == 3
+
+    for _ in range(3):
+        controller.release()
+        await asyncio.sleep(0)
+    controller.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["high", "normal", "low"]
+    assert (controller.in_flight, controller.queued) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_lowest_priority_first():
+    controller = _controller()
+    await controller.acquire(NORMAL)
+    low = asyncio.create_task(controller.acquire(LOW))
+    normal = asyncio.create_task(controller.acquire(NORMAL))
+    await asyncio.sleep(0)
+
+    high = asyncio.create_task(controller.acquire(HIGH))
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError) as evicted:
+        await low
+    assert evicted.value.reason == "evicted"
+    assert evicted.value.retry_after >= 1
+
+    with pytest.raises(OverloadedError) as refused:
+        await controller.acquire(LOW)
+    assert refused.value.reason == "queue_full"
+
+    controller.release()
+    await high
+    assert not normal.done()
+    normal.cancel()
+
+
+@pytest.mark.asyncio
+async def test_wait_is_bounded_by_queue_timeout():
+    controller = _controller(queue_timeout=0.01)
+    await controller.acquire(NORMAL)
+
+    with pytest.raises(OverloadedError) as exc:
+        await controller.acquire(HIGH)
+
+    assert exc.value.reason == "timeout"
+    assert controller.queued == 0
+
+
+def test_priority_from_api_key_then_header(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_KEY_PRIORITIES", "batch-key=low,ops-key=critical")
+
+    assert request_priority(Headers({"x-api-key": "ops-key"})) == PRIORITY_CLASSES["critical"]
+    assert request_priority(Headers({"authorization": "Bearer batch-key"})) == LOW
+    assert request_priority(Headers({"x-greengate-priority": "critical"})) == HIGH
+    assert request_priority(Headers({"x-greengate-priority": "bogus"})) == NORMAL
+
+
+@pytest.mark.asyncio
+async def test_middleware_returns_503_with_retry_after():
+    release = asyncio.Event()
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def slow():
+        await release.wait()
+        return {"ok": True}
+
+    controller = _controller(max_queue=0)
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        first = asyncio.create_task(client.post("/v1/chat/completions"))
+        await asyncio.sleep(0.05)
+        shed = await client.post("/v1/chat/completions")
+        release.set()
+        ok = await first
+
+    assert shed.status_code == 503
+    assert int(shed.headers["Retry-After"]) >= 1
+    assert ok.status_code == 200
+    assert controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_middleware_refuses_missing_keys_before_queueing(monkeypatch):
+    monkeypatch.setattr(settings, "GATEWAY_API_KEY", "secret")
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions():
+        return {"ok": True}
+
+    controller = _controller(max_queue=0)
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    await controller.acquire(NORMAL)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        anonymous = await client.post("/v1/chat/completions")
+        wrong = await client.post("/v1/chat/completions", headers={"x-api-key": "guess"})
+        authorized = await client.post(
+            "/v1/chat/completions", headers={"authorization": "Bearer secret"}
+        )
+
+    assert anonymous.status_code == wrong.status_code == 401
+    assert anonymous.headers["WWW-Authenticate"] == "Bearer"
+    # Only the caller with the key reached the (full) queue.
+    assert authorized.status_code == 503
+    assert controller.in_flight == 1 and controller.queued == 0
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from app.core.provider_settings import ProviderSettings
+from app.providers.anthropic_provider import AnthropicProvider
+
+
+@pytest.mark.asyncio
+async def test_invoke_returns_openai_schema_with_usage():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/v1/messages"
+        return httpx.Response(
+            200,
+            json={
+                "id": "msg_01",
+                "type": "message",
+                "role": "assistant",
+                "model": "claude-3-haiku-20240307",
+                "content": [{"type": "text", "text": "Hello"}, {"type": "text", "text": "!"}],
+                "stop_reason": "max_tokens",
+                "usage": {"input_tokens": 12, "output_tokens": 6},
+            },
+        )
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        provider = AnthropicProvider(
+            ProviderSettings(
+                name="anthropic",
+                kind="anthropic",
+                api_key="key",
+                base_url="https://anthropic.local/v1",
+                supported_models=["claude-3-haiku"],
+            ),
+            client,
+        )
+        result = await provider.invoke(
+            {"model": "claude-3-haiku", "messages": [{"role": "user", "content": "Hi"}]}
+        )
+
+    assert result.response["object"] == "chat.completion"
+    assert result.response["model"] == "claude-3-haiku"
+    assert result.response["choices"][0]["message"] == {"role": "assistant", "content": "Hello!"}
+    assert result.response["choices"][0]["finish_reason"] == "length"
+    assert result.usage == {"prompt_tokens": 12, "completion_tokens": 6, "total_tokens": 18}
+
+
+def test_tool_calls_are_sent_as_tool_use_and_tool_result_blocks():
+    provider = AnthropicProvider(
+        ProviderSettings(
+            name="anthropic",
+            kind="anthropic",
+            api_key="key",
+            base_url="https://anthropic.local/v1",
+            supported_models=["claude-3-haiku"],
+        ),
+        httpx.AsyncClient(),
+    )
+    call = {
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "lookup", "arguments": '{"city": "Oslo"}'},
+    }
+    payload = provider._transform_payload(
+        {
+            "model": "claude-3-haiku",
+            "messages": [
+                {"role": "user", "content": "Weather?"},
+                {"role": "assistant", "content": None, "tool_calls": [call]},
+                {"role": "tool", "tool_call_id": "call_1", "content": "4C"},
+            ],
+        },
+        stream=False,
+    )
+
+    assert payload["messages"][1:] == [
+        {
+            "role": "assistant",
+            "content": [
+                {"type": "tool_use", "id": "call_1", "name": "lookup", "input": {"city": "Oslo"}}
+            ],
+        },
+        {
+            "role": "user",
+            "content": [{"type": "tool_result", "tool_use_id": "call_1", "content": "4C"}],
+        },
+    ]
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.dependencies import (
+    get_cache_service,
+    get_energy_ledger,
+    get_proxy_service,
+    get_rate_limiter,
+)
+from app.main import app
+from app.providers.base import ProviderResult
+from app.services.cache_service import CacheHit
+from app.services.rate_limiter import RateLimiter
+
+
+class BulkCache:
+    def __init__(self, hits: dict[str, CacheHit]) -> None:
+        self.hits = hits
+        self.lookups: list[list[str]] = []
+        self.saved: list[str] = []
+
+    async def get_cached_responses(self, prompts: list[str], *, scopes: list[str]):
+        assert len(scopes) == len(prompts)
+        self.lookups.append(prompts)
+        return [self.hits.get(prompt) for prompt in prompts]
+
+    async def save_response(self, prompt, response, **kwargs):  # noqa: ANN001 - stub
+        self.saved.append(prompt)
+
+
+class EchoProxy:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    async def forward_request(self, payload, stream=False, deadline=None, raw_body=None):
+        content = payload.messages[-1].content
+        self.calls.append(content)
+        if content == "fail":
+            raise HTTPException(status_code=502, detail="All providers failed")
+        return ProviderResult(
+            provider_name="openai",
+            response={"choices": [{"message": {"role": "assistant", "content": content}}]},
+            usage={"prompt_tokens": 3, "completion_tokens": 2},
+            energy_modifier=1.0,
+        )
+
+
+class BulkLedger:
+    def __init__(self) -> None:
+        self.batches: list[list[dict]] = []
+
+    async def record_many(self, entries: list[dict]) -> None:
+        self.batches.append(entries)
+
+
+class AllowAll:
+    meters_usage = False
+
+    async def check(self, identifier: str, *, requests: float = 1.0) -> None:
+        return None
+
+    async def settle(self, reservation, *, tokens, joules) -> None:  # noqa: ANN001 - stub
+        return None
+
+
+def _item(content: str, **extra) -> dict:
+    return {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": content}], **extra}
+
+
+@pytest.fixture
+def batch_client():
+    cache = BulkCache(
+        {
+            "user:cached": CacheHit(
+                response={"choices": [{"message": {"content": "from cache"}}]},
+                metadata={"provider": "anthropic", "energy_joules": "2.0"},
+                similarity=1.0,
+            )
+        }
+    )
+    proxy = EchoProxy()
+    ledger = BulkLedger()
+    app.dependency_overrides[get_cache_service] = lambda: cache
+    app.dependency_overrides[get_proxy_service] = lambda: proxy
+    app.dependency_overrides[get_energy_ledger] = lambda: ledger
+    app.dependency_overrides[get_rate_limiter] = lambda: AllowAll()
+    with TestClient(app) as client:
+        yield client, cache, proxy, ledger
+    app.dependency_overrides.clear()
+
+
+def test_batch_dedups_looks_up_once_and_streams_ndjson(batch_client):
+    client, cache, proxy, ledger = batch_client
+    requests = [
+        _item("a"),
+        _item("cached"),
+        _item("a", user="someone-else"),
+        _item("fail"),
+        _item("b", stream=True),
+    ]
+
+    resp = client.post("/v1/batch/chat/completions", json={"requests": requests})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = {line["index"]: line for line in map(json.loads, resp.text.splitlines())}
+    assert sorted(lines) == [0, 1, 2, 3, 4]
+    assert cache.lookups == [["user:a", "user:cached", "user:fail"]]
+    assert sorted(proxy.calls) == ["a", "fail"]
+
+    assert {lines[0]["cache"], lines[2]["cache"]} == {"miss", "dedup"}
+    assert lines[0]["response"] == lines[2]["response"]
+    assert lines[1]["cache"] == "hit"
+    assert lines[1]["response"]["choices"][0]["message"]["content"] == "from cache"
+    assert lines[3]["status"] == 502
+    assert lines[4]["status"] == 400
+
+    assert cache.saved == ["user:a"]
+    [entries] = ledger.batches
+    assert len(entries) == 3
+    assert sum(entry["saved"] for entry in entries) > 2.0
+
+
+def test_batch_size_is_capped(batch_client, monkeypatch):
+    from app.core.config import settings
+
+    client, *_ = batch_client
+    monkeypatch.setattr(settings, "BATCH_MAX_REQUESTS", 2)
+
+    resp = client.post(
+        "/v1/batch/chat/completions", json={"requests": [_item("a"), _item("b"), _item("c")]}
+    )
+
+    assert resp.status_code == 413
+
+
+def test_batch_charges_each_miss_to_its_own_caller(batch_client):
+    client, _, proxy, _ = batch_client
+    limiter = RateLimiter(rate_per_minute=2)
+    app.dependency_overrides[get_rate_limiter] = lambda: limiter
+
+    def post(*items: dict):
+        return client.post("/v1/batch/chat/completions", json={"requests": list(items)})
+
+    # Cache hits and copies of a request cost nothing extra.
+    first = post(_item("a", user="u1"), _item("a", user="u1"), _item("cached", user="u1"))
+    assert first.status_code == 200
+    assert post(_item("b", user="u1"), _item("c", user="u2")).status_code == 200
+    calls = len(proxy.calls)
+
+    # u1 has no request left: the batch is refused before anything goes upstream, and the
+    # charge already taken from u2 is given back.
+    refused = post(_item("d", user="u2"), _item("e", user="u1"))
+    assert refused.status_code == 429
+    assert "Retry-After" in refused.headers
+    assert len(proxy.calls) == calls
+    assert post(_item("f", user="u2")).status_code == 200
+
+
+def test_batch_with_more_misses_than_the_request_limit_is_refused(batch_client):
+    client, _, proxy, _ = batch_client
+    limiter = RateLimiter(rate_per_minute=2)
+    app.dependency_overrides[get_rate_limiter] = lambda: limiter
+
+    items = [_item(content, user="u1") for content in ("a", "b", "c")]
+    resp = client.post("/v1/batch/chat/completions", json={"requests": items})
+
+    assert resp.status_code == 429
+    assert proxy.calls == []
+    # The refused batch charged nothing: a batch that fits still goes through.
+    assert client.post(
+        "/v1/batch/chat/completions", json={"requests": items[:2]}
+    ).status_code == 200
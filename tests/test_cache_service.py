@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core import json_codec
+from app.core.config import settings
+from app.schemas.chat import ChatCompletionRequest
+from app.services.cache_service import CacheService, cache_scope
+
+SCOPE = "scope"
+
+
+class FakeCollection:
+    def __init__(self, stored: dict[str, dict], scope: str = SCOPE) -> None:
+        self.stored = stored
+        self.scope = scope
+        self.queries: list[list[str]] = []
+        self.added: list[dict] = []
+
+    def query(self, *, query_texts, n_results, where, include):
+        self.queries.append(list(query_texts))
+        ids, distances, metadatas = [], [], []
+        for text in query_texts:
+            response = self.stored.get(text) if where == {"scope": self.scope} else None
+            if response is None:
+                ids.append([])
+                distances.append([])
+                metadatas.append([])
+            else:
+                ids.append(["id"])
+                distances.append([0.0])
+                metadatas.append([{"response": json_codec.dumps_str(response)}])
+        return {"ids": ids, "distances": distances, "metadatas": metadatas}
+
+    def add(self, *, documents, metadatas, ids):
+        self.added.extend(metadatas)
+
+    def count(self):
+        return len(self.added)
+
+    def get(self, *, include, limit, offset):
+        return {"metadatas": self.added[offset : offset + limit]}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_sent_as_one_query():
+    collection = FakeCollection({"user:hi": {"id": "a"}, "user:bye": {"id": "b"}})
+    service = CacheService(collection=collection)
+
+    hits = await asyncio.gather(
+        service.get_cached_response("user:hi", scope=SCOPE),
+        service.get_cached_response("user:miss", scope=SCOPE),
+        service.get_cached_response("user:bye", scope=SCOPE),
+        service.get_cached_response("user:hi", scope=SCOPE),
+    )
+
+    assert [hit.response["id"] if hit else None for hit in hits] == ["a", None, "b", "a"]
+    assert collection.queries == [["user:hi", "user:miss", "user:bye"]]
+
+    # Hits are promoted to the exact-match tier and skip the collection afterwards.
+    assert (await service.get_cached_response("user:bye", scope=SCOPE)).response == {"id": "b"}
+    assert len(collection.queries) == 1
+
+
+class SlowCollection(FakeCollection):
+    def __init__(self, stored: dict[str, dict], delay: float) -> None:
+        super().__init__(stored)
+        self.delay = delay
+        self.threads: list[str] = []
+
+    def query(self, **kwargs):
+        self.threads.append(threading.current_thread().name)
+        time.sleep(self.delay)
+        return super().query(**kwargs)
+
+
+@pytest.mark.asyncio
+async def test_lookup_over_budget_is_treated_as_miss(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_LOOKUP_BUDGET_MS", 20.0)
+    over_budget = []
+    monkeypatch.setattr(
+        "app.services.cache_service.record_cache_over_budget", lambda: over_budget.append(1)
+    )
+    collection = SlowCollection({"user:hi": {"id": "a"}}, delay=0.2)
+    service = CacheService(collection=collection)
+
+    assert await service.get_cached_response("user:hi", scope=SCOPE) is None
+    assert over_budget == [1]
+    assert collection.threads[0].startswith("greengate-cache")
+
+    # The abandoned lookup still completes and warms the exact-match tier.
+    await asyncio.sleep(0.3)
+    assert (await service.get_cached_response("user:hi", scope=SCOPE)).response == {"id": "a"}
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_lookups_report_tiers_and_similarity(monkeypatch):
+    lookups, similarities = [], []
+    monkeypatch.setattr(
+        "app.services.cache_service.record_cache_lookup",
+        lambda *, tier, hit, count=1: lookups.append((tier, hit, count)),
+    )
+    monkeypatch.setattr(
+        "app.services.cache_service.record_cache_similarity",
+        lambda *, similarity, hit: similarities.append((similarity, hit)),
+    )
+    monkeypatch.setattr(settings, "CACHE_BATCH_WINDOW_MS", 0.0)
+
+    class DistantCollection(FakeCollection):
+        def query(self, **kwargs):
+            results = super().query(**kwargs)
+            results["distances"] = [[0.25] if ids else [] for ids in results["ids"]]
+            return results
+
+    service = CacheService(collection=DistantCollection({"user:close": {"id": "a"}}))
+    assert await service.get_cached_response("user:close", scope=SCOPE) is None
+    assert await service.get_cached_response("user:unknown", scope=SCOPE) is None
+    # similarity = 1 / (1 + distance): a near miss just below the default 0.95 threshold.
+    assert similarities == [(0.8, False)]
+    assert lookups == [
+        ("exact", False, 1),
+        ("semantic", False, 1),
+        ("exact", False, 1),
+        ("semantic", False, 1),
+    ]
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_stats_count_duplicate_prompts():
+    service = CacheService(collection=FakeCollection({}))
+    for prompt in ("user:hi", "user:hi", "user:hi", "user:bye"):
+        await service.save_response(
+            prompt,
+            {"id": prompt},
+            scope=SCOPE,
+            model="gpt-4",
+            prompt_tokens=1,
+            completion_tokens=1,
+            energy_joules=0.1,
+            provider="openai",
+        )
+
+    await service.flush()
+    stats = await service.stats()
+    assert stats["entries"] == 4
+    assert stats["unique_prompts"] == 2
+    assert stats["duplicate_entries"] == 2
+    assert stats["top_duplicates"] == [
+        {"prompt_hash": service._hash_prompt("user:hi", SCOPE), "entries": 3}
+    ]
+    assert stats["exact_tier"]["entries"] == 2
+    assert stats["disk_bytes"] is None
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_entries_are_only_served_within_their_scope():
+    collection = FakeCollection({"user:hi": {"id": "a"}})
+    service = CacheService(collection=collection)
+
+    assert await service.get_cached_response("user:hi", scope="other") is None
+    assert (await service.get_cached_response("user:hi", scope=SCOPE)).response == {"id": "a"}
+    # The exact-match tier is keyed by scope too.
+    assert await service.get_cached_response("user:hi", scope="other") is None
+    service.close()
+
+
+def test_cache_scope_covers_everything_that_shapes_the_answer():
+    def scope(**fields) -> str:
+        body = {"model": "gpt-4", "messages": [{"role": "user", "content": "hi"}], **fields}
+        return cache_scope(ChatCompletionRequest.model_validate(body))
+
+    base = scope()
+    assert scope(user="alice", stream=False) == base
+    assert scope(model="gpt-4o") != base
+    assert scope(temperature=0.2) != base
+    assert scope(max_tokens=5) != base
+    assert scope(response_format={"type": "json_object"}) != base
+    tools = [{"type": "function", "function": {"name": "lookup"}}]
+    assert scope(tools=tools) != base
+    assert scope(tools=tools, tool_choice="required") != scope(tools=tools)
+    tool_call = [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "call_1"}]},
+        {"role": "tool", "content": "42", "tool_call_id": "call_1"},
+        {"role": "user", "content": "hi"},
+    ]
+    plain = [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "x"},
+        {"role": "tool", "content": "42"},
+        {"role": "user", "content": "hi"},
+    ]
+    assert scope(messages=tool_call) != scope(messages=plain)
+
+
+@pytest.mark.asyncio
+async def test_saves_never_wait_on_a_busy_pool(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_EXECUTOR_WORKERS", 1)
+    monkeypatch.setattr(settings, "CACHE_SAVE_QUEUE_SIZE", 2)
+    dropped = []
+    monkeypatch.setattr(
+        "app.services.cache_service.record_cache_save_dropped", lambda: dropped.append(1)
+    )
+    release = threading.Event()
+    collection = FakeCollection({})
+    service = CacheService(collection=collection)
+    # An abandoned lookup still occupying the only cache thread.
+    blocked = service._submit(release.wait)
+
+    started = time.perf_counter()
+    for prompt in ("user:a", "user:b", "user:c"):
+        await service.save_response(
+            prompt,
+            {"id": prompt},
+            scope=SCOPE,
+            model="gpt-4",
+            prompt_tokens=1,
+            completion_tokens=1,
+            energy_joules=0.1,
+            provider="openai",
+        )
+    assert time.perf_counter() - started < 0.1
+    assert dropped == [1]
+    # Every save is served from the exact-match tier straight away.
+    assert (await service.get_cached_response("user:c", scope=SCOPE)).response == {"id": "user:c"}
+
+    release.set()
+    await blocked
+    await service.flush()
+    assert [metadata["prompt_hash"] for metadata in collection.added] == [
+        service._hash_prompt("user:a", SCOPE),
+        service._hash_prompt("user:b", SCOPE),
+    ]
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_exact_tier_evicts_oldest_entries_past_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_EXACT_MAX_ENTRIES", 2)
+    service = CacheService(collection=FakeCollection({}))
+    for prompt in ("user:a", "user:b", "user:c"):
+        await service.save_response(
+            prompt,
+            {"id": prompt},
+            scope=SCOPE,
+            model="gpt-4",
+            prompt_tokens=1,
+            completion_tokens=1,
+            energy_joules=0.1,
+            provider="openai",
+        )
+    await service.flush()
+
+    assert list(service._exact_cache) == [
+        service._hash_prompt("user:b", SCOPE),
+        service._hash_prompt("user:c", SCOPE),
+    ]
+    assert service._exact_bytes == sum(
+        service._entry_size(prompt_hash, hit) for prompt_hash, hit in service._exact_cache.items()
+    )
+    service.close()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+from starlette.requests import Request
+
+from app.services.cancellation import (
+    ClientDisconnectedError,
+    cancel_on_disconnect,
+    request_deadline,
+)
+
+
+def _request(headers: dict[str, str]) -> Request:
+    raw_headers = [(key.lower().encode(), value.encode()) for key, value in headers.items()]
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": raw_headers})
+
+
+class DisconnectingRequest:
+    def __init__(self) -> None:
+        self.polls = 0
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return self.polls > 1
+
+
+def test_request_deadline_prefers_millisecond_header():
+    before = time.monotonic()
+    deadline = request_deadline(
+        _request({"X-GreenGate-Deadline-Ms": "1500", "X-Request-Timeout": "30"})
+    )
+
+    assert deadline is not None
+    assert 1.4 < deadline - before < 2.0
+
+
+def test_request_deadline_ignores_invalid_values():
+    assert request_deadline(_request({"X-Request-Timeout": "soon"})) is None
+    assert request_deadline(_request({"X-GreenGate-Deadline-Ms": "-5"})) is None
+    assert request_deadline(_request({})) is None
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_disconnect_cancels_upstream():
+    cancelled = asyncio.Event()
+
+    async def upstream() -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(ClientDisconnectedError):
+        await cancel_on_disconnect(DisconnectingRequest(), upstream())
+
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_disconnect_keeps_the_callers_own_cancellation():
+    cleaning_up = asyncio.Event()
+
+    async def upstream() -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cleaning_up.set()
+            await asyncio.sleep(10)
+
+    caller = asyncio.create_task(cancel_on_disconnect(DisconnectingRequest(), upstream()))
+    await cleaning_up.wait()
+    caller.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await caller
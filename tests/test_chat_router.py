@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import asyncio
+
+import anyio
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 from app.dependencies import (
@@ -11,8 +15,10 @@ from app.dependencies import (
 )
 from app.main import app
 from app.providers.base import ProviderResult
-from app.schemas.chat import ChatMessage
+from app.routers.chat import _handle_streaming
+from app.schemas.chat import ChatCompletionRequest, ChatMessage
 from app.services.cache_service import CacheHit
+from app.services.rate_limiter import RateLimiter
 
 
 class DummyCache:
@@ -20,7 +26,8 @@ class DummyCache:
         self.hit: CacheHit | None = None
         self.saved_payload = None
 
-    async def get_cached_response(self, prompt: str):  # noqa: D401 - simple stub
+    async def get_cached_response(self, prompt: str, *, scope: str):  # noqa: D401 - simple stub
+        self.scope = scope
         return self.hit
 
     async def save_response(self, *args, **kwargs):  # noqa: ANN001 - forward args
@@ -39,12 +46,23 @@ class DummyProxy:
             ],
             "usage": {"prompt_tokens": 10, "completion_tokens": 5},
         }
-
-    async def forward_request(self, payload: dict, stream: bool = False):
-        self.calls.append({"stream": stream, "payload": payload})
+        self.raw_body: bytes | None = None
+        self.stream_chunks = [b"data: test\n\n"]
+
+    async def forward_request(
+        self,
+        payload,
+        stream: bool = False,
+        deadline: float | None = None,
+        raw_body: bytes | None = None,
+    ):
+        self.calls.append({"stream": stream, "payload": payload, "raw_body": raw_body})
         if stream:
-            async def fake_stream():  # pragma: no cover - not used in non-stream tests
-                yield b"data: test\n\n"
+            chunks = self.stream_chunks
+
+            async def fake_stream():
+                for chunk in chunks:
+                    yield chunk
 
             return ProviderResult(
                 provider_name="openai",
@@ -58,6 +76,7 @@ class DummyProxy:
             response=self.response,
             usage=self.response["usage"],
             energy_modifier=1.0,
+            raw_body=self.raw_body,
         )
 
 
@@ -73,7 +92,12 @@ class DummyLedger:
 
 
 class DummyLimiter:
-    async def check(self, identifier: str):  # noqa: D401 - stub
+    meters_usage = False
+
+    async def check(self, identifier: str, *, requests: float = 1.0):  # noqa: D401 - stub
+        return None
+
+    async def settle(self, reservation, *, tokens, joules):  # noqa: ANN001 - stub
         return None
 
 
@@ -120,6 +144,15 @@ def test_cache_hit_short_circuits_network(test_client):
     assert resp.status_code == 200
     assert resp.headers["X-GreenGate-Status"] == "CACHE_HIT"
     assert len(dummy_proxy.calls) == 0
+    stages = [entry.split(";")[0] for entry in resp.headers["Server-Timing"].split(", ")]
+    assert stages == [
+        "admission",
+        "rate_limit",
+        "cache_lookup",
+        "ledger",
+        "serialize",
+        "total",
+    ]
     assert dummy_ledger.records[0]["saved"] == 1.5
 
 
@@ -135,6 +168,50 @@ def test_cache_miss_proxies_and_persists(test_client):
     assert dummy_ledger.records[0]["spent"] > 0
 
 
+def test_passthrough_forwards_raw_bytes(test_client):
+    client, dummy_cache, dummy_proxy, _ = test_client
+    dummy_proxy.raw_body = (
+        b'{"choices":[{"message":{"role":"assistant","content":"Hello!"}}],'
+        b'"usage":{"prompt_tokens":10,"completion_tokens":5},"system_fingerprint":"fp_1"}'
+    )
+    payload = _build_payload()
+    payload["response_format"] = {"type": "json_object"}
+
+    resp = client.post("/v1/chat/completions", json=payload)
+
+    assert resp.status_code == 200
+    assert resp.content == dummy_proxy.raw_body
+    assert resp.headers["X-GreenGate-Status"] == "CACHE_MISS"
+    assert b'"response_format"' in dummy_proxy.calls[0]["raw_body"]
+    assert dummy_cache.saved_payload["kwargs"]["serialized"] == dummy_proxy.raw_body.decode()
+
+
+def test_tool_call_turns_are_accepted_and_cached_under_their_own_scope(test_client):
+    client, dummy_cache, dummy_proxy, _ = test_client
+    assert client.post("/v1/chat/completions", json=_build_payload()).status_code == 200
+    plain_scope = dummy_cache.scope
+
+    payload = _build_payload()
+    payload["tools"] = [{"type": "function", "function": {"name": "lookup"}}]
+    payload["messages"] += [
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "call_1"}]},
+        {"role": "tool", "content": "42", "tool_call_id": "call_1"},
+    ]
+    resp = client.post("/v1/chat/completions", json=payload)
+
+    assert resp.status_code == 200
+    assert dummy_cache.scope != plain_scope
+    assert dummy_cache.saved_payload["kwargs"]["scope"] == dummy_cache.scope
+
+
+def test_null_content_needs_tool_calls(test_client):
+    client, _, _, _ = test_client
+    payload = _build_payload()
+    payload["messages"].append({"role": "assistant", "content": None})
+
+    assert client.post("/v1/chat/completions", json=payload).status_code == 422
+
+
 def test_streaming_bypasses_cache(test_client):
     client, dummy_cache, dummy_proxy, dummy_ledger = test_client
     payload = _build_payload()
@@ -149,6 +226,30 @@ def test_streaming_bypasses_cache(test_client):
     assert len(dummy_ledger.records) == 1
 
 
+def test_streaming_records_reported_usage(test_client):
+    client, _, dummy_proxy, dummy_ledger = test_client
+    dummy_proxy.stream_chunks = [
+        b'data: {"choices":[{"delta":{"content":"Hi"}}]}\n\ndata: {"choi',
+        b'ces":[],"usage":{"prompt_tokens":11,"completion_tokens":42}}\n\ndata: [DONE]\n\n',
+    ]
+    payload = _build_payload()
+    payload["stream"] = True
+
+    resp = client.post("/v1/chat/completions", json=payload)
+
+    assert resp.status_code == 200
+    assert dummy_ledger.records[0]["prompt_tokens"] == 11
+    assert dummy_ledger.records[0]["completion_tokens"] == 42
+    assert dummy_ledger.records[0]["status"] == "complete"
+    # The gateway asked for usage, not the client, so the usage-only chunk is not relayed.
+    assert b'"usage"' not in resp.content
+    assert resp.content.endswith(b"data: [DONE]\n\n")
+
+    payload["stream_options"] = {"include_usage": True}
+    resp = client.post("/v1/chat/completions", json=payload)
+    assert b'"choices":[],"usage"' in resp.content
+
+
 def test_gateway_auth_rejects_missing_token(monkeypatch, test_client):
     from app.core.config import settings
 
@@ -178,3 +279,99 @@ def test_gateway_auth_allows_bearer_token(monkeypatch, test_client):
     finally:
         monkeypatch.setattr(settings, "GATEWAY_API_KEY", previous)
 
+
+def test_token_budget_is_settled_from_reported_usage(test_client):
+    client, _, _, _ = test_client
+    limiter = RateLimiter(rate_per_minute=100, tokens_per_minute=1000)
+    app.dependency_overrides[get_rate_limiter] = lambda: limiter
+    payload = {**_build_payload(), "max_tokens": 900}
+
+    # Each call reserves its prompt plus max_tokens but only pays the 15 tokens it used.
+    assert client.post("/v1/chat/completions", json=payload).status_code == 200
+    assert client.post("/v1/chat/completions", json=payload).status_code == 200
+
+    payload["max_tokens"] = 990
+    resp = client.post("/v1/chat/completions", json=payload)
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_failed_upstream_calls_give_back_their_token_reservation(test_client, stream):
+    client, _, proxy, _ = test_client
+    limiter = RateLimiter(rate_per_minute=100, tokens_per_minute=1000)
+    app.dependency_overrides[get_rate_limiter] = lambda: limiter
+
+    async def failing(*args, **kwargs):
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+    payload = {**_build_payload(), "max_tokens": 900, "stream": stream}
+    proxy.forward_request = failing
+    assert client.post("/v1/chat/completions", json=payload).status_code == 504
+
+    async def empty(*args, **kwargs):
+        return ProviderResult(
+            provider_name="openai", response=None, usage={}, energy_modifier=1.0
+        )
+
+    proxy.forward_request = empty
+    assert client.post("/v1/chat/completions", json=payload).status_code == 502
+    # Neither failure kept its 900-token reservation, so the budget is still there.
+    payload["stream"] = False
+    del proxy.forward_request
+    assert client.post("/v1/chat/completions", json=payload).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_streaming_disconnect_accounting_survives_cancellation():
+    entered, settled = asyncio.Event(), asyncio.Event()
+
+    class GoneClient:
+        async def is_disconnected(self) -> bool:
+            return True
+
+    class SlowProxy:
+        async def forward_request(self, payload, **kwargs):
+            await asyncio.sleep(10)
+
+    class SlowLimiter:
+        async def settle(self, reservation, *, tokens, joules):  # noqa: ANN001 - stub
+            entered.set()
+            await asyncio.sleep(0.05)
+            settled.set()
+
+    payload = ChatCompletionRequest.model_validate({**_build_payload(), "stream": True})
+    ledger = DummyLedger()
+
+    async with anyio.create_task_group() as group:
+        group.start_soon(
+            _handle_streaming,
+            payload,
+            GoneClient(),
+            SlowProxy(),
+            ledger,
+            SlowLimiter(),
+            None,
+            None,
+            None,
+        )
+        await entered.wait()
+        # What Starlette does once it notices the client has gone.
+        group.cancel_scope.cancel()
+
+    assert settled.is_set()
+    assert ledger.records[0]["status"] == "partial"
+
+
+def test_lifespan_configured_limiter_serves_requests():
+    # Only the upstream side is stubbed; the limiter is the one the lifespan configures.
+    app.dependency_overrides[get_cache_service] = DummyCache
+    app.dependency_overrides[get_proxy_service] = DummyProxy
+    app.dependency_overrides[get_energy_ledger] = DummyLedger
+    try:
+        with TestClient(app) as client:
+            resp = client.post("/v1/chat/completions", json=_build_payload())
+            assert resp.status_code == 200
+            assert resp.json()["choices"][0]["message"]["content"] == "Hello!"
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from app.core.provider_settings import ProviderSettings
+from app.providers.cohere_provider import CohereProvider
+
+
+def _provider(client: httpx.AsyncClient) -> CohereProvider:
+    return CohereProvider(
+        ProviderSettings(
+            name="cohere",
+            kind="cohere",
+            api_key="key",
+            base_url="https://cohere.local",
+            supported_models=["command-r"],
+        ),
+        client,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "upstream",
+    [
+        {
+            "id": "c-1",
+            "finish_reason": "COMPLETE",
+            "message": {"role": "assistant", "content": [{"type": "text", "text": "Hi there"}]},
+            "usage": {
+                "billed_units": {"input_tokens": 3, "output_tokens": 2},
+                "tokens": {"input_tokens": 40, "output_tokens": 2},
+            },
+        },
+        {
+            "generation_id": "c-1",
+            "text": "Hi there",
+            "finish_reason": "COMPLETE",
+            "meta": {"tokens": {"input_tokens": 40, "output_tokens": 2}},
+        },
+    ],
+    ids=["v2", "v1"],
+)
+async def test_invoke_returns_openai_schema_with_usage(upstream: dict):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=upstream)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await _provider(client).invoke({"model": "command-r", "messages": []})
+
+    assert result.response["id"] == "c-1"
+    assert result.response["choices"][0]["message"]["content"] == "Hi there"
+    assert result.response["choices"][0]["finish_reason"] == "stop"
+    assert result.usage == {"prompt_tokens": 40, "completion_tokens": 2, "total_tokens": 42}
+
+
+def test_tool_calls_are_forwarded_without_an_empty_text_part():
+    call = {
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "lookup", "arguments": '{"city": "Oslo"}'},
+    }
+    payload = _provider(httpx.AsyncClient())._translate_payload(
+        {
+            "model": "command-r",
+            "messages": [
+                {"role": "user", "content": "Weather?"},
+                {"role": "assistant", "content": None, "tool_calls": [call]},
+                {"role": "tool", "tool_call_id": "call_1", "content": "4C"},
+            ],
+        },
+        stream=False,
+    )
+
+    assert payload["messages"][1:] == [
+        {"role": "ASSISTANT", "tool_calls": [call]},
+        {"role": "TOOL", "content": "4C", "tool_call_id": "call_1"},
+    ]
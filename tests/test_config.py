@@ -25,3 +25,8 @@ def test_otel_headers_parsing():
     cfg = Settings(OTEL_EXPORTER_OTLP_HEADERS="api-key=123, another = value")
     headers = cfg.otel_headers()
     assert headers == {"api-key": "123", "another": "value"}
+
+
+def test_http_pool_overrides_parsing():
+    cfg = Settings(HTTP_POOL_OVERRIDES="openai=200, cohere = 20, broken")
+    assert cfg.http_pool_overrides() == {"openai": 200, "cohere": 20}
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from app.services.http_pool import InstrumentedTransport
+
+
+class LazyStream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b"data: hello\n\n"
+
+
+@pytest.mark.asyncio
+async def test_instrumented_transport_tracks_open_responses():
+    async def handler(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, stream=LazyStream())
+
+    transport = InstrumentedTransport(
+        httpx.MockTransport(handler),
+        provider="openai",
+        max_connections=4,
+    )
+    async with httpx.AsyncClient(transport=transport) as client:
+        request = client.build_request("POST", "https://example.com/chat/completions")
+        response = await client.send(request, stream=True)
+        assert transport.in_flight == 1
+
+        body = b"".join([chunk async for chunk in response.aiter_bytes()])
+        await response.aclose()
+
+    assert body == b"data: hello\n\n"
+    assert transport.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_instrumented_transport_releases_on_error():
+    async def handler(_: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("boom")
+
+    transport = InstrumentedTransport(
+        httpx.MockTransport(handler),
+        provider="openai",
+        max_connections=4,
+    )
+    async with httpx.AsyncClient(transport=transport) as client:
+        with pytest.raises(httpx.ConnectError):
+            await client.get("https://example.com")
+
+    assert transport.in_flight == 0
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dependencies import get_job_service, get_rate_limiter
+from app.main import app
+from app.providers.base import ProviderResult
+from app.schemas.chat import ChatCompletionRequest
+from app.services.admission import AdmissionController
+from app.services.job_queue import (
+    FAILED,
+    QUEUED,
+    SUCCEEDED,
+    CarbonSchedule,
+    JobService,
+    JobStore,
+)
+from app.services.rate_limiter import RateLimiter, Reservation
+
+
+class MissCache:
+    def __init__(self) -> None:
+        self.saved: list[str] = []
+
+    async def get_cached_response(self, prompt: str, *, scope: str):
+        return None
+
+    async def save_response(self, prompt, response, **kwargs):  # noqa: ANN001 - stub
+        self.saved.append(prompt)
+
+
+class RecordingProxy:
+    def __init__(self) -> None:
+        self.order: list[str] = []
+
+    async def forward_request(self, payload, stream=False, deadline=None, raw_body=None):
+        content = payload.messages[-1].content
+        self.order.append(content)
+        return ProviderResult(
+            provider_name="openai",
+            response={"choices": [{"message": {"role": "assistant", "content": content}}]},
+            usage={"prompt_tokens": 4, "completion_tokens": 2},
+            energy_modifier=1.0,
+        )
+
+
+class RecordingLimiter:
+    def __init__(self) -> None:
+        self.settled: list[tuple[Reservation, int, float]] = []
+
+    async def settle(self, reservation, *, tokens, joules):  # noqa: ANN001 - stub
+        self.settled.append((reservation, tokens, joules))
+
+
+class ListLedger:
+    def __init__(self) -> None:
+        self.records: list[dict] = []
+
+    async def record(self, **data) -> None:
+        self.records.append(data)
+
+
+def _request(content: str) -> ChatCompletionRequest:
+    return ChatCompletionRequest(
+        model="gpt-4o-mini", messages=[{"role": "user", "content": content}]
+    )
+
+
+def _service(
+    tmp_path, forecast: str = "", *, lease_seconds: float | None = None, **kwargs
+) -> tuple[JobService, RecordingProxy, ListLedger]:
+    path = tmp_path / "carbon.csv"
+    if forecast:
+        path.write_text(forecast)
+    proxy, ledger = RecordingProxy(), ListLedger()
+    service = JobService(
+        JobStore(tmp_path / "jobs.db", lease_seconds=lease_seconds),
+        CarbonSchedule(path),
+        proxy=proxy,
+        cache=MissCache(),
+        ledger=ledger,
+        **kwargs,
+    )
+    return service, proxy, ledger
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_by_priority_then_deadline(tmp_path):
+    service, proxy, ledger = _service(tmp_path)
+    now = time.time()
+    await service.submit(_request("low"), priority=0)
+    await service.submit(_request("late"), priority=5, deadline=now + 600)
+    await service.submit(_request("urgent"), priority=5, deadline=now + 60)
+
+    while await service.run_once():
+        pass
+
+    assert proxy.order == ["urgent", "late", "low"]
+    assert len(ledger.records) == 3
+
+
+@pytest.mark.asyncio
+async def test_job_result_is_stored(tmp_path):
+    service, *_ = _service(tmp_path)
+    job = await service.submit(_request("hello"))
+    assert (await service.get(job.id)).status == QUEUED
+
+    await service.run_once()
+
+    stored = await service.get(job.id)
+    assert stored.status == SUCCEEDED
+    assert stored.result["choices"][0]["message"]["content"] == "hello"
+    assert stored.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_deadline_fails_without_calling_upstream(tmp_path):
+    service, proxy, _ = _service(tmp_path)
+    job = await service.submit(_request("too late"), deadline=time.time() - 1)
+
+    await service.run_once()
+
+    stored = await service.get(job.id)
+    assert stored.status == FAILED
+    assert proxy.order == []
+
+
+@pytest.mark.asyncio
+async def test_low_carbon_jobs_wait_for_a_clean_window(tmp_path):
+    # Whole seconds, so the current forecast slot never starts in the future.
+    now = float(int(time.time()))
+    hour = 3600
+    forecast = "timestamp,gco2_per_kwh\n" + "".join(
+        f"{now - hour + i * hour:.0f},{value}\n" for i, value in enumerate((420, 380, 150, 90))
+    )
+    service, proxy, _ = _service(tmp_path, forecast)
+
+    job = await service.submit(_request("later"), low_carbon=True)
+    rushed = await service.submit(_request("bounded"), low_carbon=True, deadline=now + hour - 60)
+
+    assert job.not_before == pytest.approx(now + hour, abs=1)
+    # The clean slot lies past the deadline, so the cleaner of the reachable slots wins.
+    assert rushed.not_before == pytest.approx(now, abs=1)
+    await service.run_once()
+    assert proxy.order == ["bounded"]
+
+
+@pytest.mark.asyncio
+async def test_running_jobs_are_not_run_again_by_other_workers(tmp_path):
+    first, first_proxy, _ = _service(tmp_path, lease_seconds=0.15)
+    second, second_proxy, _ = _service(tmp_path, lease_seconds=0.15)
+    release = asyncio.Event()
+    forward = first_proxy.forward_request
+
+    async def slow(payload, **kwargs):
+        await release.wait()
+        return await forward(payload, **kwargs)
+
+    first_proxy.forward_request = slow
+    job = await first.submit(_request("hello"))
+    running = asyncio.create_task(first.run_once())
+    await asyncio.sleep(0.4)
+
+    # Well past the lease, but the first worker keeps renewing it while it runs.
+    assert await second.run_once() is False
+    release.set()
+    assert await running is True
+
+    stored = await first.get(job.id)
+    assert stored.status == SUCCEEDED
+    assert stored.attempts == 1
+    assert second_proxy.order == []
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_a_dead_worker_are_reclaimed_once_the_lease_expires(tmp_path):
+    dead, *_ = _service(tmp_path, lease_seconds=0.1)
+    survivor, proxy, _ = _service(tmp_path, lease_seconds=0.1)
+    job = await dead.submit(_request("hello"))
+    await dead.store.claim(time.time())
+
+    assert await survivor.run_once() is False
+    await asyncio.sleep(0.15)
+    assert await survivor.run_once() is True
+
+    stored = await survivor.get(job.id)
+    assert proxy.order == ["hello"]
+    assert (stored.status, stored.attempts) == (SUCCEEDED, 2)
+
+
+@pytest.mark.asyncio
+async def test_jobs_settle_their_reservation_with_actual_usage(tmp_path):
+    limiter = RecordingLimiter()
+    service, _, ledger = _service(tmp_path, limiter=limiter)
+    reservation = Reservation("alice", tokens=500.0, joules=2.0)
+    await service.submit(_request("hello"), reservation=reservation)
+    await service.submit(_request("too late"), deadline=time.time() - 1, reservation=reservation)
+
+    while await service.run_once():
+        pass
+
+    # The reservation survives the round trip through the store; the expired job
+    # (claimed first, having a deadline) gives back everything but the request.
+    assert [(settled, tokens) for settled, tokens, _ in limiter.settled] == [
+        (reservation, 0),
+        (reservation, 6),
+    ]
+    assert limiter.settled[1][2] == pytest.approx(ledger.records[0]["spent"])
+
+
+@pytest.mark.asyncio
+async def test_jobs_wait_for_admission_behind_interactive_traffic(tmp_path):
+    admission = AdmissionController(max_concurrency=1, max_queue=0, queue_timeout=0.0)
+    limiter = RecordingLimiter()
+    service, proxy, _ = _service(tmp_path, limiter=limiter, admission=admission)
+    job = await service.submit(_request("later"), reservation=Reservation("alice"))
+    await admission.acquire(priority=3)
+
+    await service.run_once()
+
+    stored = await service.get(job.id)
+    assert stored.status == QUEUED
+    assert stored.not_before > time.time()
+    assert proxy.order == []
+    assert limiter.settled == []
+
+
+@pytest.mark.asyncio
+async def test_job_tables_from_before_reservations_are_migrated(tmp_path):
+    with sqlite3.connect(tmp_path / "jobs.db") as db:
+        db.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+            "priority INTEGER NOT NULL DEFAULT 0, deadline REAL, not_before REAL NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, request TEXT NOT NULL, result TEXT, "
+            "error TEXT)"
+        )
+        db.execute(
+            "INSERT INTO jobs VALUES ('old', 'queued', 0, NULL, 0, 0, 0, 0, ?, NULL, NULL)",
+            ('{"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}]}',),
+        )
+    service, proxy, _ = _service(tmp_path)
+
+    assert (await service.get("old")).reservation is None
+    await service.run_once()
+    assert proxy.order == ["hi"]
+
+
+def test_job_submissions_are_rate_limited(tmp_path):
+    service, *_ = _service(tmp_path)
+    app.dependency_overrides[get_job_service] = lambda: service
+    limiter = RateLimiter(rate_per_minute=1)
+    app.dependency_overrides[get_rate_limiter] = lambda: limiter
+    body = {"request": _request("hello").model_dump(exclude_none=True)}
+    try:
+        with TestClient(app) as client:
+            assert client.post("/v1/jobs", json=body).status_code == 202
+            resp = client.post("/v1/jobs", json=body)
+    finally:
+        app.dependency_overrides.clear()
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from app.core import json_codec
+
+
+def test_stdlib_backend_round_trips_unicode():
+    name, dumps, loads = json_codec.load_backend("json")
+    payload = {"content": "énergie ♻", "usage": {"prompt_tokens": 3}}
+
+    assert name == "json"
+    assert loads(dumps(payload)) == payload
+    assert dumps(payload).decode("utf-8") == '{"content":"énergie ♻","usage":{"prompt_tokens":3}}'
+
+
+def test_unknown_backend_falls_back_to_stdlib():
+    name, dumps, loads = json_codec.load_backend("does-not-exist")
+
+    assert name == "json"
+    assert loads(dumps([1, 2])) == [1, 2]
+
+
+def test_response_class_uses_codec():
+    response = json_codec.CodecJSONResponse({"ok": True})
+
+    assert json_codec.loads(response.body) == {"ok": True}
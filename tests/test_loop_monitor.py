@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.services import loop_monitor as loop_monitor_module
+from app.services.loop_monitor import LoopMonitor
+
+
+def blocking_call(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_blocking_callback_is_measured_and_logged(monkeypatch, caplog):
+    lags, blocked = [], []
+    monkeypatch.setattr(loop_monitor_module, "record_loop_lag", lags.append)
+    monkeypatch.setattr(loop_monitor_module, "record_loop_blocked", lambda: blocked.append(1))
+    monitor = LoopMonitor(interval=0.01, threshold=0.05)
+
+    with caplog.at_level(logging.WARNING, logger="greengate.loop"):
+        await monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_call(0.3)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    assert max(lags) >= 0.25
+    # One stall is reported once, with the code that was blocking the loop.
+    assert blocked == [1]
+    assert "blocking_call" in caplog.text
+    assert "time.sleep(seconds)" in caplog.text
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+
+from app.services.metrics_export import compact_dead_workers, render_latest
+
+REQUESTS = mmap_key("greengate_requests", "greengate_requests_total", [], [], "Requests")
+IN_FLIGHT = mmap_key("greengate_in_flight", "greengate_in_flight", [], [], "In flight")
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def write(path, name: str, key: str, value: float) -> None:
+    values = MmapedDict(str(path / name))
+    values.write_value(key, value, 0.0)
+    values.close()
+
+
+def test_scrape_sums_live_and_exited_workers(tmp_path):
+    first, second = dead_pid(), dead_pid()
+    write(tmp_path, f"counter_{os.getpid()}.db", REQUESTS, 3.0)
+    write(tmp_path, f"counter_{first}.db", REQUESTS, 4.0)
+    write(tmp_path, f"gauge_livesum_{os.getpid()}.db", IN_FLIGHT, 2.0)
+    write(tmp_path, f"gauge_livesum_{first}.db", IN_FLIGHT, 5.0)
+
+    assert compact_dead_workers(tmp_path) == 1
+    assert {file.name for file in tmp_path.glob("*.db")} == {
+        "counter_archive.db",
+        f"counter_{os.getpid()}.db",
+        f"gauge_livesum_{os.getpid()}.db",
+    }
+    output = render_latest(tmp_path).decode()
+    assert "greengate_requests_total 7.0" in output
+    # The exited worker's requests in flight no longer count.
+    assert "greengate_in_flight 2.0" in output
+
+    # Later exits add to the archive instead of replacing it.
+    write(tmp_path, f"counter_{second}.db", REQUESTS, 1.0)
+    assert compact_dead_workers(tmp_path) == 1
+    assert "greengate_requests_total 8.0" in render_latest(tmp_path).decode()
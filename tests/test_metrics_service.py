@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import sqlite3
+
+import aiosqlite
+import pytest
+
+from app.services.metrics_service import EnergyLedger
+
+
+@pytest.mark.asyncio
+async def test_ledger_records_partial_status(tmp_path):
+    ledger = EnergyLedger(tmp_path / "energy.db")
+    await ledger.record(spent=1.0, saved=0.0, prompt_tokens=10, completion_tokens=0)
+    await ledger.record(
+        spent=0.5, saved=0.0, prompt_tokens=10, completion_tokens=3, status="partial"
+    )
+
+    async with aiosqlite.connect(ledger.db_path) as db:
+        async with db.execute("SELECT status FROM energy_metrics ORDER BY id") as cursor:
+            rows = await cursor.fetchall()
+
+    assert [row[0] for row in rows] == ["complete", "partial"]
+
+
+@pytest.mark.asyncio
+async def test_ledger_migrates_existing_table(tmp_path):
+    db_path = tmp_path / "energy.db"
+    with sqlite3.connect(db_path) as db:
+        db.execute(
+            "CREATE TABLE energy_metrics (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "spent REAL NOT NULL, saved REAL NOT NULL, prompt_tokens INTEGER NOT NULL, "
+            "completion_tokens INTEGER NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+
+    ledger = EnergyLedger(db_path)
+    await ledger.record(
+        spent=1.0, saved=0.0, prompt_tokens=1, completion_tokens=1, status="partial"
+    )
+
+    snapshot = await ledger.snapshot()
+    assert snapshot["requests"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_record_many_writes_all_entries(tmp_path):
+    ledger = EnergyLedger(tmp_path / "energy.db")
+
+    await ledger.record_many(
+        [
+            {"spent": 1.0, "saved": 0.0, "prompt_tokens": 1, "completion_tokens": 1},
+            {"spent": 0.0, "saved": 2.0, "prompt_tokens": 1, "completion_tokens": 1},
+        ]
+    )
+
+    stats = await ledger.snapshot()
+    assert stats == {"requests": 2.0, "energy_spent": 1.0, "energy_saved": 2.0}
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from app.core.provider_settings import ProviderSettings
+from app.providers.openai_provider import OpenAIProvider
+
+
+def _provider(client: httpx.AsyncClient) -> OpenAIProvider:
+    return OpenAIProvider(
+        ProviderSettings(
+            name="openai",
+            kind="openai",
+            api_key="key",
+            base_url="https://openai.local/v1",
+            supported_models=["gpt-4o"],
+        ),
+        client,
+    )
+
+
+@pytest.mark.asyncio
+async def test_invoke_raw_forwards_body_and_returns_upstream_bytes():
+    body = b'{"model":"gpt-4o","messages":[],"tools":[{"type":"function"}]}'
+    upstream = b'{"id":"chatcmpl-1","usage":{"prompt_tokens":3,"completion_tokens":1}}'
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        assert request.content == body
+        return httpx.Response(200, content=upstream, headers={"Content-Type": "application/json"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await _provider(client).invoke_raw(body, model="gpt-4o")
+
+    assert result.raw_body == upstream
+    assert result.usage["prompt_tokens"] == 3
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import marshal
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.profiler import Profiler, ProfilerBusyError
+
+
+def spin(seconds: float) -> int:
+    deadline = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < deadline:
+        count += 1
+    return count
+
+
+async def busy_loop(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        spin(0.002)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_cpu_profile_is_a_pstats_dump_of_the_loop():
+    result, _ = await asyncio.gather(Profiler().profile("cpu", 0.1), busy_loop(0.05))
+
+    stats = marshal.loads(result.content)
+    assert any(name == "spin" for _file, _line, name in stats)
+    assert result.filename.endswith("-cpu.pstats")
+
+
+@pytest.mark.asyncio
+async def test_wall_profile_samples_waiting_threads():
+    stop = threading.Event()
+    waiter = threading.Thread(target=stop.wait, name="waiter")
+    waiter.start()
+    try:
+        result = await Profiler().profile("wall", 0.1)
+    finally:
+        stop.set()
+        waiter.join()
+
+    stacks = result.content.decode().splitlines()
+    waiting = [line for line in stacks if line.startswith("waiter;")]
+    assert waiting and "Event.wait" in waiting[0]
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in stacks)
+
+
+@pytest.mark.asyncio
+async def test_alloc_profile_weights_stacks_by_bytes_kept():
+    kept = []
+
+    async def allocate() -> None:
+        await asyncio.sleep(0.02)
+        kept.append(bytearray(1_000_000))
+
+    result, _ = await asyncio.gather(Profiler().profile("alloc", 0.1), allocate())
+
+    heaviest = result.content.decode().splitlines()[0]
+    stack, size = heaviest.rsplit(" ", 1)
+    assert "test_profiler.py" in stack.split(";")[-1]
+    assert int(size) >= 1_000_000
+
+
+@pytest.mark.asyncio
+async def test_only_one_profile_runs_at_a_time():
+    profiler = Profiler()
+    running = asyncio.create_task(profiler.profile("wall", 0.1))
+    await asyncio.sleep(0.01)
+    with pytest.raises(ProfilerBusyError):
+        await profiler.profile("cpu", 0.1)
+    with pytest.raises(ProfilerBusyError):
+        await profiler.top_allocations(limit=5, seconds=0.1)
+    await running
+    assert (await profiler.top_allocations(limit=5, seconds=0.01))["window_seconds"] == 0.01
+
+
+def test_admin_endpoints_need_the_admin_key(monkeypatch):
+    with TestClient(app) as client:
+        monkeypatch.setattr(settings, "ADMIN_API_KEY", None)
+        assert client.post("/admin/profile?seconds=0.05").status_code == 404
+
+        monkeypatch.setattr(settings, "ADMIN_API_KEY", "admin-key")
+        assert client.post("/admin/profile?seconds=0.05").status_code == 401
+        headers = {"Authorization": "Bearer admin-key"}
+        too_long = client.post("/admin/profile?seconds=3600", headers=headers)
+        assert too_long.status_code == 400
+
+        response = client.post("/admin/profile?seconds=0.05&mode=wall", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "-wall.folded" in response.headers["content-disposition"]
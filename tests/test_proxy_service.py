@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.provider_settings import ProviderSettings
+from app.providers.base import LLMProvider, ProviderError, ProviderResult
+from app.schemas.chat import ChatCompletionRequest
+from app.services.model_router import ModelRouter, ProviderProfile
+from app.services.proxy_service import ProxyService
+
+
+class SlowProvider(LLMProvider):
+    def __init__(self, delay: float) -> None:
+        super().__init__(
+            ProviderSettings(
+                name="slow",
+                kind="openai",
+                api_key="test",
+                base_url="https://example.com",
+                supported_models=["gpt-4"],
+            )
+        )
+        self.delay = delay
+        self.calls = 0
+        self.payloads: list = []
+
+    async def invoke(self, payload: dict, *, stream: bool = False) -> ProviderResult:
+        self.calls += 1
+        self.payloads.append(payload)
+        await asyncio.sleep(self.delay)
+        return ProviderResult(provider_name=self.name, response={}, usage={}, energy_modifier=1.0)
+
+
+class PassthroughProvider(SlowProvider):
+    supports_passthrough = True
+
+    async def invoke_raw(self, body: bytes, *, model: str, stream: bool = False) -> ProviderResult:
+        self.calls += 1
+        self.payloads.append(body)
+        return ProviderResult(
+            provider_name=self.name,
+            response={},
+            usage={},
+            energy_modifier=1.0,
+            raw_body=b"{}",
+        )
+
+
+def _service(provider: LLMProvider) -> ProxyService:
+    service = ProxyService()
+    service._router = ModelRouter(
+        [
+            ProviderProfile(
+                provider=provider,
+                cost_per_1k_tokens=1.0,
+                latency_ms=100.0,
+                reliability=0.99,
+                energy_modifier=1.0,
+            )
+        ]
+    )
+    return service
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_slow_upstream_attempt():
+    provider = SlowProvider(delay=5.0)
+    service = _service(provider)
+
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as excinfo:
+        await service.forward_request({"model": "gpt-4"}, deadline=time.monotonic() + 0.05)
+
+    assert excinfo.value.status_code == 504
+    assert time.monotonic() - started < 1.0
+
+
+@pytest.mark.asyncio
+async def test_expired_deadline_skips_upstream():
+    provider = SlowProvider(delay=0.0)
+    service = _service(provider)
+
+    with pytest.raises(HTTPException) as excinfo:
+        await service.forward_request({"model": "gpt-4"}, deadline=time.monotonic() - 1)
+
+    assert excinfo.value.status_code == 504
+    assert provider.calls == 0
+
+
+def _request() -> ChatCompletionRequest:
+    return ChatCompletionRequest(
+        model="gpt-4",
+        messages=[{"role": "user", "content": "hi"}],
+        tools=[{"type": "function", "function": {"name": "lookup"}}],
+    )
+
+
+@pytest.mark.asyncio
+async def test_passthrough_provider_receives_raw_body():
+    provider = PassthroughProvider(delay=0.0)
+    service = _service(provider)
+
+    result = await service.forward_request(_request(), raw_body=b'{"model":"gpt-4"}')
+
+    assert provider.payloads == [b'{"model":"gpt-4"}']
+    assert result.raw_body == b"{}"
+
+
+@pytest.mark.asyncio
+async def test_translating_provider_receives_dumped_payload():
+    provider = SlowProvider(delay=0.0)
+    service = _service(provider)
+
+    await service.forward_request(_request(), raw_body=b'{"model":"gpt-4"}')
+
+    assert provider.payloads[0]["model"] == "gpt-4"
+    assert provider.payloads[0]["tools"][0]["function"]["name"] == "lookup"
+
+
+@pytest.mark.asyncio
+async def test_raw_passthrough_needs_a_passthrough_provider():
+    with pytest.raises(ProviderError):
+        await SlowProvider(delay=0.0).invoke_raw(b"{}", model="gpt-4")
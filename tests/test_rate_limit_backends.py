@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.rate_limit_backends import (
+    RedisBackend,
+    SharedMemoryBackend,
+    _read_reply,
+)
+from app.services.rate_limiter import RateLimiter
+
+
+class FakeRedis:
+    """Just enough of a Redis server (RESP over TCP) for the rate limit backend."""
+
+    def __init__(self, password: str | None = None) -> None:
+        self.password = password
+        self.data: dict[bytes, float] = {}
+        self.commands: list[list[bytes]] = []
+        self.server: asyncio.Server | None = None
+
+    async def __aenter__(self) -> FakeRedis:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        assert self.server is not None
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        assert self.server is not None
+        port = self.server.sockets[0].getsockname()[1]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{port}/0"
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        authenticated = self.password is None
+        try:
+            while True:
+                command = await _read_reply(reader)
+                assert isinstance(command, list)
+                self.commands.append(command)
+                name = command[0].upper()
+                if name == b"AUTH":
+                    authenticated = command[1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                elif name == b"GET":
+                    value = self.data.get(command[1])
+                    if value is None:
+                        writer.write(b"$-1\r\n")
+                    else:
+                        encoded = repr(value).encode()
+                        writer.write(b"$%d\r\n%s\r\n" % (len(encoded), encoded))
+                elif name == b"INCRBYFLOAT":
+                    value = self.data.get(command[1], 0.0) + float(command[2])
+                    self.data[command[1]] = value
+                    encoded = repr(value).encode()
+                    writer.write(b"$%d\r\n%s\r\n" % (len(encoded), encoded))
+                elif name == b"PEXPIRE":
+                    writer.write(b":1\r\n")
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_is_shared_between_workers(tmp_path):
+    path = tmp_path / "ratelimit.bin"
+    first = RateLimiter(rate_per_minute=2, backend=SharedMemoryBackend(path, slots=64))
+    second = RateLimiter(rate_per_minute=2, backend=SharedMemoryBackend(path, slots=64))
+    await first.check("user")
+    await second.check("user")
+    with pytest.raises(HTTPException) as excinfo:
+        await first.check("user")
+    assert excinfo.value.headers["Retry-After"] == "30"
+    await second.check("someone-else")
+    await first.close()
+    await second.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_settles_and_keeps_layouts_apart(tmp_path):
+    path = tmp_path / "ratelimit.bin"
+    backend = SharedMemoryBackend(path, slots=64)
+    limiter = RateLimiter(rate_per_minute=10, tokens_per_minute=100, backend=backend)
+    reservation = await limiter.check("user", tokens=90)
+    with pytest.raises(HTTPException):
+        await limiter.check("user", tokens=90)
+    await limiter.settle(reservation, tokens=10, joules=0.0)
+    await limiter.check("user", tokens=80)
+
+    # Another layout gets its own table instead of rebuilding the one in use.
+    resized = RateLimiter(
+        rate_per_minute=10, tokens_per_minute=100, backend=SharedMemoryBackend(path, slots=128)
+    )
+    await resized.check("user", tokens=100)
+    assert resized.backend.path != backend.path
+    with pytest.raises(HTTPException):
+        await limiter.check("user", tokens=90)
+    await resized.close()
+    await limiter.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_refuses_a_damaged_table(tmp_path):
+    path = tmp_path / "ratelimit.bin"
+    backend = SharedMemoryBackend(path, slots=64)
+    await backend.close()
+    table = backend.path
+    table.write_bytes(b"not a table")
+
+    with pytest.raises(RuntimeError, match="not a rate limit table"):
+        SharedMemoryBackend(path, slots=64)
+    assert table.read_bytes() == b"not a table"
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_shares_limits_across_workers():
+    async with FakeRedis(password="secret") as server:
+        first = RateLimiter(rate_per_minute=2, backend=RedisBackend(server.url, timeout=1.0))
+        second = RateLimiter(rate_per_minute=2, backend=RedisBackend(server.url, timeout=1.0))
+        await asyncio.gather(first.check("user"), second.check("user"))
+        with pytest.raises(HTTPException) as excinfo:
+            await first.check("user")
+        assert int(excinfo.value.headers["Retry-After"]) >= 1
+        # The refused request was rolled back, so the counter still reads 2.
+        assert sorted(server.data.values()) == [2.0]
+        await first.close()
+        await second.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_refunds_settled_usage():
+    async with FakeRedis() as server:
+        limiter = RateLimiter(
+            rate_per_minute=10,
+            joules_per_minute=50.0,
+            backend=RedisBackend(server.url, timeout=1.0),
+        )
+        reservation = await limiter.check("user", joules=40.0)
+        with pytest.raises(HTTPException):
+            await limiter.check("user", joules=40.0)
+        await limiter.settle(reservation, tokens=0, joules=5.0)
+        await limiter.check("user", joules=40.0)
+        await limiter.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_fails_open_when_unreachable():
+    async with FakeRedis() as server:
+        url = server.url
+    limiter = RateLimiter(rate_per_minute=1, backend=RedisBackend(url, timeout=0.5))
+    await limiter.check("user")
+    await limiter.check("user")
+    await limiter.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_backs_off_while_unreachable():
+    async with FakeRedis() as server:
+        url = server.url
+    backend = RedisBackend(url, timeout=0.5, backoff=0.05)
+    attempts = 0
+    execute = backend.connection.execute
+
+    async def counting(*commands):
+        nonlocal attempts
+        attempts += 1
+        return await execute(*commands)
+
+    backend.connection.execute = counting
+    limiter = RateLimiter(rate_per_minute=1, backend=backend)
+    for _ in range(5):
+        await limiter.check("user")
+    assert attempts == 1
+
+    await asyncio.sleep(0.06)
+    await limiter.check("user")
+    await limiter.check("user")
+    # One retry after the backoff, which failed and doubled it.
+    assert attempts == 2
+    await limiter.close()
@@ -1,6 +1,7 @@
 import pytest
 from fastapi import HTTPException
 
+from app.services.rate_limit_backends import MemoryBackend
 from app.services.rate_limiter import RateLimiter
 
 
@@ -11,3 +12,97 @@ async def test_rate_limiter_enforces_capacity():
     await limiter.check("user")
     with pytest.raises(HTTPException):
         await limiter.check("user")
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_caps_tracked_callers():
+    backend = MemoryBackend(max_buckets=2)
+    limiter = RateLimiter(rate_per_minute=1, backend=backend)
+    await limiter.check("a")
+    await limiter.check("b")
+    await limiter.check("c")
+    assert len(backend) == 2
+    # "a" was least recently seen, so it was forgotten and starts with a full bucket.
+    await limiter.check("a")
+    with pytest.raises(HTTPException):
+        await limiter.check("c")
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_sweeps_refilled_buckets(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.rate_limit_backends.time.monotonic", lambda: clock[0])
+    backend = MemoryBackend()
+    limiter = RateLimiter(rate_per_minute=2, backend=backend)
+    await limiter.check("idle")
+    clock[0] += 30
+    await limiter.check("active")
+    clock[0] += 31
+    await limiter.check("active")
+    assert len(backend) == 1
+    assert backend.sweep() == 0
+
+
+@pytest.mark.asyncio
+async def test_sweep_looks_past_a_caller_still_in_debt(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.rate_limit_backends.time.monotonic", lambda: clock[0])
+    backend = MemoryBackend()
+    limiter = RateLimiter(rate_per_minute=10, tokens_per_minute=60, backend=backend)
+    reservation = await limiter.check("debtor", tokens=60)
+    await limiter.settle(reservation, tokens=120, joules=0.0)
+    await limiter.check("idle-1")
+    await limiter.check("idle-2")
+    clock[0] += 61
+
+    # The debtor heads the table and has not paid off its 60-token debt yet.
+    assert backend.sweep() == 2
+    assert len(backend) == 1
+    clock[0] += 60
+    assert backend.sweep() == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_charges_tokens_and_settles(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.rate_limit_backends.time.monotonic", lambda: clock[0])
+    limiter = RateLimiter(rate_per_minute=100, tokens_per_minute=600)
+    reservation = await limiter.check("user", tokens=500)
+    with pytest.raises(HTTPException) as excinfo:
+        await limiter.check("user", tokens=500)
+    # 400 tokens short at 10 tokens/second.
+    assert excinfo.value.headers["Retry-After"] == "40"
+
+    # The call only used 100 tokens, so the rest of the estimate is refunded.
+    await limiter.settle(reservation, tokens=100, joules=0.0)
+    await limiter.check("user", tokens=500)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_energy_budget_rejects_without_charging(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.rate_limit_backends.time.monotonic", lambda: clock[0])
+    limiter = RateLimiter(rate_per_minute=2, joules_per_minute=60.0)
+    reservation = await limiter.check("user", joules=10.0)
+    await limiter.settle(reservation, joules=120.0, tokens=0)
+    # Twice the budget spent leaves the caller a full minute in debt.
+    with pytest.raises(HTTPException) as excinfo:
+        await limiter.check("user", joules=1.0)
+    assert excinfo.value.headers["Retry-After"] == "61"
+    clock[0] += 61
+    await limiter.check("user", joules=1.0)
+
+
+@pytest.mark.asyncio
+async def test_request_count_is_never_run_into_debt():
+    limiter = RateLimiter(rate_per_minute=120)
+    with pytest.raises(HTTPException) as excinfo:
+        await limiter.check("alice", requests=1000)
+    assert excinfo.value.status_code == 429
+    assert "Split the batch" in excinfo.value.detail
+
+    # Nothing was charged, and a charge that fits is paid in full before the next one.
+    await limiter.check("alice", requests=120)
+    with pytest.raises(HTTPException) as excinfo:
+        await limiter.check("alice")
+    assert int(excinfo.value.headers["Retry-After"]) == 1
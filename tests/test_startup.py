@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.warmup import WarmUp, warmup
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_importing_the_gateway_leaves_chroma_and_otel_sdk_unloaded():
+    check = (
+        "import sys, app.dependencies, app.main;"
+        "heavy = ('chromadb', 'opentelemetry.sdk', 'opentelemetry.exporter.otlp');"
+        "print(sorted(name for name in sys.modules if name.startswith(heavy)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.asyncio
+async def test_warm_up_failures_still_count_as_ready():
+    release = asyncio.Event()
+
+    async def slow() -> None:
+        await release.wait()
+
+    async def broken() -> None:
+        raise RuntimeError("offline")
+
+    startup = WarmUp()
+    startup.start("slow", slow)
+    startup.start("broken", broken)
+    await asyncio.sleep(0)
+    assert not startup.ready
+    assert startup.components == {"slow": "warming", "broken": "failed"}
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert startup.ready
+    assert startup.components["slow"] == "ready"
+    await startup.stop()
+    assert startup.components == {}
+
+
+def test_healthz_is_503_until_warm_up_finishes(monkeypatch):
+    with TestClient(app) as client:
+        monkeypatch.setattr(warmup, "components", {"cache": "warming", "http": "ready"})
+        response = client.get("/healthz")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming"
+
+        monkeypatch.setattr(warmup, "components", {"cache": "failed", "http": "ready"})
+        response = client.get("/healthz")
+        assert response.status_code == 200
+        assert response.json() == {"status": "ok", "warmup": {"cache": "failed", "http": "ready"}}
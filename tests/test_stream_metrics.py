@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services import stream_metrics
+from app.services.stream_metrics import StreamTimer
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    calls: list[tuple[str, dict]] = []
+    for name in (
+        "record_stream_first_byte",
+        "record_stream_first_token",
+        "record_stream_gap",
+        "record_stream_complete",
+    ):
+        monkeypatch.setattr(
+            stream_metrics, name, lambda _name=name, **kwargs: calls.append((_name, kwargs))
+        )
+    return calls
+
+
+def test_stream_timer_records_latency_profile(recorded):
+    timer = StreamTimer(provider="openai", model="gpt-4", started=10.0)
+    timer.chunk(10.4, has_content=False)  # role chunk
+    timer.chunk(10.5, has_content=True)
+    timer.chunk(10.7, has_content=True)
+    timer.chunk(11.5, has_content=True)
+    timer.finish(completion_tokens=21, now=11.6)
+
+    by_name: dict[str, list[float]] = {}
+    for name, kwargs in recorded:
+        assert kwargs["provider"] == "openai"
+        assert kwargs["model"] == "gpt-4"
+        by_name.setdefault(name, []).append(kwargs["seconds"])
+    assert by_name["record_stream_first_byte"] == pytest.approx([0.4])
+    assert by_name["record_stream_first_token"] == pytest.approx([0.5])
+    assert by_name["record_stream_gap"] == pytest.approx([0.1, 0.2, 0.8])
+    assert by_name["record_stream_complete"] == pytest.approx([1.6])
+    # 20 tokens after the first one, over the second between first and last write.
+    assert recorded[-1][1]["tokens_per_second"] == pytest.approx(20.0)
+
+
+def test_stream_timer_buckets_unknown_models(recorded):
+    timer = StreamTimer(provider="openai", model="made-up-model-123", started=0.0)
+    timer.finish(completion_tokens=0, now=1.0)
+    assert recorded == [
+        (
+            "record_stream_complete",
+            {"provider": "openai", "model": "other", "seconds": 1.0, "tokens_per_second": None},
+        )
+    ]
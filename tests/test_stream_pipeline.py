@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.services.stream_pipeline import coalesce_stream
+
+
+def _event(index: int, size: int = 20) -> bytes:
+    return b"data: " + str(index).encode().ljust(size, b"x") + b"\n\n"
+
+
+async def _collect(stream) -> list[bytes]:
+    return [chunk async for chunk in stream]
+
+
+def test_small_chunks_are_coalesced_on_event_boundaries():
+    body = b"".join(_event(i) for i in range(200))
+
+    async def source():
+        for start in range(0, len(body), 7):
+            yield body[start : start + 7]
+            if start % 140 == 0:
+                await asyncio.sleep(0)
+
+    writes = asyncio.run(
+        _collect(
+            coalesce_stream(
+                source(),
+                provider="test",
+                max_buffer_bytes=65536,
+                flush_bytes=1024,
+                flush_interval=0.05,
+            )
+        )
+    )
+
+    assert b"".join(writes) == body
+    assert all(write.endswith(b"\n\n") for write in writes)
+    assert len(writes) < len(body) // 7 // 10
+
+
+def test_slow_client_stops_upstream_reads():
+    max_buffer = 4096
+    event_size = 1024
+    read = 0
+    written = 0
+    max_ahead = 0
+
+    async def source():
+        nonlocal read
+        for index in range(64):
+            read += event_size
+            yield _event(index, event_size - 8)
+
+    async def consume():
+        nonlocal written, max_ahead
+        stream = coalesce_stream(
+            source(),
+            provider="test",
+            max_buffer_bytes=max_buffer,
+            flush_bytes=1024,
+            flush_interval=0,
+        )
+        async for chunk in stream:
+            await asyncio.sleep(0.001)
+            written += len(chunk)
+            max_ahead = max(max_ahead, read - written)
+
+    asyncio.run(consume())
+
+    assert written == 64 * event_size
+    # At most the buffer, one chunk being appended and the write in flight.
+    assert max_ahead <= 2 * max_buffer + event_size
+
+
+def test_event_larger_than_buffer_is_split_instead_of_stalling():
+    big = b"data: " + b"y" * 10000 + b"\n\n"
+
+    async def source():
+        for start in range(0, len(big), 1000):
+            yield big[start : start + 1000]
+
+    writes = asyncio.run(
+        _collect(coalesce_stream(source(), provider="test", max_buffer_bytes=4096))
+    )
+
+    assert b"".join(writes) == big
+    assert len(writes) > 1
+
+
+def test_upstream_error_is_raised_after_buffered_events():
+    async def source():
+        yield _event(1)
+        raise RuntimeError("upstream reset")
+
+    received: list[bytes] = []
+
+    async def consume():
+        async for chunk in coalesce_stream(source(), provider="test"):
+            received.append(chunk)
+
+    with pytest.raises(RuntimeError, match="upstream reset"):
+        asyncio.run(consume())
+    assert received == [_event(1)]
+
+
+def test_closing_early_closes_upstream():
+    closed = asyncio.Event()
+
+    async def source():
+        try:
+            index = 0
+            while True:
+                index += 1
+                yield _event(index)
+                await asyncio.sleep(0)
+        finally:
+            closed.set()
+
+    async def consume():
+        stream = coalesce_stream(source(), provider="test", max_buffer_bytes=1024)
+        async for _ in stream:
+            break
+        await stream.aclose()
+        return closed.is_set()
+
+    assert asyncio.run(consume())
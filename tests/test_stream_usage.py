@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from app.providers.base import with_stream_usage
+from app.providers.sse import SSEDecoder
+from app.services.stream_usage import StreamUsageTracker, drop_usage_chunks
+
+
+def _feed_in_pieces(tracker: StreamUsageTracker, body: bytes, size: int = 7) -> None:
+    for start in range(0, len(body), size):
+        tracker.feed(body[start : start + size])
+    tracker.finish()
+
+
+def test_decoder_reassembles_events_split_across_chunks():
+    decoder = SSEDecoder()
+
+    assert decoder.feed(b'event: ping\ndata: {"a"') == []
+    assert decoder.feed(b':1}\n\ndata: [DONE]\n\n') == [b'{"a":1}', b"[DONE]"]
+    assert decoder.finish() == []
+
+
+def test_openai_usage_chunk_wins_over_counting():
+    body = (
+        b'data: {"choices":[{"delta":{"content":"Hi"}}],"usage":null}\n\n'
+        b'data: {"choices":[],"usage":{"prompt_tokens":12,"completion_tokens":4}}\n\n'
+        b"data: [DONE]\n\n"
+    )
+    tracker = StreamUsageTracker()
+    _feed_in_pieces(tracker, body)
+
+    assert (tracker.prompt_tokens, tracker.completion_tokens) == (12, 4)
+    assert tracker.completion_text == "Hi"
+
+
+def test_openai_without_usage_keeps_text_for_counting():
+    tracker = StreamUsageTracker()
+    _feed_in_pieces(
+        tracker,
+        b'data: {"choices":[{"delta":{"content":"Hello"}}]}\n\n'
+        b'data: {"choices":[{"delta":{"content":" world"}}]}\n\n',
+    )
+
+    assert tracker.completion_tokens is None
+    assert tracker.completion_text == "Hello world"
+
+
+def test_with_stream_usage_patches_body_once():
+    patched = with_stream_usage(b'{"model":"gpt-4o","stream":true}')
+
+    assert patched == b'{"stream_options":{"include_usage":true},"model":"gpt-4o","stream":true}'
+    assert with_stream_usage(patched) == patched
+
+
+def test_drop_usage_chunks_keeps_content_and_done():
+    content = b'data: {"choices":[{"delta":{"content":"Hi"}}],"usage":null}\n\n'
+    usage = b'data: {"choices":[],"usage":{"prompt_tokens":12,"completion_tokens":4}}\n\n'
+    done = b"data: [DONE]\n\n"
+
+    assert drop_usage_chunks(content) is content
+    assert drop_usage_chunks(content + usage + done) == content + done
+    assert drop_usage_chunks(usage) == b""
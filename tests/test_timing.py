@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from app.services.timing import RequestTimer, _current_timer, current_timer, stage
+
+
+def test_stages_accumulate_on_the_current_timer():
+    timer = RequestTimer()
+    token = _current_timer.set(timer)
+    try:
+        assert current_timer() is timer
+        with stage("token_count"):
+            pass
+        with stage("token_count"):
+            pass
+        with stage("ledger"):
+            pass
+    finally:
+        _current_timer.reset(token)
+
+    assert list(timer.stages) == ["token_count", "ledger"]
+    header = timer.server_timing()
+    assert header.startswith("token_count;dur=")
+    assert ", ledger;dur=" in header
+    assert header.split(", ")[-1].startswith("total;dur=")
+
+
+def test_stage_without_a_timer_is_a_no_op():
+    assert current_timer() is None
+    with stage("cache_lookup"):
+        pass
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+import tiktoken
+
+from app.services.token_counter import DEFAULT_ENCODING, TokenCounter
+
+
+class RecordingEncoding:
+    name = "recording"
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, str]] = []
+
+    def encode_ordinary(self, text: str) -> list[int]:
+        self.calls.append((text, threading.current_thread().name))
+        return list(range(len(text.split())))
+
+
+def _counter(**kwargs) -> tuple[TokenCounter, RecordingEncoding]:
+    counter = TokenCounter(**{"offload_chars": 10_000, "memo_size": 16, "workers": 1, **kwargs})
+    encoding = RecordingEncoding()
+    # Models tiktoken does not know, like "fake-model", use the default encoding.
+    counter._encoders[DEFAULT_ENCODING] = encoding
+    return counter, encoding
+
+
+@pytest.mark.asyncio
+async def test_counts_match_tiktoken():
+    counter = TokenCounter(offload_chars=10_000, memo_size=16, workers=1)
+    text = "Reducing idle compute is the cheapest way to cut carbon."
+
+    assert await counter.count(text, "gpt-4") == len(
+        tiktoken.encoding_for_model("gpt-4").encode(text)
+    )
+    assert counter.encoding("unknown-model").name == "cl100k_base"
+
+
+@pytest.mark.asyncio
+async def test_follow_up_turn_only_encodes_new_message():
+    counter, encoding = _counter()
+    history = ["system prompt here", "first question", "first answer"]
+
+    assert await counter.count_messages(history, "fake-model") == 7
+    assert await counter.count_messages([*history, "second question"], "fake-model") == 9
+
+    assert [text for text, _ in encoding.calls] == [*history, "second question"]
+
+
+@pytest.mark.asyncio
+async def test_memo_is_bounded_and_optional():
+    counter, encoding = _counter(memo_size=2)
+
+    for text in ("a", "b", "c"):
+        await counter.count(text, "fake-model")
+    await counter.count("a", "fake-model")
+    await counter.count("done", "fake-model", memoize=False)
+    await counter.count("done", "fake-model", memoize=False)
+
+    assert [text for text, _ in encoding.calls] == ["a", "b", "c", "a", "done", "done"]
+
+
+@pytest.mark.asyncio
+async def test_large_inputs_are_encoded_off_the_event_loop():
+    counter, encoding = _counter(offload_chars=20)
+
+    await counter.count("short", "fake-model")
+    await counter.count("a much longer message " * 3, "fake-model")
+    counter.close()
+
+    assert encoding.calls[0][1] == threading.current_thread().name
+    assert encoding.calls[1][1].startswith("greengate-tokens")
+
+
+def test_encoders_are_shared_by_every_model_name():
+    counter = TokenCounter(workers=1)
+
+    for index in range(50):
+        counter.encoding(f"made-up-model-{index}")
+    counter.encoding("gpt-4")
+    counter.encoding("gpt-3.5-turbo")
+
+    assert list(counter._encoders) == ["cl100k_base"]
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import Status, StatusCode
+
+from app.services import tracing
+from app.services.metrics_service import EnergyLedger
+from app.services.tail_sampling import TailSamplingProcessor
+from app.services.tracing import span
+
+
+def sampled_tracer(*, ratio: float, latency_seconds: float = 10.0):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(
+        TailSamplingProcessor(
+            SimpleSpanProcessor(exporter),
+            ratio=ratio,
+            latency_seconds=latency_seconds,
+            max_traces=100,
+        )
+    )
+    return provider.get_tracer("test"), exporter
+
+
+def exported(exporter: InMemorySpanExporter) -> list[str]:
+    return [finished.name for finished in exporter.get_finished_spans()]
+
+
+def test_tail_sampler_keeps_errored_and_slow_traces_whole():
+    tracer, exporter = sampled_tracer(ratio=0.0, latency_seconds=0.05)
+
+    with tracer.start_as_current_span("fast"):
+        with tracer.start_as_current_span("fast.child"):
+            pass
+    assert exported(exporter) == []
+
+    with tracer.start_as_current_span("failed"):
+        with tracer.start_as_current_span("failed.child") as child:
+            child.set_status(Status(StatusCode.ERROR))
+    assert exported(exporter) == ["failed.child", "failed"]
+
+    with tracer.start_as_current_span("slow"):
+        with tracer.start_as_current_span("slow.child"):
+            time.sleep(0.06)
+    assert exported(exporter)[-2:] == ["slow.child", "slow"]
+
+
+def test_tail_sampler_samples_the_rest_by_ratio():
+    tracer, exporter = sampled_tracer(ratio=1.0)
+    with tracer.start_as_current_span("fast"):
+        pass
+    assert exported(exporter) == ["fast"]
+
+
+def test_span_is_a_no_op_while_tracing_is_off():
+    with span("greengate.test", {"greengate.model": "gpt-4"}) as current:
+        current.set_attribute("greengate.cache.hit", True)
+    assert current is trace.INVALID_SPAN
+
+
+@pytest.mark.asyncio
+async def test_ledger_writes_are_traced(monkeypatch, tmp_path):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "_tracer", provider.get_tracer("greengate"))
+
+    await EnergyLedger(tmp_path / "ledger.db").record(
+        spent=1.5, saved=0.0, prompt_tokens=10, completion_tokens=20
+    )
+
+    (recorded,) = exporter.get_finished_spans()
+    assert recorded.name == "greengate.ledger.record"
+    assert recorded.attributes["greengate.energy.spent_joules"] == 1.5
+    assert recorded.attributes["greengate.tokens.completion"] == 20
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+from app.providers.transcoding import (
+    AnthropicStreamTranscoder,
+    CohereStreamTranscoder,
+    StreamTranscoder,
+    transcode,
+)
+from app.services.stream_usage import StreamUsageTracker
+
+ANTHROPIC_STREAM = (
+    b"event: message_start\n"
+    b'data: {"type":"message_start","message":{"id":"msg_1","usage":'
+    b'{"input_tokens":25,"output_tokens":1}}}\n\n'
+    b"event: content_block_start\n"
+    b'data: {"type":"content_block_start","index":0,"content_block":{"type":"text","text":""}}\n\n'
+    b"event: ping\n"
+    b'data: {"type":"ping"}\n\n'
+    b"event: content_block_delta\n"
+    b'data: {"type":"content_block_delta","index":0,"delta":{"type":"text_delta","text":"Hel"}}\n\n'
+    b"event: content_block_delta\n"
+    b'data: {"type":"content_block_delta","index":0,"delta":{"type":"text_delta",'
+    b'"text":"lo \\u00e9"}}\n\n'
+    b"event: message_delta\n"
+    b'data: {"type":"message_delta","delta":{"stop_reason":"max_tokens"},'
+    b'"usage":{"output_tokens":15}}\n\n'
+    b"event: message_stop\n"
+    b'data: {"type":"message_stop"}\n\n'
+)
+
+
+def _events(body: bytes) -> list[dict | str]:
+    events: list[dict | str] = []
+    for block in body.split(b"\n\n"):
+        if not block:
+            continue
+        assert block.startswith(b"data: ")
+        data = block[len(b"data: ") :]
+        events.append("[DONE]" if data == b"[DONE]" else json.loads(data))
+    return events
+
+
+def _run(transcoder, body: bytes, size: int) -> bytes:
+    out = [transcoder.feed(body[start : start + size]) for start in range(0, len(body), size)]
+    out.append(transcoder.finish())
+    return b"".join(out)
+
+
+def test_anthropic_stream_is_identical_for_any_chunking():
+    size = len(ANTHROPIC_STREAM)
+    whole = _run(AnthropicStreamTranscoder("claude-3-haiku"), ANTHROPIC_STREAM, size)
+    for size in (1, 3, 17):
+        pieces = _events(_run(AnthropicStreamTranscoder("claude-3-haiku"), ANTHROPIC_STREAM, size))
+        assert [e["choices"] for e in pieces[:-1]] == [e["choices"] for e in _events(whole)[:-1]]
+
+    events = _events(whole)
+    assert events[-1] == "[DONE]"
+    assert all(e["object"] == "chat.completion.chunk" for e in events[:-1])
+    assert len({e["id"] for e in events[:-1]}) == 1
+    assert events[0]["choices"][0]["delta"] == {"role": "assistant", "content": ""}
+    text = "".join(e["choices"][0]["delta"].get("content", "") for e in events[:-1] if e["choices"])
+    assert text == "Hello é"
+    assert events[-3]["choices"][0]["finish_reason"] == "length"
+    assert events[-2]["choices"] == []
+    assert events[-2]["usage"] == {"prompt_tokens": 25, "completion_tokens": 15, "total_tokens": 40}
+
+
+def test_transcoded_usage_is_read_by_tracker():
+    tracker = StreamUsageTracker()
+    tracker.feed(_run(AnthropicStreamTranscoder("claude-3-haiku"), ANTHROPIC_STREAM, 5))
+    tracker.finish()
+
+    assert (tracker.prompt_tokens, tracker.completion_tokens) == (25, 15)
+
+
+def test_anthropic_error_event_ends_stream():
+    body = (
+        b'event: error\ndata: {"type":"error","error":{"type":"overloaded_error",'
+        b'"message":"Overloaded"}}\n\n'
+    )
+    events = _events(_run(AnthropicStreamTranscoder("claude-3-haiku"), body, 4))
+
+    assert events == [{"error": {"message": "Overloaded", "type": "upstream_error"}}, "[DONE]"]
+
+
+def test_cohere_v2_events():
+    body = (
+        b'event: message-start\ndata: {"type":"message-start","id":"c1"}\n\n'
+        b'event: content-delta\ndata: {"type":"content-delta","index":0,"delta":'
+        b'{"message":{"content":{"text":"Hi"}}}}\n\n'
+        b'event: message-end\ndata: {"type":"message-end","delta":{"finish_reason":"COMPLETE",'
+        b'"usage":{"billed_units":{"input_tokens":4,"output_tokens":1},'
+        b'"tokens":{"input_tokens":70,"output_tokens":2}}}}\n\n'
+    )
+    events = _events(_run(CohereStreamTranscoder("command-r"), body, 9))
+
+    assert events[1]["choices"][0]["delta"] == {"content": "Hi"}
+    assert events[2]["choices"][0]["finish_reason"] == "stop"
+    assert events[3]["usage"]["prompt_tokens"] == 70
+    assert events[-1] == "[DONE]"
+
+
+def test_cohere_v1_ndjson_without_trailing_newline():
+    body = (
+        b'{"is_finished":false,"event_type":"stream-start"}\n'
+        b'{"is_finished":false,"event_type":"text-generation","text":"Hey"}\n'
+        b'{"is_finished":true,"event_type":"stream-end","finish_reason":"MAX_TOKENS",'
+        b'"response":{"meta":{"billed_units":{"input_tokens":9,"output_tokens":3}}}}'
+    )
+    events = _events(_run(CohereStreamTranscoder("command-r"), body, 6))
+
+    assert events[1]["choices"][0]["delta"] == {"content": "Hey"}
+    assert events[2]["choices"][0]["finish_reason"] == "length"
+    assert events[3]["usage"]["completion_tokens"] == 3
+
+
+def test_truncated_stream_is_closed_without_usage_chunk():
+    body = ANTHROPIC_STREAM[: ANTHROPIC_STREAM.index(b"event: message_delta")]
+    events = _events(
+        _run(AnthropicStreamTranscoder("claude-3-haiku", include_usage=False), body, 11)
+    )
+
+    assert events[-2]["choices"][0]["finish_reason"] == "stop"
+    assert events[-1] == "[DONE]"
+    assert all("usage" not in e for e in events[:-1])
+
+
+def test_transcode_closes_upstream():
+    closed = False
+
+    async def upstream():
+        nonlocal closed
+        try:
+            yield ANTHROPIC_STREAM[:40]
+            yield ANTHROPIC_STREAM[40:]
+        finally:
+            closed = True
+
+    async def consume() -> bytes:
+        stream = transcode(upstream(), AnthropicStreamTranscoder("claude-3-haiku"))
+        return b"".join([chunk async for chunk in stream])
+
+    body = asyncio.run(consume())
+
+    assert closed
+    assert body.endswith(b"data: [DONE]\n\n")
+
+
+def test_usage_reaches_the_result_without_a_usage_chunk():
+    async def upstream():
+        yield ANTHROPIC_STREAM
+
+    async def consume(usage: dict) -> bytes:
+        transcoder = AnthropicStreamTranscoder("claude-3-haiku", include_usage=False)
+        return b"".join([chunk async for chunk in transcode(upstream(), transcoder, usage)])
+
+    usage: dict = {}
+    body = asyncio.run(consume(usage))
+
+    assert b'"usage"' not in body
+    assert usage == {"prompt_tokens": 25, "completion_tokens": 15}
+    with pytest.raises(TypeError):
+        StreamTranscoder("claude-3-haiku")